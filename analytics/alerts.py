@@ -0,0 +1,85 @@
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Set, Tuple, Union
+
+
+class AlertState:
+    __slots__ = ("armed", "last_alert")
+
+    def __init__(self):
+        self.armed = True
+        self.last_alert: Union[None, datetime] = None
+
+
+class AlertEngine:
+    """Evaluates alerts only for collections that moved in the latest sweep.
+
+    A collection fires once when its growth over `alert_interval` reaches
+    `alert_percent`, then stays disarmed until the growth falls below
+    `alert_percent * rearm_ratio` (hysteresis) and no sooner than `cooldown`
+    after the previous alert. Disarmed collections are re-evaluated every
+    cycle even without new mints, since their window keeps sliding.
+    """
+
+    def __init__(self, cooldown_minutes: int = 15, rearm_ratio: float = 0.5):
+        self.cooldown = timedelta(minutes=cooldown_minutes)
+        self.rearm_ratio = rearm_ratio
+        self.states: Dict[str, AlertState] = {}
+
+    def reset(self) -> None:
+        self.states.clear()
+
+    def candidates(self, changed_hrefs: Iterable[str]) -> Set[str]:
+        disarmed = {href for href, state in self.states.items() if not state.armed}
+        return set(changed_hrefs) | disarmed
+
+    def evaluate(
+            self,
+            growths: Dict[str, Union[None, Tuple[int, float]]],
+            alert_percent: float,
+            now: datetime = None
+    ) -> List[str]:
+        """`growths` maps each candidate href to its growth over the alert interval."""
+        now = now if now is not None else datetime.now()
+        fired = []
+
+        for href, growth in growths.items():
+            percentage_change = growth[1] if growth is not None else None
+            state = self.states.get(href)
+
+            if state is None:
+                if percentage_change is None or percentage_change < alert_percent:
+                    continue
+                state = self.states[href] = AlertState()
+
+            if not state.armed:
+                if percentage_change is None or percentage_change < alert_percent * self.rearm_ratio:
+                    state.armed = True
+                continue
+
+            if percentage_change is None or percentage_change < alert_percent:
+                continue
+
+            if state.last_alert is not None and now - state.last_alert < self.cooldown:
+                continue
+
+            state.armed = False
+            state.last_alert = now
+            fired.append(href)
+
+        self.prune(now)
+
+        return fired
+
+    def prune(self, now: datetime) -> None:
+        for href in list(self.states.keys()):
+            state = self.states[href]
+
+            if state.armed and (state.last_alert is None or now - state.last_alert >= self.cooldown):
+                del self.states[href]
+
+
+alert_engine = AlertEngine(
+    cooldown_minutes=int(os.getenv("ALERT_COOLDOWN_MINUTES", "15")),
+    rearm_ratio=float(os.getenv("ALERT_REARM_RATIO", "0.5"))
+)
@@ -0,0 +1,102 @@
+from typing import Dict, List, Union
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.dal import CollectionsDAL, RankingDAL
+from database.models import Collections
+from database.session import DBTransactionStatus
+from analytics.timeseries import sales_change_matrix
+from analytics.velocity import eta_minutes
+from services.settings import Settings
+
+GROWTH_INTERVALS = [2, 5, 10, 15]
+
+
+def ranking_key(sort_type: str, min_stock: int, interval: int = None) -> str:
+    if sort_type == "by_growth":
+        return f"by_growth:{interval}:{min_stock}"
+    return f"{sort_type}:{min_stock}"
+
+
+def settings_key(data: Settings) -> str:
+    return ranking_key(data.sort_type, data.min_stock, data.growth_sort_time_interval)
+
+
+def rank_by_stock(collections: List[Collections], min_stock: int) -> List[Collections]:
+    filtered_collections = [collection for collection in collections if collection.sold_percentage != 100]
+    filtered_collections = [collection for collection in filtered_collections if collection.total_stock > min_stock]
+    return sorted(filtered_collections, key=lambda x: x.sold_percentage, reverse=True)
+
+
+def rank_by_velocity(ranked_by_stock: List[Collections]) -> List[Collections]:
+    return sorted(ranked_by_stock, key=lambda x: x.mint_velocity or 0, reverse=True)
+
+
+def rank_by_eta(ranked_by_stock: List[Collections]) -> List[Collections]:
+    """Soonest projected sell-out first, collections that don't mint keep the stock order behind them."""
+    etas = [(collection, eta_minutes(collection.total_stock - collection.sold_stock, collection.mint_velocity))
+            for collection in ranked_by_stock]
+
+    with_eta = [(collection, eta) for collection, eta in etas if eta is not None]
+    without_eta = [collection for collection, eta in etas if eta is None]
+
+    return [collection for collection, _ in sorted(with_eta, key=lambda item: item[1])] + without_eta
+
+
+async def build_rankings(
+        db_session: AsyncSession,
+        min_stock: int,
+        intervals: List[int]
+) -> Union[None, Dict[str, List[str]]]:
+    collections, status = await CollectionsDAL(db_session).get_all()
+
+    if status == DBTransactionStatus.ROLLBACK:
+        return None
+
+    ranked_by_stock = rank_by_stock(collections, min_stock)
+
+    rankings = {
+        ranking_key("by_stock", min_stock): [collection.href for collection in ranked_by_stock],
+        ranking_key("by_velocity", min_stock): [collection.href for collection in rank_by_velocity(ranked_by_stock)],
+        ranking_key("by_eta", min_stock): [collection.href for collection in rank_by_eta(ranked_by_stock)]
+    }
+
+    # rows in stock order: collections without growth keep it behind the ranked ones
+    growths = await sales_change_matrix(
+        db_session,
+        hrefs=[collection.href for collection in ranked_by_stock],
+        intervals=intervals
+    )
+
+    for interval in growths.intervals:
+        rankings[ranking_key("by_growth", min_stock, interval)] = growths.rank(interval)
+
+    return rankings
+
+
+async def refresh_rankings(db_session: AsyncSession, data: Settings) -> DBTransactionStatus:
+    """Rebuilds every sort mode for the current min_stock once per scrape cycle."""
+    rankings = await build_rankings(
+        db_session,
+        min_stock=data.min_stock,
+        intervals=GROWTH_INTERVALS + [data.growth_sort_time_interval]
+    )
+
+    if rankings is None:
+        return DBTransactionStatus.ROLLBACK
+
+    return await RankingDAL(db_session).replace(rankings, drop_others=True)
+
+
+async def ensure_ranking(db_session: AsyncSession, data: Settings) -> DBTransactionStatus:
+    """Materializes the ranking for settings changed between two scrape cycles."""
+    rankings = await build_rankings(
+        db_session,
+        min_stock=data.min_stock,
+        intervals=[data.growth_sort_time_interval]
+    )
+
+    if rankings is None:
+        return DBTransactionStatus.ROLLBACK
+
+    return await RankingDAL(db_session).replace({settings_key(data): rankings[settings_key(data)]})
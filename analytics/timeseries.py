@@ -0,0 +1,253 @@
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Tuple, Union
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from analytics.vectorized import TrackingWindow, GrowthMatrix, growth_matrix
+from database.dal import TrackingDAL
+from database.retention import RAW_RETENTION, HEARTBEAT, HELD_FOR
+
+# past this many hrefs the window is loaded for every collection and filtered in memory
+# instead of binding one IN parameter per href
+WINDOW_FILTER_LIMIT = 1000
+
+
+class _Series:
+    """Append-only (timestamp, sold_to_time) samples; old samples are dropped by
+    moving `start` and compacted once they take up half of the arrays."""
+
+    __slots__ = ("times", "values", "start")
+
+    def __init__(self):
+        self.times = array("d")
+        self.values = array("q")
+        self.start = 0
+
+    def append(self, timestamp: float, value: int) -> None:
+        if len(self.times) > self.start and timestamp <= self.times[-1]:
+            # out-of-order sample (e.g. warm start racing ingestion), keep the arrays sorted
+            i = bisect_right(self.times, timestamp, lo=self.start)
+
+            if i > self.start and self.times[i - 1] == timestamp:
+                # loaded again by an overlapping catch-up
+                return
+
+            self.times.insert(i, timestamp)
+            self.values.insert(i, value)
+            return
+
+        self.times.append(timestamp)
+        self.values.append(value)
+
+    def trim(self, oldest: float) -> None:
+        self.start = bisect_left(self.times, oldest, lo=self.start)
+
+        if self.start and self.start * 2 >= len(self.times):
+            del self.times[:self.start]
+            del self.values[:self.start]
+            self.start = 0
+
+    def __len__(self) -> int:
+        return len(self.times) - self.start
+
+
+class TimeSeriesStore:
+    """Same step-function view as the tracking table: a series only stores changes
+    (plus heartbeats), and a window starts at the value held at the first sweep in it."""
+
+    def __init__(self, retention_minutes: int = 15):
+        self.retention = timedelta(minutes=retention_minutes)
+        self.series: Dict[str, _Series] = {}
+        self.sweeps = array("d")
+        # set once this process feeds the store from ingestion, otherwise it is never fresher than the db
+        self.attached = False
+        # latest tracking or sweep time loaded from the db
+        self.loaded_until: Union[None, datetime] = None
+
+    def append(self, href: str, time: datetime, sold_to_time: int) -> None:
+        series = self.series.get(href)
+
+        if series is None:
+            series = self.series[href] = _Series()
+
+        timestamp = time.timestamp()
+
+        if (
+            len(series)
+            and series.values[-1] == int(sold_to_time)
+            and series.times[-1] > timestamp - HEARTBEAT.total_seconds()
+        ):
+            return
+
+        series.append(timestamp, int(sold_to_time))
+
+    def add_sweep(self, time: datetime) -> None:
+        timestamp = time.timestamp()
+
+        if not self.sweeps or timestamp > self.sweeps[-1]:
+            self.sweeps.append(timestamp)
+        elif self.sweeps[bisect_left(self.sweeps, timestamp)] != timestamp:
+            self.sweeps.insert(bisect_right(self.sweeps, timestamp), timestamp)
+
+    def extend(self, rows: Iterable[dict], time: datetime, sweep: bool = True) -> None:
+        for row in rows:
+            self.append(row["href"], time, row["sold_stock"])
+
+        if sweep:
+            self.add_sweep(time)
+        self.trim(time)
+
+    def trim(self, now: datetime = None) -> None:
+        now = now if now is not None else datetime.now()
+
+        del self.sweeps[:bisect_left(self.sweeps, (now - self.retention).timestamp())]
+
+        # a window start may fall back on a sample up to HELD_FOR before the window
+        oldest = (now - self.retention - HELD_FOR).timestamp()
+
+        for href in list(self.series.keys()):
+            series = self.series[href]
+            series.trim(oldest)
+
+            if not len(series):
+                del self.series[href]
+
+    def covers(self, interval_minutes: int) -> bool:
+        return self.attached and timedelta(minutes=interval_minutes) <= self.retention
+
+    def calculate_sales_change(
+            self,
+            href: str,
+            interval_minutes: int,
+            now: datetime = None
+    ) -> Union[None, Tuple[int, float]]:
+        series = self.series.get(href)
+
+        if series is None:
+            return None
+
+        end_time = (now if now is not None else datetime.now()).timestamp()
+        start_time = end_time - interval_minutes * 60
+
+        sweep = bisect_left(self.sweeps, start_time)
+
+        if sweep == len(self.sweeps) or self.sweeps[sweep] > end_time:
+            return None
+
+        sweep_time = self.sweeps[sweep]
+
+        end = bisect_right(series.times, end_time, lo=series.start) - 1
+        start = bisect_right(series.times, sweep_time, lo=series.start) - 1
+
+        if start < series.start or series.times[start] < start_time - HELD_FOR.total_seconds():
+            # no value held at the sweep, the collection showed up later in the window
+            start += 1
+
+        if end < series.start or start > end:
+            return None
+
+        start_sold = series.values[start]
+        absolute_change = series.values[end] - start_sold
+        percentage_change = (absolute_change / start_sold) * 100 if start_sold != 0 else 0
+
+        return absolute_change, percentage_change
+
+    def window(self, hrefs: Iterable[str]) -> TrackingWindow:
+        return TrackingWindow.from_series(self.series, hrefs, self.sweeps)
+
+    def calculate_sales_changes(
+            self,
+            hrefs: Iterable[str],
+            intervals: Iterable[int],
+            now: datetime = None
+    ) -> Dict[str, Dict[int, Union[None, Tuple[int, float]]]]:
+        hrefs = list(dict.fromkeys(hrefs))
+        return growth_matrix(self.window(hrefs), intervals, now, hrefs=hrefs).to_dict()
+
+    async def warm_start(self, db_session: AsyncSession) -> None:
+        since = datetime.now() - self.retention
+        await self.load(db_session, rows_since=since - HELD_FOR, sweeps_since=since)
+        self.attached = True
+
+    async def catch_up(self, db_session: AsyncSession) -> None:
+        """Loads what another process ingested since the last load (see services.events).
+
+        Rows are stamped with their sweep's start, and pages of a sweep that timed out
+        on the coordinator are still ingested later: rows are read again from HELD_FOR
+        before the last load, the ones already loaded are skipped.
+        """
+        if self.loaded_until is None:
+            await self.warm_start(db_session)
+            return
+
+        await self.load(db_session, rows_since=self.loaded_until - HELD_FOR, sweeps_since=self.loaded_until)
+        self.trim()
+
+    async def load(self, db_session: AsyncSession, rows_since: datetime, sweeps_since: datetime) -> None:
+        tracking_dal = TrackingDAL(db_session)
+        loaded_until = self.loaded_until
+
+        for href, time, sold_to_time in await tracking_dal.get_since(rows_since):
+            self.append(href, time, sold_to_time)
+            loaded_until = time if loaded_until is None else max(loaded_until, time)
+
+        for time in await tracking_dal.get_sweeps_since(sweeps_since):
+            self.add_sweep(time)
+            loaded_until = time if loaded_until is None else max(loaded_until, time)
+
+        self.loaded_until = loaded_until
+
+
+timeseries = TimeSeriesStore(retention_minutes=int(os.getenv("TIMESERIES_RETENTION_MINUTES", "15")))
+
+
+async def sales_change_matrix(
+        db_session: AsyncSession,
+        hrefs: List[str],
+        intervals: List[int]
+) -> GrowthMatrix:
+    """Growth of `hrefs` (rows, in order) over `intervals` (columns, ascending).
+
+    Windows the in-memory store covers are answered from it, windows within the raw
+    retention from one tracking window query, longer ones from the rollups.
+    """
+    now = datetime.now()
+    hrefs = list(dict.fromkeys(hrefs))
+    intervals = sorted(set(intervals))
+
+    cached = [interval for interval in intervals if timeseries.covers(interval)]
+    missing = [interval for interval in intervals if not timeseries.covers(interval)]
+    recent = [interval for interval in missing if timedelta(minutes=interval) <= RAW_RETENTION]
+    older = [interval for interval in missing if timedelta(minutes=interval) > RAW_RETENTION]
+
+    matrices = []
+
+    if cached:
+        matrices.append(growth_matrix(timeseries.window(hrefs), cached, now, hrefs=hrefs))
+
+    if recent and hrefs:
+        window = await TrackingWindow.load(
+            db_session,
+            since=now - timedelta(minutes=recent[-1]),
+            hrefs=hrefs if len(hrefs) <= WINDOW_FILTER_LIMIT else None
+        )
+        matrices.append(growth_matrix(window, recent, now, hrefs=hrefs))
+    elif recent:
+        matrices.append(GrowthMatrix.empty(hrefs, recent))
+
+    if older:
+        from_db = await TrackingDAL(db_session).calculate_sales_changes(hrefs, older)
+        matrices.append(GrowthMatrix.from_dict(hrefs, older, from_db))
+
+    return GrowthMatrix.hstack(hrefs, matrices)
+
+
+async def sales_changes(
+        db_session: AsyncSession,
+        hrefs: List[str],
+        intervals: List[int]
+) -> Dict[str, Dict[int, Union[None, Tuple[int, float]]]]:
+    return (await sales_change_matrix(db_session, hrefs, intervals)).to_dict()
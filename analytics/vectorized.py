@@ -0,0 +1,232 @@
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, Sequence, Tuple, Union
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.dal import TrackingDAL
+from database.retention import HELD_FOR
+
+
+class TrackingWindow:
+    """Tracking samples of many collections as flat arrays.
+
+    Collection i owns times/values[offsets[i]:offsets[i + 1]], sorted by time;
+    `sweeps` are the sweep timestamps of the window.
+    """
+
+    __slots__ = ("hrefs", "offsets", "times", "values", "sweeps")
+
+    def __init__(self, hrefs: List[str], offsets: np.ndarray, times: np.ndarray, values: np.ndarray, sweeps: np.ndarray):
+        self.hrefs = hrefs
+        self.offsets = offsets
+        self.times = times
+        self.values = values
+        self.sweeps = sweeps
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Tuple[str, datetime, int]], sweeps: Iterable[datetime]) -> "TrackingWindow":
+        """`rows` are (collection_href, time, sold_to_time) ordered by href, time."""
+        sweeps = np.fromiter((time.timestamp() for time in sweeps), dtype=np.float64)
+
+        if not rows:
+            return cls([], np.zeros(1, dtype=np.int64), np.empty(0), np.empty(0, dtype=np.int64), sweeps)
+
+        hrefs, times, values = zip(*rows)
+        hrefs = np.array(hrefs, dtype=object)
+        starts = np.concatenate(([0], np.flatnonzero(hrefs[1:] != hrefs[:-1]) + 1))
+
+        return cls(
+            hrefs[starts].tolist(),
+            np.append(starts, len(hrefs)).astype(np.int64),
+            np.fromiter((time.timestamp() for time in times), dtype=np.float64, count=len(times)),
+            np.fromiter(values, dtype=np.int64, count=len(values)),
+            sweeps
+        )
+
+    @classmethod
+    def from_series(cls, series: Dict[str, object], hrefs: Iterable[str], sweeps: Sequence[float]) -> "TrackingWindow":
+        """From the in-memory store's per-collection series (array-backed, see analytics.timeseries)."""
+        times, values = array("d"), array("q")
+        present, offsets = [], [0]
+
+        for href in hrefs:
+            samples = series.get(href)
+
+            if samples is None or not len(samples):
+                continue
+
+            times.extend(samples.times[samples.start:])
+            values.extend(samples.values[samples.start:])
+            present.append(href)
+            offsets.append(len(times))
+
+        return cls(
+            present,
+            np.array(offsets, dtype=np.int64),
+            np.array(times, dtype=np.float64),
+            np.array(values, dtype=np.int64),
+            np.array(sweeps, dtype=np.float64)
+        )
+
+    @classmethod
+    async def load(cls, db_session: AsyncSession, since: datetime, hrefs: List[str] = None) -> "TrackingWindow":
+        """Samples from `since - HELD_FOR` on (a window start may fall back on them), sweeps from `since`."""
+        tracking_dal = TrackingDAL(db_session)
+
+        rows = await tracking_dal.get_since(since - HELD_FOR, hrefs=hrefs)
+        sweeps = await tracking_dal.get_sweeps_since(since)
+
+        return cls.from_rows(rows, sweeps)
+
+
+class GrowthMatrix:
+    """(absolute, percent) change per collection (rows, in `hrefs` order) and interval (columns)."""
+
+    def __init__(
+            self,
+            hrefs: List[str],
+            intervals: List[int],
+            absolute: np.ndarray,
+            percent: np.ndarray,
+            valid: np.ndarray
+    ):
+        self.hrefs = hrefs
+        self.intervals = intervals
+        self.absolute = absolute
+        self.percent = percent
+        self.valid = valid
+        self.columns = {interval: column for column, interval in enumerate(intervals)}
+
+    @classmethod
+    def empty(cls, hrefs: List[str], intervals: List[int]) -> "GrowthMatrix":
+        shape = (len(hrefs), len(intervals))
+        return cls(hrefs, intervals, np.zeros(shape, dtype=np.int64), np.zeros(shape), np.zeros(shape, dtype=bool))
+
+    @classmethod
+    def from_dict(
+            cls,
+            hrefs: List[str],
+            intervals: List[int],
+            growths: Dict[str, Dict[int, Union[None, Tuple[int, float]]]]
+    ) -> "GrowthMatrix":
+        matrix = cls.empty(hrefs, intervals)
+
+        for row, href in enumerate(hrefs):
+            for column, interval in enumerate(intervals):
+                growth = growths.get(href, {}).get(interval)
+
+                if growth is not None:
+                    matrix.absolute[row, column], matrix.percent[row, column] = growth
+                    matrix.valid[row, column] = True
+
+        return matrix
+
+    @classmethod
+    def hstack(cls, hrefs: List[str], matrices: List["GrowthMatrix"]) -> "GrowthMatrix":
+        """Joins matrices over the same rows and disjoint intervals, columns sorted by interval."""
+        matrices = [matrix for matrix in matrices if matrix.intervals]
+
+        if not matrices:
+            return cls.empty(hrefs, [])
+
+        intervals = [interval for matrix in matrices for interval in matrix.intervals]
+        order = np.argsort(intervals, kind="stable")
+
+        return cls(
+            hrefs,
+            [intervals[column] for column in order],
+            np.hstack([matrix.absolute for matrix in matrices])[:, order],
+            np.hstack([matrix.percent for matrix in matrices])[:, order],
+            np.hstack([matrix.valid for matrix in matrices])[:, order]
+        )
+
+    def to_dict(self) -> Dict[str, Dict[int, Union[None, Tuple[int, float]]]]:
+        absolute, percent, valid = self.absolute.tolist(), self.percent.tolist(), self.valid.tolist()
+
+        return {
+            href: {
+                interval: (absolute[row][column], percent[row][column]) if valid[row][column] else None
+                for column, interval in enumerate(self.intervals)
+            }
+            for row, href in enumerate(self.hrefs)
+        }
+
+    def rank(self, interval: int) -> List[str]:
+        """Rows with a growth over `interval` by percent, descending, then the rest;
+        ties and the rest keep the row order."""
+        column = self.columns[interval]
+        valid = self.valid[:, column]
+
+        with_change = np.flatnonzero(valid)
+        with_change = with_change[np.argsort(-self.percent[with_change, column], kind="stable")]
+
+        return np.array(self.hrefs, dtype=object)[np.concatenate((with_change, np.flatnonzero(~valid)))].tolist()
+
+
+def growth_matrix(
+        window: TrackingWindow,
+        intervals: Iterable[int],
+        now: datetime = None,
+        hrefs: List[str] = None
+) -> GrowthMatrix:
+    """Step-function growth, as TrackingDAL.calculate_sales_changes, for every collection at once.
+
+    A window [now - interval, now] starts at the value held at its first sweep
+    (a sample at most HELD_FOR older than the window, otherwise the first sample
+    after the sweep) and ends at the latest sample.
+    """
+    intervals = sorted(set(intervals))
+    hrefs = hrefs if hrefs is not None else window.hrefs
+    matrix = GrowthMatrix.empty(hrefs, intervals)
+
+    if not len(window.times) or not hrefs:
+        return matrix
+
+    end_time = (now if now is not None else datetime.now()).timestamp()
+
+    # rows of the result -> collections of the window (-1: no samples)
+    position = {href: i for i, href in enumerate(window.hrefs)}
+    rows = np.array([position.get(href, -1) for href in hrefs], dtype=np.int64)
+    present = rows >= 0
+    segments = rows[present]
+
+    # one sorted key space over all collections: segment * span + seconds since t0,
+    # so a single searchsorted finds the last sample at or before a time per collection
+    t0 = window.times.min()
+    span = max(window.times.max(), end_time) - t0 + 1
+    counts = np.diff(window.offsets)
+    keys = np.repeat(np.arange(len(window.hrefs)), counts) * span + (window.times - t0)
+    lo = window.offsets[:-1][segments]
+
+    def last_at_or_before(time: float) -> np.ndarray:
+        # below t0 means before every sample, stay clear of the previous segment
+        return np.searchsorted(keys, segments * span + max(time - t0, -0.5), side="right") - 1
+
+    end = last_at_or_before(end_time)
+    has_end = end >= lo
+
+    for column, interval in enumerate(intervals):
+        start_time = end_time - interval * 60
+        sweep = np.searchsorted(window.sweeps, start_time, side="left")
+
+        if sweep == len(window.sweeps) or window.sweeps[sweep] > end_time:
+            continue
+
+        start = last_at_or_before(window.sweeps[sweep])
+        held = (start >= lo) & (window.times[np.maximum(start, 0)] >= start_time - HELD_FOR.total_seconds())
+        # no value held at the sweep: the collection showed up later in the window
+        start = np.where(held, start, start + 1)
+
+        ok = has_end & (start <= end)
+        start_sold = window.values[np.where(ok, start, 0)]
+        absolute = window.values[np.where(ok, end, 0)] - start_sold
+        percent = np.divide(absolute, start_sold, out=np.zeros(len(absolute)), where=start_sold != 0) * 100
+
+        target = np.flatnonzero(present)
+        matrix.absolute[target, column] = np.where(ok, absolute, 0)
+        matrix.percent[target, column] = np.where(ok, percent, 0)
+        matrix.valid[target, column] = ok
+
+    return matrix
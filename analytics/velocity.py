@@ -0,0 +1,213 @@
+import heapq
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Set, Tuple, Union
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.dal import CollectionsDAL, TrackingDAL
+
+
+class _State:
+    __slots__ = ("time", "sold", "velocity", "persisted", "deadline")
+
+    def __init__(self, time: float, sold: int):
+        self.time = time
+        self.sold = sold
+        self.velocity = 0.0
+        self.persisted: Union[None, float] = None
+        # timestamp of the valid entry in VelocityTracker.deadlines, None while pending
+        self.deadline: Union[None, float] = None
+
+
+class VelocityTracker:
+    """Mint velocity (mints/minute) per collection, an EWMA over snapshots.
+
+    Every snapshot updates the state in O(1): the rate since the previous snapshot
+    is blended in with weight 1 - exp(-dt / tau), so irregular sweep gaps weigh in
+    by their length and a collection that stops minting decays towards zero.
+    Reads decay the same way by the time since the last snapshot, and a collection
+    not seen for `3 * tau` reads as 0: no snapshots come for sold out or skipped ones.
+
+    Persisting doesn't walk every collection: updated ones are pending, idle ones
+    wait in a heap until their decayed velocity leaves the tolerance band around
+    the persisted value. Idle ones are dropped once stale and persisted as 0.
+    """
+
+    def __init__(self, tau_minutes: float = 5, floor: float = 0.01, tolerance: float = 0.05):
+        self.tau = tau_minutes
+        # velocities below `floor` are 0, persisted ones are rewritten once they move by `tolerance` (relative)
+        self.floor = floor
+        self.tolerance = tolerance
+        self.states: Dict[str, _State] = {}
+        # updated since their velocity was last found persisted
+        self.pending: Set[str] = set()
+        # (timestamp, href): when an idle velocity is due to be checked again, entries are
+        # valid while the state's deadline matches
+        self.deadlines: List[Tuple[float, str]] = []
+
+    def update(self, href: str, time: datetime, sold: int) -> float:
+        timestamp, sold = time.timestamp(), int(sold)
+        state = self.states.get(href)
+
+        if state is None:
+            self.states[href] = _State(timestamp, sold)
+            self.pending.add(href)
+            return 0.0
+
+        minutes = (timestamp - state.time) / 60
+
+        if minutes <= 0:
+            # same snapshot again or out of order, nothing to blend in
+            return state.velocity
+
+        rate = max(sold - state.sold, 0) / minutes
+        velocity = state.velocity + (1 - math.exp(-minutes / self.tau)) * (rate - state.velocity)
+
+        state.time, state.sold = timestamp, sold
+        state.velocity = velocity if velocity >= self.floor else 0.0
+        state.deadline = None
+        self.pending.add(href)
+
+        return state.velocity
+
+    def extend(self, rows: Iterable[dict], time: datetime) -> None:
+        for row in rows:
+            self.update(row["href"], time, row["sold_stock"])
+
+    def current(self, state: _State, now: float) -> float:
+        minutes = max(now - state.time, 0) / 60
+
+        if not state.velocity or minutes > 3 * self.tau:
+            return 0.0
+
+        velocity = state.velocity * math.exp(-minutes / self.tau)
+        return velocity if velocity >= self.floor else 0.0
+
+    def velocity(self, href: str, now: datetime = None) -> float:
+        state = self.states.get(href)
+        return self.current(state, _timestamp(now)) if state is not None else 0.0
+
+    def velocities(self, now: datetime = None) -> Dict[str, float]:
+        now = _timestamp(now)
+        velocities = {href: self.current(state, now) for href, state in self.states.items()}
+        return {href: velocity for href, velocity in velocities.items() if velocity}
+
+    def moved(self, state: _State, velocity: float) -> bool:
+        return state.persisted is None or abs(velocity - state.persisted) > self.tolerance * max(state.persisted, self.floor)
+
+    def deadline(self, state: _State, now: float) -> float:
+        """When the decayed velocity of an idle state, in its band now, may leave it."""
+        stale = state.time + 3 * self.tau * 60
+        velocity = self.current(state, now)
+
+        if now >= stale or not velocity:
+            return max(stale, now)
+
+        # reads only fall from here: below the band around the persisted value, or below the floor to 0
+        persisted = state.persisted or 0.0
+        lowest = max(persisted - self.tolerance * max(persisted, self.floor), self.floor)
+
+        if velocity <= lowest:
+            # on the edge of the band, checked again with the next batch
+            return now
+
+        return min(now + self.tau * 60 * math.log(velocity / lowest), stale)
+
+    def dirty(self, hrefs: Iterable[str] = None, now: datetime = None) -> Dict[str, float]:
+        """Velocities of `hrefs` (all tracked ones by default) that moved since they were last persisted.
+
+        Without `hrefs` only pending states and idle ones past their deadline are read.
+        """
+        now = _timestamp(now)
+        velocities = {}
+
+        if hrefs is not None:
+            for href in hrefs:
+                state = self.states.get(href)
+
+                if state is not None and self.moved(state, velocity := self.current(state, now)):
+                    velocities[href] = velocity
+
+            return velocities
+
+        while self.deadlines and self.deadlines[0][0] <= now:
+            deadline, href = heapq.heappop(self.deadlines)
+            state = self.states.get(href)
+
+            if state is not None and state.deadline == deadline:
+                state.deadline = None
+                self.pending.add(href)
+
+        for href in list(self.pending):
+            state = self.states[href]
+            velocity = self.current(state, now)
+
+            if self.moved(state, velocity):
+                # pending until persisted
+                velocities[href] = velocity
+                continue
+
+            self.pending.discard(href)
+
+            if not velocity and now - state.time > 3 * self.tau * 60:
+                # stale and persisted as 0: nothing left to decay, a new snapshot starts over
+                del self.states[href]
+                continue
+
+            state.deadline = self.deadline(state, now)
+            heapq.heappush(self.deadlines, (state.deadline, href))
+
+        return velocities
+
+    def mark_persisted(self, velocities: Dict[str, float]) -> None:
+        for href, velocity in velocities.items():
+            state = self.states.get(href)
+
+            if state is not None:
+                # its deadline was set against the previous value
+                state.persisted, state.deadline = velocity, None
+                self.pending.add(href)
+
+    async def warm_start(self, db_session: AsyncSession, now: datetime = None) -> None:
+        """Replays recent tracking rows; older history weighs less than e^-3."""
+        now = now if now is not None else datetime.now()
+
+        for href, time, sold_to_time in await TrackingDAL(db_session).get_since(now - timedelta(minutes=3 * self.tau)):
+            self.update(href, time, sold_to_time)
+
+        # velocities persisted before the restart by collections with no rows since are stale
+        await CollectionsDAL(db_session).clear_velocities(keep=self.states)
+
+
+def _timestamp(now: Union[None, datetime]) -> float:
+    return (now if now is not None else datetime.now()).timestamp()
+
+
+def eta_minutes(remaining: int, velocity: Union[None, float]) -> Union[None, float]:
+    """Projected minutes to sell-out at the current velocity, None when nothing mints."""
+    if remaining <= 0:
+        return 0.0
+    if not velocity:
+        return None
+    return remaining / velocity
+
+
+def format_eta(minutes: Union[None, float]) -> str:
+    if minutes is None:
+        return "n/a"
+
+    minutes = math.ceil(minutes)
+
+    if minutes < 60:
+        return f"{minutes} мин"
+    if minutes < 60 * 24:
+        return f"{minutes // 60} ч {minutes % 60} мин"
+    return f"{minutes // (60 * 24)} д {minutes // 60 % 24} ч"
+
+
+velocity_tracker = VelocityTracker(
+    tau_minutes=float(os.getenv("VELOCITY_TAU_MINUTES", "5")),
+    floor=float(os.getenv("VELOCITY_FLOOR", "0.01"))
+)
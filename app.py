@@ -1,19 +1,35 @@
 import os
-from typing import NoReturn
+import logging
+import socket
+from typing import NoReturn, List, Set, Union
 from enum import Enum
-import time
 import asyncio
-
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.firefox.service import Service as FirefoxService
-from webdriver_manager.firefox import GeckoDriverManager
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-
-from database.dal import CollectionsDAL, TrackingDAL
-from database.session import async_session, DBTransactionStatus
-from bot import bot, gen_message, gen_markup, update_json, get_data_from_json
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.dal import CollectionsDAL, IngestDAL
+from database.jobs import JobQueueDAL, JOB_RETENTION
+from database.session import unit_of_work, pool_status, DBTransactionStatus
+from database.retention import RetentionDAL, RUN_INTERVAL
+from bot import outbound, publish
+from services.settings import settings
+from scraper.fetchers import create_fetchers
+from scraper.scheduler import SweepScheduler, CrawlPlanner, Cadence
+from analytics.timeseries import timeseries, sales_changes
+from analytics.alerts import alert_engine
+from analytics.velocity import velocity_tracker, eta_minutes, format_eta
+from scraper.priority import collection_priority
+from scraper.worker import ScrapeWorker
+from analytics.ranking import refresh_rankings
+from pipeline import Stage, CardBatch, HotBatch, Committed, SweepDone
+from services import events
+from services.events import SweepEvent
+from services.render_cache import data_version
+from services.log import setup_logging
+from services.metrics import ALERT_SECONDS, timed, serve as serve_metrics
+
+log = logging.getLogger("app")
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -41,186 +57,375 @@ class Parser:
 
     def __init__(self) -> NoReturn:
         if not Parser.__instance:
-            self.__op = webdriver.FirefoxOptions()
-            self.driver = webdriver.Firefox(service=FirefoxService(GeckoDriverManager().install()))
-            self.BASE_URL = None
-
-    def close_parser(self) -> NoReturn:
+            self.fetchers = create_fetchers()
+            self.scheduler = SweepScheduler(
+                self.fetchers,
+                CrawlPlanner(full_interval=float(os.getenv("FULL_SWEEP_SECONDS", "60"))),
+                retries=int(os.getenv("SCRAPER_FETCH_RETRIES", "2"))
+            )
+            self.BASE_URL = os.getenv("LMNFT_BASE_URL", "https://launchmynft.io")
+            self.retention_due = datetime.now()
+            self.last_sweep_at = None
+            self.interval = float(os.getenv("SCRAPE_INTERVAL_SECONDS", "15"))
+            self.hot_interval = float(os.getenv("HOT_REFRESH_SECONDS", "5"))
+            # standalone: fetch in this process; coordinator: enqueue page jobs for workers; worker: run them
+            self.mode = os.getenv("SCRAPER_MODE", "standalone")
+            self.sweep_timeout = float(os.getenv("SWEEP_TIMEOUT_SECONDS", "120"))
+            # with sweep events the bot process refreshes the channel message itself
+            self.events = events.enabled()
+
+            # fetch -> ingest -> analytics -> publish, connected by bounded queues
+            queue_size = int(os.getenv("PIPELINE_QUEUE_SIZE", "64"))
+            self.ingest_stage = Stage(
+                "ingest", self.ingest, maxsize=queue_size, max_batch=int(os.getenv("PIPELINE_INGEST_BATCH", "8"))
+            )
+            self.analytics_stage = Stage("analytics", self.analyze, maxsize=queue_size, max_batch=queue_size)
+            self.publish_stage = Stage("publish", self.publish_sweep, maxsize=1)
+            self.stages = [self.ingest_stage, self.analytics_stage, self.publish_stage]
+            # hrefs already ingested in the current sweep, the first card wins
+            self.seen: Set[str] = set()
+            # a batch of the current sweep failed to commit: its rows are missing
+            self.sweep_lost = False
+
+    async def close_parser(self) -> NoReturn:
         try:
-            self.driver.quit()
-            self.driver.close()
+            for fetcher in set(self.fetchers):
+                await fetcher.close()
         except Exception as e:
             return e
 
     @staticmethod
-    async def alert():
-        async with async_session() as session:
-            collection_dal = CollectionsDAL(session)
-            tracking_dal = TrackingDAL(session)
-
-            collections = await collection_dal.get_all()
-            collections_href = list(map(lambda x: x.href, collections[0]))
-
-            result = []
-            data = get_data_from_json()
-
-            for href in collections_href:
-                output_data = await tracking_dal.calculate_sales_change(href=href, interval_minutes=data['alert_interval'])
-                if output_data is not None:
-                    if output_data[1] >= data['alert_percent']:
-                        result.append(href)
-                else:
-                    pass
-
-            output = []
-
-            for href in result:
-                collection = await collection_dal.get(href=href)
-                output.append(collection)
-
-            for collection in output:
-                
-                growth2 = await tracking_dal.calculate_sales_change(
-                    href=collection.href,
-                    interval_minutes=2
-                )
-
-                growth5 = await tracking_dal.calculate_sales_change(
-                    href=collection.href,
-                    interval_minutes=5
-                )
-
-                growth10 = await tracking_dal.calculate_sales_change(
-                    href=collection.href,
-                    interval_minutes=10
-                )
-
-                growth15 = await tracking_dal.calculate_sales_change(
-                    href=collection.href,
-                    interval_minutes=15
-                )
-
-                growth_alert = await tracking_dal.calculate_sales_change(
-                    href=collection.href,
-                    interval_minutes=data['alert_interval']
-                )
-                
-                bot.send_message(
-                    chat_id="@LMNFT",
-                    text=f'''
+    async def alert(session: AsyncSession, changed_hrefs: Set[str]):
+        data = settings.get()
+        candidates = alert_engine.candidates(changed_hrefs)
+
+        if not candidates:
+            return
+
+        growths = await sales_changes(
+            session,
+            hrefs=list(candidates),
+            intervals=[2, 5, 10, 15, data.alert_interval]
+        )
+
+        alert_growths = {href: growth[data.alert_interval] for href, growth in growths.items()}
+        fired = alert_engine.evaluate(growths=alert_growths, alert_percent=data.alert_percent)
+        collection_priority.note_growth(alert_growths, alert_percent=data.alert_percent)
+
+        output = await CollectionsDAL(session).get_many(fired)
+
+        for collection in output:
+            growth2 = growths[collection.href][2]
+            growth5 = growths[collection.href][5]
+            growth10 = growths[collection.href][10]
+            growth15 = growths[collection.href][15]
+            growth_alert = growths[collection.href][data.alert_interval]
+            velocity = velocity_tracker.velocity(collection.href)
+            eta = eta_minutes(collection.total_stock - collection.sold_stock, velocity)
+
+            outbound.send(
+                chat_id="@LMNFT",
+                text=f'''
 ⚠️ ALERT ⚠️
  Коллекция: <a href="{collection.href}">{collection.title}</a>
-Alert growth: {growth_alert} for last {data['alert_interval']} min.
+Alert growth: {growth_alert} for last {data.alert_interval} min.
 💯 Продано в процентах: {collection.sold_percentage}%
 🛒 Продано: {collection.sold_stock}/{collection.total_stock} штук
 📈 Прирост в (шт/%) за 2 минуты: {growth2[0] if growth2 is not None else 'n/a'} шт / {growth2[1] if growth2 is not None else 'n/a'}%
 📈 Прирост в (шт/%) за 5 минут: {growth5[0] if growth5 is not None else 'n/a'} шт / {growth5[1] if growth5 is not None else 'n/a'}%
 📈 Прирост в (шт/%) за 10 минут: {growth10[0] if growth10 is not None else 'n/a'} шт / {growth10[1] if growth10 is not None else 'n/a'}%
 📈 Прирост в (шт/%) за 15 минут: {growth15[0] if growth15 is not None else 'n/a'} шт / {growth15[1] if growth15 is not None else 'n/a'}%
+🚀 Скорость минта: {velocity:.2f} шт/мин
+⏳ До солд-аута: {format_eta(eta)}
 ''',
-                    parse_mode="html"
-                )
+                parse_mode="html"
+            )
 
     # https://launchmynft.io/explore?page=1&toggle%5BsoldOut%5D=False&toggle%5BtwitterVerified%5D=true&sortBy=collections%2Fsort%2Fdeployed%3Adesc
-    @staticmethod
     def combine_url(
+            self,
             soldOut: bool,
             twitterVerified: bool,
             sort_type: SortType
     ) -> str:
-        BASE_URL = f"https://launchmynft.io/explore?toggle%5BsoldOut%5D={'true' if soldOut else 'false'}&toggle%5BtwitterVerified%5D={'true' if twitterVerified else 'false'}&sortBy={sort_type}"
+        BASE_URL = f"{self.BASE_URL}/explore?toggle%5BsoldOut%5D={'true' if soldOut else 'false'}&toggle%5BtwitterVerified%5D={'true' if twitterVerified else 'false'}&sortBy={sort_type}"
         return BASE_URL
 
-    async def parse_all_collections(self, parse_url: str) -> NoReturn:
+    async def parse_all_collections(self, parse_urls: List[str]) -> None:
+        # every card of a sweep is stamped with the sweep's start time
+        sweep_at = datetime.now()
+
+        async def on_page(cards: List[dict]) -> None:
+            if log.isEnabledFor(logging.DEBUG):
+                for row in cards:
+                    log.debug("card", extra={
+                        "title": row["title"],
+                        "href": row["href"],
+                        "sold_percentage": row["sold_percentage"],
+                        "sold": row["sold_stock"],
+                        "total": row["total_stock"]
+                    })
 
-        page = 0
+            await self.ingest_stage.put(CardBatch(sweep_at, cards))
+
+        await self.scheduler.sweep(parse_urls, on_page=on_page)
+        await self.ingest_stage.put(SweepDone(sweep_at, complete=not self.scheduler.partial))
+
+    async def coordinate_sweep(self, parse_urls: List[str]) -> None:
+        """Enqueues the first page of every listing and waits for the workers to finish the sweep.
+
+        Workers fetch and ingest pages and enqueue the next ones; once no job of the
+        sweep is pending or leased, the sweep is closed here as in standalone mode.
+        """
+        sweep_at = datetime.now()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.sweep_timeout
+
+        async with unit_of_work() as session:
+            status = await JobQueueDAL(session).enqueue(sweep_at, [(url, 1) for url in parse_urls])
+
+        if status is not DBTransactionStatus.SUCCESS:
+            # no jobs to wait for: the sweep is skipped, the next one is enqueued on schedule
+            log.error("sweep not enqueued", extra={"sweep_at": sweep_at.isoformat()})
+            return
 
         while True:
-            page += 1
+            async with unit_of_work() as session:
+                progress = await JobQueueDAL(session).progress(sweep_at)
 
-            self.driver.get(url=f"{parse_url}&page={page}")
-            wait = WebDriverWait(self.driver, 10)
+            if progress.finished:
+                break
 
-            infinity_scroll = wait.until(
-                EC.presence_of_all_elements_located((
-                    By.XPATH,
-                    '//div[@class="infinite-scroll-component__outerdiv"]'
-                )))
+            if loop.time() >= deadline:
+                log.warning("sweep timed out", extra={"sweep_at": sweep_at.isoformat(), **progress.report()})
+                break
 
-            a_tags = infinity_scroll[0].find_elements(By.XPATH, './/a[@style="overflow: hidden;"]')
+            await asyncio.sleep(0.5)
 
-            if a_tags:
+        log.info("sweep jobs", extra=progress.report())
 
-                for a_tag in a_tags:
-                    href = a_tag.get_attribute("href")
+        async with unit_of_work() as session:
+            # workers ingest the cards, velocities are tracked from the collections they wrote
+            collections, status = await CollectionsDAL(session).get_all()
 
-                    strong_tag = a_tag.find_elements(By.XPATH, './/strong')
-                    collection_name = strong_tag[0].text
+            if status is DBTransactionStatus.SUCCESS:
+                velocity_tracker.extend(
+                    [{"href": collection.href, "sold_stock": collection.sold_stock} for collection in collections],
+                    time=sweep_at
+                )
+                velocities = velocity_tracker.dirty(now=sweep_at)
 
-                    if collection_name == '':
-                        continue
+                if await CollectionsDAL(session).update_velocities(velocities) is DBTransactionStatus.SUCCESS:
+                    velocity_tracker.mark_persisted(velocities)
 
-                    sold_percentage = strong_tag[1].text
-                    sold_percentage = sold_percentage.split("%")
-                    sold_percentage = sold_percentage[0]
+            outgoing = [Committed(sweep_at, progress.changed)] if progress.changed else []
+            complete = progress.finished and progress.failed == 0
+            outgoing += await self.close_sweep(session, SweepDone(sweep_at, complete=complete))
 
-                    stock = a_tag.find_elements(By.XPATH, './/span')
+            await JobQueueDAL(session).purge(before=sweep_at - JOB_RETENTION)
 
-                    stock = stock[1].text.split("/")
+        for message in outgoing:
+            await self.analytics_stage.put(message)
 
-                    sold_stock, total_stock = stock[0], stock[1]
+    async def run_workers(self) -> None:
+        workers = [
+            ScrapeWorker(fetcher, name=f"{socket.gethostname()}:{os.getpid()}:{i}")
+            for i, fetcher in enumerate(self.fetchers)
+        ]
+        await asyncio.gather(*[worker.run() for worker in workers])
 
-                    print(f"Collection title: {collection_name}")
-                    print(f"Link: {href}")
-                    print(f"Sold percentage: {sold_percentage}%")
-                    print(f"Sold: {sold_stock}")
-                    print(f"Total: {total_stock}")
-                    print("\n---------------------------\n")
+    async def refresh_hot(self, cadence: Cadence) -> None:
+        """Refreshes hot collections every `hot_interval` seconds until the next sweep is due."""
+        loop = asyncio.get_running_loop()
 
-                    async with async_session() as session:
-                        collection_dal = CollectionsDAL(session)
-                        tracking_dal = TrackingDAL(session)
+        while cadence.remaining() > self.hot_interval:
+            started = loop.time()
+            hot = collection_priority.hot(velocity_tracker.velocities(), pinned=settings.get().pinned)
 
-                        status1 = await collection_dal.create(
-                            href=href,
-                            title=collection_name,
-                            sold_percentage=float(sold_percentage),
-                            total_stock=int(total_stock),
-                            sold_stock=int(sold_stock)
-                        )
+            if hot:
+                async def on_page(cards: List[dict]) -> None:
+                    await self.ingest_stage.put(HotBatch(datetime.now(), cards))
 
-                        status2 = await tracking_dal.create(href=href, sold_to_time=sold_stock)
+                await self.scheduler.refresh(hot, on_page=on_page)
 
-                        if (status1 or status2) is not DBTransactionStatus.SUCCESS:
-                            await bot.send_message(text="ошибка при создании или обновлении коллекций", chat_id="@LMNFT")
-            else:
-                break
+            await asyncio.sleep(max(0.0, self.hot_interval - (loop.time() - started)))
+
+    async def ingest(self, messages: List[Union[CardBatch, HotBatch, SweepDone]]) -> None:
+        rows, sweep_at = [], None
+        outgoing = []
+
+        # one session for the whole batch; downstream stages are fed after it is released
+        async with unit_of_work() as session:
+            for message in messages:
+                if isinstance(message, SweepDone):
+                    outgoing += await self.write_batch(session, rows, sweep_at)
+                    rows, sweep_at = [], None
+                    outgoing += await self.close_sweep(session, message)
+                    continue
+
+                if isinstance(message, HotBatch):
+                    # between sweeps: not deduplicated against a sweep and no sweep of its own
+                    outgoing += await self.write_batch(session, rows, sweep_at)
+                    rows, sweep_at = [], None
+                    outgoing += await self.write_batch(session, message.rows, message.fetched_at, sweep=False)
+                    continue
+
+                sweep_at = message.sweep_at
+
+                for row in message.rows:
+                    if row["href"] not in self.seen:
+                        self.seen.add(row["href"])
+                        rows.append(row)
+
+            outgoing += await self.write_batch(session, rows, sweep_at)
+
+        for message in outgoing:
+            await self.analytics_stage.put(message)
+
+    async def write_batch(
+            self,
+            session: AsyncSession,
+            rows: List[dict],
+            sweep_at: datetime,
+            sweep: bool = True
+    ) -> List[Committed]:
+        if not rows:
+            return []
+
+        changed, status = await IngestDAL(session).ingest(rows, time=sweep_at, record_sweep=False)
+
+        if status is not DBTransactionStatus.SUCCESS:
+            outbound.send(text="ошибка при создании или обновлении коллекций", chat_id="@LMNFT")
+            if sweep:
+                self.sweep_lost = True
+            return []
+
+        timeseries.extend(rows, time=sweep_at, sweep=False)
+
+        velocity_tracker.extend(rows, time=sweep_at)
+        # all tracked collections: the ones not on these pages decay too
+        velocities = velocity_tracker.dirty(now=sweep_at)
+
+        if await CollectionsDAL(session).update_velocities(velocities) is DBTransactionStatus.SUCCESS:
+            velocity_tracker.mark_persisted(velocities)
+
+        return [Committed(sweep_at, changed)] if changed else []
+
+    async def close_sweep(self, session: AsyncSession, message: SweepDone) -> List[SweepDone]:
+        self.seen.clear()
+
+        if datetime.now() >= self.retention_due:
+            if await RetentionDAL(session).run() is not DBTransactionStatus.SUCCESS:
+                # rolled back as a whole: nothing was rolled up or dropped, tried again next interval
+                log.error("retention run rolled back")
+            self.retention_due = datetime.now() + RUN_INTERVAL
+
+        lost, self.sweep_lost = self.sweep_lost, False
+
+        if not message.complete or lost:
+            # collections on the missing pages may have moved: growth windows don't start here
+            log.warning("partial sweep not recorded", extra={"sweep_at": message.sweep_at.isoformat(), "lost": lost})
+            self.last_sweep_at = message.sweep_at
+            return [message]
+
+        # recorded even if no card was ingested: in an adaptive sweep every page may be unchanged,
+        # the values held since the last rows are still what a window starting here starts from
+        status = await IngestDAL(session).record_sweep(message.sweep_at)
+
+        if status is DBTransactionStatus.SUCCESS:
+            if timeseries.attached:
+                timeseries.add_sweep(message.sweep_at)
+            self.last_sweep_at = message.sweep_at
+
+        return [message]
+
+    async def analyze(self, messages: List[Union[Committed, SweepDone]]) -> None:
+        # alerts of all batches committed meanwhile are evaluated together
+        changed = set()
+        finished = []
+
+        async with unit_of_work() as session:
+            for message in messages:
+                if isinstance(message, Committed):
+                    changed |= message.changed
+                    continue
+
+                if changed:
+                    with timed(ALERT_SECONDS):
+                        await self.alert(session, changed)
+                    changed = set()
+
+                await self.finish_sweep(session, message)
+                finished.append(message)
+
+            if changed:
+                with timed(ALERT_SECONDS):
+                    await self.alert(session, changed)
+
+        for message in finished:
+            await self.publish_stage.put(message)
+
+    async def finish_sweep(self, session: AsyncSession, message: SweepDone) -> None:
+        await refresh_rankings(session, settings.get())
+
+        if self.last_sweep_at == message.sweep_at:
+            # new data version: the bot drops the cached pages of the previous sweep
+            if self.events:
+                await events.notify(session, SweepEvent(data_version(message.sweep_at), message.sweep_at))
+
+    async def publish_sweep(self, messages: List[SweepDone]) -> None:
+        if not self.events:
+            # no event channel: nobody else refreshes the channel message
+            publish(message_id=settings.get().message_to_edit)
+
+        for stage in self.stages:
+            log.info("stage", extra=stage.report())
+        log.info("db pool", extra=pool_status())
+
+    @staticmethod
+    def on_settings_change(old, new) -> None:
+        # thresholds changed in the bot process, alert hysteresis starts over
+        if (old.alert_interval, old.alert_percent) != (new.alert_interval, new.alert_percent):
+            alert_engine.reset()
 
     async def main(self):
-        while True:
-            for sort in SortType:
-                url = self.combine_url(soldOut=False, twitterVerified=True, sort_type=sort.value)
-                await self.parse_all_collections(parse_url=url)
+        setup_logging()
+        await serve_metrics(os.getenv("METRICS_HOST", "127.0.0.1"), int(os.getenv("METRICS_PORT", "9100")))
 
-                msg_editor = get_data_from_json()
+        if self.mode == "worker":
+            await self.run_workers()
+            return
 
-                await self.alert()
+        async with unit_of_work() as session:
+            if self.mode == "standalone":
+                # only fed by ingestion in this process, a coordinator reads growth from the db
+                await timeseries.warm_start(session)
+            await velocity_tracker.warm_start(session)
 
-                await bot.edit_message_text(
-                    text=await gen_message(),
-                    chat_id="@LMNFT",
-                    message_id=msg_editor["message_to_edit"],
-                    parse_mode="html"
-                )
-                await bot.edit_message_reply_markup(
-                    chat_id="@LMNFT",
-                    message_id=msg_editor["message_to_edit"],
-                    reply_markup=gen_markup()
-                )
+        settings.subscribe(self.on_settings_change)
+        asyncio.create_task(settings.watch())
+
+        for stage in self.stages:
+            stage.start()
+
+        cadence = Cadence(self.interval)
+        cadence.start()
+
+        while True:
+            parse_urls = [
+                self.combine_url(soldOut=False, twitterVerified=True, sort_type=sort.value)
+                for sort in SortType
+            ]
+
+            if self.mode == "coordinator":
+                await self.coordinate_sweep(parse_urls)
+            else:
+                await self.parse_all_collections(parse_urls=parse_urls)
+                await self.refresh_hot(cadence)
 
-            print("sleep 15 sec")
-            time.sleep(15)
+            await cadence.wait()
 
 
-p = Parser()
-asyncio.run(p.main())
+if __name__ == "__main__":
+    p = Parser()
+    asyncio.run(p.main())
@@ -0,0 +1,274 @@
+"""Benchmarks for ingestion, growth queries, alerts and page rendering.
+
+Loads a synthetic change-only history (collections x hours of sweeps) into
+the database given by --database-url, times the hot paths and writes one
+JSON document with p50/p99 latencies and throughput per benchmark.
+
+    python -m benchmarks.run --collections 1000 --hours 24 --output before.json
+    python -m benchmarks.run --compare before.json after.json
+
+The default database is a fresh sqlite file; a Postgres URL must point at a
+scratch database, its tables are dropped and recreated.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class Recorder:
+    def __init__(self):
+        self.results: Dict[str, dict] = {}
+
+    async def measure(self, name: str, call, repeat: int, items: int = 1) -> None:
+        """Runs `call()` (awaited if it returns a coroutine) `repeat` times;
+        `items` is the work done per call (rows, hrefs, ...)."""
+        samples = []
+
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = call()
+            if asyncio.iscoroutine(result):
+                await result
+            samples.append(time.perf_counter() - started)
+
+        self.record(name, samples, items)
+
+    def record(self, name: str, samples: List[float], items: int = 1) -> None:
+        total = sum(samples)
+        self.results[name] = {
+            "n": len(samples),
+            "items_per_call": items,
+            "p50_ms": round(percentile(samples, 50) * 1000, 3),
+            "p99_ms": round(percentile(samples, 99) * 1000, 3),
+            "mean_ms": round(total / len(samples) * 1000, 3),
+            "max_ms": round(max(samples) * 1000, 3),
+            "throughput_per_s": round(len(samples) * items / total, 1) if total else None
+        }
+        print(f"{name:32} p50 {self.results[name]['p50_ms']:>10} ms  p99 {self.results[name]['p99_ms']:>10} ms", file=sys.stderr)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(__file__), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+async def run(args) -> dict:
+    # the app modules read their configuration at import time
+    from database import Base
+    from database import models  # noqa: F401 - registers the tables
+    from database.session import engine, async_session
+    from database.dal import CollectionsDAL, TrackingDAL, IngestDAL
+    from analytics.timeseries import timeseries, sales_changes, sales_change_matrix
+    from analytics.alerts import AlertEngine
+    from analytics.ranking import refresh_rankings
+    from services.settings import settings
+    from services.render_cache import render_cache
+    from benchmarks.synthetic import make_collections, load_history, simulate
+    import bot
+
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    intervals = [2, 5, 10, 15]
+
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+
+    collections = make_collections(args.collections, rng)
+    hrefs = [collection["href"] for collection in collections]
+    step = timedelta(seconds=args.step)
+    now = datetime.now()
+
+    started = time.perf_counter()
+    async with async_session() as session:
+        loaded = await load_history(session, collections, now - timedelta(hours=args.hours), now, step, rng)
+    load_seconds = time.perf_counter() - started
+    print(f"loaded {loaded} in {load_seconds:.1f}s", file=sys.stderr)
+
+    async with async_session() as session:
+        tracking_dal = TrackingDAL(session)
+
+        sample = rng.sample(hrefs, min(args.repeat, len(hrefs)))
+        samples = []
+        for href in sample:
+            started = time.perf_counter()
+            await tracking_dal.calculate_sales_change(href, 15)
+            samples.append(time.perf_counter() - started)
+        recorder.record("growth_single_db", samples)
+
+        page = rng.sample(hrefs, min(10, len(hrefs)))
+        await recorder.measure(
+            "growth_page_db", lambda: tracking_dal.calculate_sales_changes(page, intervals), args.repeat, len(page)
+        )
+        await recorder.measure(
+            "growth_all_db", lambda: tracking_dal.calculate_sales_changes(hrefs, intervals), 3, len(hrefs)
+        )
+        # one tracking window query, growth computed on arrays
+        await recorder.measure(
+            "growth_all_window", lambda: sales_change_matrix(session, hrefs, intervals), 3, len(hrefs)
+        )
+        await recorder.measure(
+            "growth_all_db_long", lambda: tracking_dal.calculate_sales_changes(hrefs, [60, 360]), 3, len(hrefs)
+        )
+
+        # bot process view: no in-memory series, rankings materialized by the scraper
+        await recorder.measure("refresh_rankings", lambda: refresh_rankings(session, settings.get()), 3, len(hrefs))
+
+    total_pages = max(1, -(-len(hrefs) // settings.get().items_per_page))
+    pages = list(range(1, min(total_pages, args.pages) + 1))
+    settings.update(total_pages=total_pages)
+
+    for cached in (False, True):
+        samples = []
+        for page in pages:
+            settings.update(user_state=page)
+            if cached:
+                await bot.gen_message()
+            else:
+                render_cache.clear()
+            started = time.perf_counter()
+            await bot.gen_message()
+            samples.append(time.perf_counter() - started)
+        recorder.record("render_page_cached" if cached else "render_page", samples)
+
+    # scraper process view: in-memory series warmed from the db
+    started = time.perf_counter()
+    async with async_session() as session:
+        await timeseries.warm_start(session)
+    recorder.record("timeseries_warm_start", [time.perf_counter() - started], len(hrefs))
+
+    await recorder.measure(
+        "growth_all_memory", lambda: timeseries.calculate_sales_changes(hrefs, intervals),
+        args.repeat, len(hrefs)
+    )
+
+    active = [collection["href"] for collection in collections if collection["rate"]]
+    alert_engine = AlertEngine()
+
+    async def evaluate_alerts():
+        async with async_session() as session:
+            growths = await sales_changes(session, active, intervals)
+        alert_engine.evaluate({href: growth[5] for href, growth in growths.items()}, alert_percent=2)
+
+    await recorder.measure("alert_evaluation", evaluate_alerts, args.repeat, len(active))
+
+    # writes last: they move the data the read benchmarks ran against
+    async with async_session() as session:
+        collections_dal = CollectionsDAL(session)
+        sample = rng.sample(collections, min(args.repeat, len(collections)))
+        samples = []
+        for collection in sample:
+            started = time.perf_counter()
+            await collections_dal.create(
+                href=collection["href"],
+                title=collection["title"],
+                sold_percentage=collection["sold_percentage"],
+                total_stock=collection["total_stock"],
+                sold_stock=collection["sold_stock"] + 1
+            )
+            samples.append(time.perf_counter() - started)
+        await session.commit()
+        recorder.record("collections_create", samples)
+
+    samples = []
+    live = simulate(collections, now + step, now + step * args.sweeps, step, rng)
+    for sweep_at, _ in live:
+        rows = [
+            {key: collection[key] for key in ("href", "title", "total_stock", "sold_stock", "sold_percentage")}
+            for collection in collections
+        ]
+        async with async_session() as session:
+            started = time.perf_counter()
+            await IngestDAL(session).ingest(rows, time=sweep_at)
+            samples.append(time.perf_counter() - started)
+    recorder.record("ingest_sweep", samples, len(collections))
+
+    await engine.dispose()
+
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "dialect": engine.dialect.name,
+            "python": platform.python_version(),
+            "started_at": now.isoformat(timespec="seconds"),
+            "collections": args.collections,
+            "hours": args.hours,
+            "step_seconds": args.step,
+            "seed": args.seed,
+            "loaded": loaded,
+            "load_seconds": round(load_seconds, 3)
+        },
+        "results": recorder.results
+    }
+
+
+def compare(before_path: str, after_path: str) -> None:
+    with open(before_path) as before_file, open(after_path) as after_file:
+        before, after = json.load(before_file)["results"], json.load(after_file)["results"]
+
+    print(f"{'benchmark':32} {'p50 before':>12} {'p50 after':>12} {'change':>8} {'p99 before':>12} {'p99 after':>12} {'change':>8}")
+
+    for name in sorted(set(before) & set(after)):
+        row = [name]
+        for key in ("p50_ms", "p99_ms"):
+            old, new = before[name][key], after[name][key]
+            change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+            row += [f"{old:.3f}", f"{new:.3f}", change]
+        print(f"{row[0]:32} {row[1]:>12} {row[2]:>12} {row[3]:>8} {row[4]:>12} {row[5]:>12} {row[6]:>8}")
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--database-url", default=None, help="default: a fresh sqlite file")
+    arg_parser.add_argument("--collections", type=int, default=1000)
+    arg_parser.add_argument("--hours", type=float, default=24)
+    arg_parser.add_argument("--step", type=float, default=15, help="seconds between sweeps")
+    arg_parser.add_argument("--repeat", type=int, default=50)
+    arg_parser.add_argument("--pages", type=int, default=20, help="channel pages rendered")
+    arg_parser.add_argument("--sweeps", type=int, default=20, help="live sweeps ingested")
+    arg_parser.add_argument("--seed", type=int, default=1)
+    arg_parser.add_argument("--output", default=None, help="default: stdout")
+    arg_parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = arg_parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="lmnft-bench-")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite+aiosqlite:///{workdir}/bench.db"
+    os.environ["SETTINGS_PATH"] = os.path.join(workdir, "settings.json")
+    # bot.gen_message() is rendered only, nothing is sent
+    os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+
+    report = asyncio.run(run(args))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import random
+from datetime import datetime, timedelta
+from typing import Iterator, List, Tuple
+
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Collections, Tracking, Sweep
+from database.retention import HEARTBEAT
+
+CHUNK = 10000
+
+
+def make_collections(count: int, rng: random.Random, active_share: float = 0.1) -> List[dict]:
+    """Collections as scraped cards, plus the expected mints per sweep (`rate`).
+
+    Most collections sit still; `active_share` of them mint at a log-normal rate.
+    """
+    collections = []
+
+    for i in range(count):
+        total_stock = rng.choice([555, 777, 1000, 2222, 3333, 5000, 10000])
+        sold_stock = rng.randint(0, total_stock // 2)
+
+        collections.append({
+            "href": f"https://launchmynft.io/collections/bench/{i:06d}",
+            "title": f"Bench collection {i}",
+            "total_stock": total_stock,
+            "sold_stock": sold_stock,
+            "sold_percentage": round(sold_stock / total_stock * 100, 2),
+            "rate": rng.lognormvariate(-1, 1) if rng.random() < active_share else 0.0
+        })
+
+    return collections
+
+
+def mint(collection: dict, rng: random.Random) -> bool:
+    if not collection["rate"] or collection["sold_stock"] >= collection["total_stock"]:
+        return False
+
+    minted = int(rng.expovariate(1 / collection["rate"]))
+
+    if not minted:
+        return False
+
+    collection["sold_stock"] = min(collection["sold_stock"] + minted, collection["total_stock"])
+    collection["sold_percentage"] = round(collection["sold_stock"] / collection["total_stock"] * 100, 2)
+    return True
+
+
+def simulate(
+        collections: List[dict],
+        start: datetime,
+        end: datetime,
+        step: timedelta,
+        rng: random.Random
+) -> Iterator[Tuple[datetime, List[Tuple[str, int]]]]:
+    """Sweeps from `start` to `end`, each with the tracking rows change-only
+    ingestion would have written: changed collections plus heartbeats."""
+    period = int(HEARTBEAT / step) + 1
+    active = [collection for collection in collections if collection["rate"]]
+    last_written = {}
+
+    sweep = 0
+    time = start
+
+    while time <= end:
+        if sweep % period == 0:
+            # every collection is written at the first sweep, then heartbeats line up
+            for collection in collections:
+                mint(collection, rng)
+            rows = [(collection["href"], collection["sold_stock"]) for collection in collections]
+            last_written = {collection["href"]: sweep for collection in collections}
+        else:
+            rows = []
+
+            for collection in active:
+                if mint(collection, rng) or sweep - last_written[collection["href"]] >= period:
+                    rows.append((collection["href"], collection["sold_stock"]))
+                    last_written[collection["href"]] = sweep
+
+        yield time, rows
+
+        sweep += 1
+        time += step
+
+
+async def load_history(
+        db_session: AsyncSession,
+        collections: List[dict],
+        start: datetime,
+        end: datetime,
+        step: timedelta,
+        rng: random.Random
+) -> dict:
+    """Writes the simulated history; collections end up with their final stock."""
+    tracking, sweeps = [], []
+    tracking_rows = 0
+
+    # collections first, tracking rows reference them
+    await db_session.execute(insert(Collections), [
+        {key: collection[key] for key in ("href", "title", "total_stock", "sold_stock", "sold_percentage")}
+        for collection in collections
+    ])
+
+    for time, rows in simulate(collections, start, end, step, rng):
+        sweeps.append({"time": time})
+        tracking.extend({"collection_href": href, "time": time, "sold_to_time": sold} for href, sold in rows)
+
+        if len(tracking) >= CHUNK:
+            await db_session.execute(insert(Tracking), tracking)
+            tracking_rows += len(tracking)
+            tracking = []
+
+    if tracking:
+        await db_session.execute(insert(Tracking), tracking)
+        tracking_rows += len(tracking)
+
+    await db_session.execute(insert(Sweep), sweeps)
+
+    await db_session.execute(
+        update(Collections.__table__)
+        .where(Collections.__table__.c.href == bindparam("b_href"))
+        .values(sold_stock=bindparam("b_sold_stock"), sold_percentage=bindparam("b_sold_percentage")),
+        [
+            {
+                "b_href": collection["href"],
+                "b_sold_stock": collection["sold_stock"],
+                "b_sold_percentage": collection["sold_percentage"]
+            }
+            for collection in collections
+        ]
+    )
+
+    await db_session.commit()
+
+    return {"collections": len(collections), "sweeps": len(sweeps), "tracking_rows": tracking_rows}
@@ -1,157 +1,146 @@
 import asyncio
-import json
+import logging
 import math
 import os
 from datetime import datetime
 
 from telebot.async_telebot import AsyncTeleBot
-from telebot import types
+from telebot import types, asyncio_helper
 from dotenv import load_dotenv
 
-from database.dal import CollectionsDAL, TrackingDAL
+from database.dal import RankingDAL, TrackingDAL
 from database.session import async_session, DBTransactionStatus
+from analytics.timeseries import timeseries, sales_changes
+from analytics.ranking import settings_key, ensure_ranking
+from analytics.velocity import eta_minutes, format_eta
+from services.settings import settings
+from services.outbound import OutboundQueue
+from services.render_cache import render_cache, render_key, data_version
+from services import events
+from services.events import SweepEvent
+from services.log import setup_logging
+from services.metrics import serve as serve_metrics
+
+log = logging.getLogger("bot")
 
 load_dotenv()
 
+if os.getenv("TELEGRAM_API_URL"):
+    # e.g. services/mock_bot_api.py
+    asyncio_helper.API_URL = os.getenv("TELEGRAM_API_URL").rstrip("/") + "/bot{0}/{1}"
+
 bot = AsyncTeleBot(str(os.getenv("BOT_TOKEN")))
+outbound = OutboundQueue(bot, chat_interval=float(os.getenv("TELEGRAM_CHAT_INTERVAL", "3")))
 
 
-def update_json(
-        user_state: int = None,
-        message_to_edit: int = None,
-        items_per_page: int = None,
-        total_pages: int = None,
-        min_stock: int = None,
-        sort_type: str = None,
-        growth_sort_time_interval: int = None,
-        alert_interval: int = None,
-        alert_percent: int = None
-):
-    with open("msg_to_edit.json", 'r') as json_file:
-        data = json.load(json_file)
+def set_total_pages(total: int) -> None:
+    data = settings.get()
+    total_pages = max(1, math.ceil(total / data.items_per_page))
 
-    data['user_state'] = max(1, min(user_state if user_state is not None else data['user_state'], total_pages if total_pages is not None else data['total_pages'])) if user_state is not None else data['user_state']
-    data['message_to_edit'] = message_to_edit if message_to_edit is not None else data['message_to_edit']
-    data['items_per_page'] = items_per_page if items_per_page is not None else data['items_per_page']
-    data['total_pages'] = total_pages if total_pages is not None else data['total_pages']
-    data['min_stock'] = min_stock if min_stock is not None else data['min_stock']
-    data['sort_type'] = sort_type if sort_type is not None else data['sort_type']
-    data['growth_sort_time_interval'] = growth_sort_time_interval if growth_sort_time_interval is not None else data['growth_sort_time_interval']
-    data['alert_interval'] = alert_interval if alert_interval is not None else data['alert_interval']
-    data['alert_percent'] = alert_percent if alert_percent is not None else data['alert_percent']
+    if data.total_pages != total_pages:
+        settings.update(total_pages=total_pages)
 
-    with open("msg_to_edit.json", 'w') as json_file:
-        json.dump(data, json_file, indent=4)
 
+async def follow_data_version() -> None:
+    """Without sweep events the data version is read from the last sweep in the database."""
+    if events.enabled():
+        return
 
-def get_data_from_json() -> dict[str: int]:
-    with open("msg_to_edit.json", 'r') as json_file:
-        data = json.load(json_file)
+    async with async_session() as session:
+        last_sweep = await TrackingDAL(session).last_sweep()
 
-    return data
+    render_cache.advance(data_version(last_sweep.time if last_sweep is not None else None))
 
 
 async def gen_message():
-    async with async_session() as session:
-        collection_dal = CollectionsDAL(session)
-        tracking_dal = TrackingDAL(session)
-
-        data = get_data_from_json()
-
-        sort_type = data['sort_type']
+    data = settings.get()
 
-        print(f"SORT TYPE: {sort_type}")
+    await follow_data_version()
+    version = render_cache.version
 
-        if sort_type == "by_stock":
+    # pagination between sweeps renders the same pages again
+    cached = render_cache.get(render_key(data))
+    if cached is not None:
+        message, total = cached
+        # the page count may have been rendered for other settings meanwhile
+        set_total_pages(total)
+        return message
 
-            all_collections, status = await collection_dal.get_all()
-            filtered_collections = [collection for collection in all_collections if collection.sold_percentage != 100]
-            filtered_collections = [collection for collection in filtered_collections if collection.total_stock > data['min_stock']]
-            sorted_filtered_collections = sorted(filtered_collections, key=lambda x: x.sold_percentage, reverse=True)
+    async with async_session() as session:
+        ranking_dal = RankingDAL(session)
 
-        elif sort_type == "by_growth":
-            all_collections, status = await collection_dal.get_all()
-            filtered_collections = [collection for collection in all_collections if collection.sold_percentage != 100]
-            filtered_collections = [collection for collection in filtered_collections if collection.total_stock > data['min_stock']]
-            filtered_collections = sorted(filtered_collections, key=lambda x: x.sold_percentage, reverse=True)
+        log.debug("render page", extra={"sort_type": data.sort_type, "page": data.user_state})
 
-            with_change = {}
-            without_change = {}
+        start_index = (data.user_state - 1) * data.items_per_page
+        end_index = start_index + data.items_per_page
 
-            for i in range(len(filtered_collections)):
-                href = filtered_collections[i].href
-                interval_minutes = data['growth_sort_time_interval']
-                growth = await tracking_dal.calculate_sales_change(href=href, interval_minutes=interval_minutes)
+        page_collections, total = await ranking_dal.get_page(settings_key(data), start_index, end_index)
 
-                if growth is not None:
-                    with_change[href] = growth[1]
-                else:
-                    without_change[href] = None
+        if total is None:
+            # settings changed since the last scrape cycle, materialize this sort mode now
+            status = await ensure_ranking(session, data)
+            # after a failed replace the scraper may still have materialized it meanwhile
+            page_collections, total = await ranking_dal.get_page(settings_key(data), start_index, end_index)
 
-            sorted_with_change = dict(sorted(with_change.items(), key=lambda item: item[1], reverse=True))
-            collections_without_change = [await collection_dal.get(href=href) for href in without_change.keys()]
-            collections_without_change = sorted(collections_without_change, key=lambda x: x.sold_percentage, reverse=True)
-            sorted_filtered_collections = [await collection_dal.get(href=href) for href in sorted_with_change.keys()]
-            sorted_filtered_collections += collections_without_change
+            if total is None and status == DBTransactionStatus.ROLLBACK:
+                return "Error retrieving collections."
 
-        update_json(total_pages=math.ceil(len(sorted_filtered_collections) / 10))
+            total = total or 0
 
-        if status == DBTransactionStatus.ROLLBACK or sorted_filtered_collections is None:
-            return "Error retrieving collections."
+        set_total_pages(total)
 
-        msg_editor = get_data_from_json()
+        if not page_collections and total:
+            settings.update(user_state=math.ceil(total / data.items_per_page))
+            return await gen_message()
 
-        start_index = (msg_editor["user_state"] - 1) * msg_editor["items_per_page"]
-        end_index = start_index + msg_editor["items_per_page"]
+        msg_editor = settings.get()
+        # time of the last sweep rather than now(), so unchanged data renders the same text
+        last_sweep = await TrackingDAL(session).last_sweep()
 
         message = f'''
-⌛️ Last update: {datetime.now()}
-Min stock: {msg_editor['min_stock']}
-Alert interval(min)/percent(%): {msg_editor['alert_interval']}min / {msg_editor['alert_percent']}%
-Sort type: {msg_editor['sort_type']}
+⌛️ Last update: {last_sweep.time if last_sweep is not None else datetime.now()}
+Min stock: {msg_editor.min_stock}
+Alert interval(min)/percent(%): {msg_editor.alert_interval}min / {msg_editor.alert_percent}%
+Sort type: {msg_editor.sort_type}
 '''
-        if msg_editor['sort_type'] == 'by_growth':
-            message += f'''Growth sort time interval: {msg_editor['growth_sort_time_interval']}'''
-
-        for i in range(start_index, end_index):
-            growth2 = await tracking_dal.calculate_sales_change(
-                href=sorted_filtered_collections[i].href,
-                interval_minutes=2
-            )
-
-            growth5 = await tracking_dal.calculate_sales_change(
-                href=sorted_filtered_collections[i].href,
-                interval_minutes=5
-            )
-
-            growth10 = await tracking_dal.calculate_sales_change(
-                href=sorted_filtered_collections[i].href,
-                interval_minutes=10
-            )
-
-            growth15 = await tracking_dal.calculate_sales_change(
-                href=sorted_filtered_collections[i].href,
-                interval_minutes=15
-            )
+        if msg_editor.sort_type == 'by_growth':
+            message += f'''Growth sort time interval: {msg_editor.growth_sort_time_interval}'''
+
+        growths = await sales_changes(
+            session,
+            hrefs=[collection.href for collection in page_collections],
+            intervals=[2, 5, 10, 15]
+        )
+
+        for collection in page_collections:
+            growth2 = growths[collection.href][2]
+            growth5 = growths[collection.href][5]
+            growth10 = growths[collection.href][10]
+            growth15 = growths[collection.href][15]
+            velocity = collection.mint_velocity or 0
+            eta = eta_minutes(collection.total_stock - collection.sold_stock, velocity)
 
             message += f'''
-🔗 Коллекция: <a href="{sorted_filtered_collections[i].href}">{sorted_filtered_collections[i].title}</a>
-💯 Продано в процентах: {sorted_filtered_collections[i].sold_percentage}%
-🛒 Продано: {sorted_filtered_collections[i].sold_stock}/{sorted_filtered_collections[i].total_stock} штук
+🔗 Коллекция: <a href="{collection.href}">{collection.title}</a>
+💯 Продано в процентах: {collection.sold_percentage}%
+🛒 Продано: {collection.sold_stock}/{collection.total_stock} штук
 📈 Прирост в (шт/%) за 2 минуты: {growth2[0] if growth2 is not None else 'n/a'} шт / {growth2[1] if growth2 is not None else 'n/a'}%
 📈 Прирост в (шт/%) за 5 минут: {growth5[0] if growth5 is not None else 'n/a'} шт / {growth5[1] if growth5 is not None else 'n/a'}%
 📈 Прирост в (шт/%) за 10 минут: {growth10[0] if growth10 is not None else 'n/a'} шт / {growth10[1] if growth10 is not None else 'n/a'}%
 📈 Прирост в (шт/%) за 15 минут: {growth15[0] if growth15 is not None else 'n/a'} шт / {growth15[1] if growth15 is not None else 'n/a'}%
+🚀 Скорость минта: {velocity:.2f} шт/мин
+⏳ До солд-аута: {format_eta(eta)}
 \n
 '''
 
 # "Изменение за 15 минут: {absolute_change_15}штук/{percentage_change_15}%
 
+        render_cache.put(render_key(msg_editor), (message, total), version)
         return message
 
 
 def gen_markup():
-    msg_editor = get_data_from_json()
+    msg_editor = settings.get()
     markup = types.InlineKeyboardMarkup(row_width=3)
     markup.row_width = 2
     markup.add(
@@ -159,10 +148,39 @@ def gen_markup():
         types.InlineKeyboardButton("Next ➡️", callback_data="next"),
         types.InlineKeyboardButton("⬅️ Back 5", callback_data="back5"),
         types.InlineKeyboardButton("Next 5 ➡️", callback_data="next5"),
-        types.InlineKeyboardButton(f"📄 Page: {msg_editor['user_state']} / {msg_editor['total_pages']}", callback_data="page"))
+        types.InlineKeyboardButton(f"📄 Page: {msg_editor.user_state} / {msg_editor.total_pages}", callback_data="page"))
     return markup
 
 
+async def render_message():
+    return await gen_message(), gen_markup()
+
+
+def publish(chat_id: int | str = "@LMNFT", message_id: int = None) -> None:
+    """Queues an edit of the channel message, coalesced with any pending one.
+
+    The channel is always addressed as "@LMNFT", also from callback queries that
+    carry its numeric id: the outbound queue paces and coalesces per chat id.
+    """
+    if message_id is None:
+        message_id = settings.get().message_to_edit
+
+    if message_id is not None:
+        outbound.edit(chat_id, message_id, render_message)
+
+
+async def on_sweep(event: SweepEvent) -> None:
+    """The scraper committed a sweep: catch up on its samples, drop stale pages and refresh the channel message."""
+    async with async_session() as session:
+        await timeseries.catch_up(session)
+
+    # cached pages of the previous sweeps are stale
+    render_cache.advance(event.sweep_id)
+    log.debug("sweep event", extra={"sweep_id": event.sweep_id})
+
+    publish()
+
+
 async def send_message(chat_id: int | str, message: str):
     msg = await bot.send_message(
         chat_id=chat_id,
@@ -178,51 +196,29 @@ async def send_message(chat_id: int | str, message: str):
 async def HandlerInlineMiddleware(call):
 
     if "back" in call.data:
-        msg_editor = get_data_from_json()
-
-        if msg_editor['user_state'] > 1:
-            update_json(user_state=msg_editor['user_state'] - 1 if call.data == "back" else msg_editor['user_state'] - 5)
-
-            msg_editor = get_data_from_json()
-
-            print(msg_editor['user_state'])
-            if msg_editor['user_state'] < 1:
-                update_json(user_state=1)
-
-            await bot.edit_message_text(
-                text=await gen_message(),
-                chat_id=call.message.chat.id,
-                message_id=msg_editor['message_to_edit'],
-                parse_mode="html"
-            )
-            await bot.edit_message_reply_markup(
-                chat_id=call.message.chat.id,
-                message_id=msg_editor['message_to_edit'],
-                reply_markup=gen_markup()
-            )
+        msg_editor = settings.get()
+
+        if msg_editor.user_state > 1:
+            settings.update(user_state=msg_editor.user_state - 1 if call.data == "back" else msg_editor.user_state - 5)
+
+            msg_editor = settings.get()
+
+            if msg_editor.user_state < 1:
+                settings.update(user_state=1)
+
+            publish(message_id=msg_editor.message_to_edit)
+            await bot.answer_callback_query(call.id)
         else:
             await bot.answer_callback_query(call.id, text="Вы на первой странице")
 
     if "next" in call.data:
-        msg_editor = get_data_from_json()
-        if msg_editor['user_state'] < msg_editor['total_pages']:
-            update_json(user_state=msg_editor['user_state'] + 1 if call.data == "next" else msg_editor['user_state'] + 5)
-
-            msg_editor = get_data_from_json()
-            if msg_editor['user_state'] > msg_editor['total_pages'] - 1:
-                update_json(total_pages=msg_editor['total_pages'] - 1)
-
-            await bot.edit_message_text(
-                text=await gen_message(),
-                chat_id=call.message.chat.id,
-                message_id=msg_editor['message_to_edit'],
-                parse_mode="html"
-            )
-            await bot.edit_message_reply_markup(
-                chat_id=call.message.chat.id,
-                message_id=msg_editor['message_to_edit'],
-                reply_markup=gen_markup()
-            )
+        msg_editor = settings.get()
+        if msg_editor.user_state < msg_editor.total_pages:
+            settings.update(user_state=msg_editor.user_state + 1 if call.data == "next" else msg_editor.user_state + 5)
+
+            msg_editor = settings.get()
+            publish(message_id=msg_editor.message_to_edit)
+            await bot.answer_callback_query(call.id)
         else:
             await bot.answer_callback_query(call.id, text="Вы на последней странице")
 
@@ -236,6 +232,11 @@ async def start(message) -> None:
 /min_stock <b>min_value</b> - минимальная планка стока для сортировки
 /by_stock - выбрать тип сортировки по кол-ву стока
 /by_growth <b>sort_time_interval</b> - выбрать тип сортировки по приросту за указанный интервал
+/by_velocity - выбрать тип сортировки по скорости минта
+/by_eta - выбрать тип сортировки по времени до солд-аута
+/pin <b>href</b> - закрепить коллекцию: она обновляется чаще остальных
+/unpin <b>href</b> - открепить коллекцию
+/pinned - закрепленные коллекции
 /alert <b>time_interval</b> <b>growth_percent%</b> - установить временной интервал и процентный прирост для алерта
 ''',
         reply_markup=types.ReplyKeyboardRemove(),
@@ -259,25 +260,14 @@ async def alert_interval(message) -> None:
                                        text="Вы не можете установить процентный рост меньше 1%")
 
             else:
-                update_json(alert_interval=data[1], alert_percent=data[2])
+                settings.update(alert_interval=data[1], alert_percent=data[2])
 
                 await bot.send_message(
                     chat_id=message.chat.id,
                     text=f"Вы установили алерт на инетрвал {data[1]} минут с процентным ростом {data[2]}"
                 )
 
-                msg_editor = get_data_from_json()
-                await bot.edit_message_text(
-                    text=await gen_message(),
-                    chat_id="@LMNFT",
-                    message_id=msg_editor['message_to_edit'],
-                    parse_mode="html"
-                )
-                await bot.edit_message_reply_markup(
-                    chat_id="@LMNFT",
-                    message_id=msg_editor['message_to_edit'],
-                    reply_markup=gen_markup()
-                )
+                publish()
 
         else:
             await bot.send_message(chat_id=message.chat.id, text="Не корректные значения")
@@ -285,7 +275,7 @@ async def alert_interval(message) -> None:
 
 @bot.message_handler(commands=["by_stock"])
 async def by_stock(message) -> None:
-    update_json(sort_type="by_stock")
+    settings.update(sort_type="by_stock")
 
     await bot.send_message(
         chat_id=message.chat.id,
@@ -294,17 +284,76 @@ async def by_stock(message) -> None:
         parse_mode="html"
     )
 
-    msg_editor = get_data_from_json()
-    await bot.edit_message_text(
-        text=await gen_message(),
-        chat_id="@LMNFT",
-        message_id=msg_editor['message_to_edit'],
+    publish()
+
+
+@bot.message_handler(commands=["by_velocity"])
+async def by_velocity(message) -> None:
+    settings.update(sort_type="by_velocity")
+
+    await bot.send_message(
+        chat_id=message.chat.id,
+        text="Выбран тип сортировки по скорости минта",
+        reply_markup=types.ReplyKeyboardRemove(),
+        parse_mode="html"
+    )
+
+    publish()
+
+
+@bot.message_handler(commands=["by_eta"])
+async def by_eta(message) -> None:
+    settings.update(sort_type="by_eta")
+
+    await bot.send_message(
+        chat_id=message.chat.id,
+        text="Выбран тип сортировки по времени до солд-аута",
+        reply_markup=types.ReplyKeyboardRemove(),
         parse_mode="html"
     )
-    await bot.edit_message_reply_markup(
-        chat_id="@LMNFT",
-        message_id=msg_editor['message_to_edit'],
-        reply_markup=gen_markup()
+
+    publish()
+
+
+@bot.message_handler(commands=["pin"])
+async def pin(message) -> None:
+    data = message.text.split(" ")
+    if len(data) < 2 or not data[1].startswith("http"):
+        await bot.send_message(chat_id=message.chat.id, text="Укажите ссылку на коллекцию: /pin <b>href</b>", parse_mode="html")
+        return
+
+    pinned = settings.get().pinned
+    if data[1] not in pinned:
+        settings.update(pinned=tuple(pinned) + (data[1],))
+
+    await bot.send_message(
+        chat_id=message.chat.id,
+        text=f"Коллекция {data[1]} закреплена: она обновляется между обходами"
+    )
+
+
+@bot.message_handler(commands=["unpin"])
+async def unpin(message) -> None:
+    data = message.text.split(" ")
+    pinned = settings.get().pinned
+
+    if len(data) < 2 or data[1] not in pinned:
+        await bot.send_message(chat_id=message.chat.id, text="Коллекция не закреплена")
+        return
+
+    settings.update(pinned=tuple(href for href in pinned if href != data[1]))
+
+    await bot.send_message(chat_id=message.chat.id, text=f"Коллекция {data[1]} откреплена")
+
+
+@bot.message_handler(commands=["pinned"])
+async def pinned(message) -> None:
+    hrefs = settings.get().pinned
+
+    await bot.send_message(
+        chat_id=message.chat.id,
+        text="\n".join(hrefs) if hrefs else "Нет закрепленных коллекций",
+        disable_web_page_preview=True
     )
 
 
@@ -317,25 +366,14 @@ async def by_growth(message) -> None:
             if data[1] < 2:
                 await bot.send_message(chat_id=message.chat.id, text="Вы не можете установить временной интервал меньше 2 минут")
             else:
-                update_json(growth_sort_time_interval=data[1], sort_type="by_growth")
+                settings.update(growth_sort_time_interval=data[1], sort_type="by_growth")
 
                 await bot.send_message(
                     chat_id=message.chat.id,
                     text=f"Выбран тип сортировки по приросту минтов за интервал: {data[1]} минут"
                 )
 
-                msg_editor = get_data_from_json()
-                await bot.edit_message_text(
-                    text=await gen_message(),
-                    chat_id="@LMNFT",
-                    message_id=msg_editor['message_to_edit'],
-                    parse_mode="html"
-                )
-                await bot.edit_message_reply_markup(
-                    chat_id="@LMNFT",
-                    message_id=msg_editor['message_to_edit'],
-                    reply_markup=gen_markup()
-                )
+                publish()
 
         else:
             await bot.send_message(chat_id=message.chat.id, text="Не корректное значение")
@@ -350,38 +388,27 @@ async def min_stock(message) -> None:
             if data[1] < 1:
                 await bot.send_message(chat_id=message.chat.id, text="Вы не можете установить значение меньше 1")
             else:
-                update_json(min_stock=data[1])
+                settings.update(min_stock=data[1])
 
                 await bot.send_message(
                     chat_id=message.chat.id,
                     text=f"Минимальная планка установлена на значение {data[1]}"
                 )
 
-                msg_editor = get_data_from_json()
-                await bot.edit_message_text(
-                    text=await gen_message(),
-                    chat_id="@LMNFT",
-                    message_id=msg_editor['message_to_edit'],
-                    parse_mode="html"
-                )
-                await bot.edit_message_reply_markup(
-                    chat_id="@LMNFT",
-                    message_id=msg_editor['message_to_edit'],
-                    reply_markup=gen_markup()
-                )
+                publish()
 
         else:
             await bot.send_message(chat_id=message.chat.id, text="Не корректное значение")
 
 
 async def send_first_message():
-    data = get_data_from_json()
+    data = settings.get()
     try:
-        await bot.delete_message(chat_id="@LMNFT", message_id=data['message_to_edit'])
+        await bot.delete_message(chat_id="@LMNFT", message_id=data.message_to_edit)
     except Exception:
         pass
     msg_id = await send_message(chat_id="@LMNFT", message=await gen_message())
-    update_json(message_to_edit=msg_id)
+    settings.update(message_to_edit=msg_id)
 
 
 async def polling():
@@ -390,7 +417,15 @@ async def polling():
 
 
 async def main():
+    setup_logging()
+    await serve_metrics(os.getenv("METRICS_HOST", "127.0.0.1"), int(os.getenv("BOT_METRICS_PORT", "9101")))
     await send_first_message()
+    # changes of the scraper process reach the render cache without waiting for a render
+    asyncio.create_task(settings.watch())
+
+    if events.enabled():
+        asyncio.create_task(events.listen(on_sweep))
+
     await polling()
 
 if __name__ == "__main__":
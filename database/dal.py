@@ -1,19 +1,22 @@
 from psycopg2 import IntegrityError
 from sqlalchemy.future import select
-from sqlalchemy import and_
+from sqlalchemy import and_, or_, case, func, insert, update, delete, literal, union_all, bindparam, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database.models import Collections, Tracking
-from typing import Union, Tuple, List
+from database.models import Collections, Tracking, Ranking, RankingKey, Sweep
+from typing import Union, Tuple, List, Dict, Iterable, Set
 from datetime import datetime, timedelta
 
-from database.session import DBTransactionStatus
+from database.session import DBTransactionStatus, dialect_insert
+from services.metrics import instrumented
+from database.retention import RAW_RETENTION, HEARTBEAT, HELD_FOR, tracking_history
 
 
 class CollectionsDAL:
     def __init__(self, db_session: AsyncSession):
         self.db_session = db_session
 
+    @instrumented
     async def create(
             self,
             href: str,
@@ -58,6 +61,7 @@ class CollectionsDAL:
             await self.db_session.rollback()
             return DBTransactionStatus.ROLLBACK
 
+    @instrumented
     async def get_all(self):
         try:
             result = await self.db_session.execute(select(Collections))
@@ -68,6 +72,7 @@ class CollectionsDAL:
             await self.db_session.rollback()
             return None, DBTransactionStatus.ROLLBACK
 
+    @instrumented
     async def get(self, href: str):
         existing_collection = await self.db_session.execute(
             select(Collections).where(and_(Collections.href == href))
@@ -77,20 +82,106 @@ class CollectionsDAL:
 
         return existing_collection
 
+    @instrumented
+    async def get_many(self, hrefs: Iterable[str]) -> List[Collections]:
+        hrefs = list(set(hrefs))
+
+        if not hrefs:
+            return []
+
+        result = await self.db_session.execute(
+            select(Collections).where(Collections.href.in_(hrefs))
+        )
+
+        return result.scalars().all()
+
+    @instrumented
+    async def bulk_upsert(self, rows: List[dict]) -> Set[str]:
+        """Returns hrefs that were inserted or whose stock moved."""
+        if not rows:
+            return set()
+
+        stmt = dialect_insert(self.db_session, Collections).values([
+            {
+                "href": row["href"],
+                "title": row["title"],
+                "sold_percentage": float(row["sold_percentage"]),
+                "total_stock": int(row["total_stock"]),
+                "sold_stock": int(row["sold_stock"])
+            }
+            for row in rows
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Collections.href],
+            set_={
+                "sold_stock": stmt.excluded.sold_stock,
+                "sold_percentage": stmt.excluded.sold_percentage
+            },
+            where=or_(
+                Collections.sold_stock.is_distinct_from(stmt.excluded.sold_stock),
+                Collections.sold_percentage.is_distinct_from(stmt.excluded.sold_percentage)
+            )
+        ).returning(Collections.href)
+
+        changed = await self.db_session.execute(stmt)
+
+        return set(changed.scalars().all())
+
+    @instrumented
+    async def update_velocities(self, velocities: Dict[str, float]) -> DBTransactionStatus:
+        if not velocities:
+            return DBTransactionStatus.SUCCESS
+
+        try:
+            await self.db_session.execute(
+                update(Collections.__table__)
+                .where(Collections.__table__.c.href == bindparam("b_href"))
+                .values(mint_velocity=bindparam("b_velocity")),
+                [{"b_href": href, "b_velocity": velocity} for href, velocity in velocities.items()]
+            )
+            await self.db_session.commit()
+            return DBTransactionStatus.SUCCESS
+
+        except Exception as e:
+            await self.db_session.rollback()
+            return DBTransactionStatus.ROLLBACK
+
+    @instrumented
+    async def clear_velocities(self, keep: Iterable[str] = ()) -> DBTransactionStatus:
+        """Zeroes persisted velocities of every collection not in `keep`."""
+        keep = list(keep)
+        query = update(Collections).where(Collections.mint_velocity != 0)
+
+        if keep:
+            query = query.where(Collections.href.not_in(keep))
+
+        try:
+            await self.db_session.execute(query.values(mint_velocity=0.0))
+            await self.db_session.commit()
+            return DBTransactionStatus.SUCCESS
+
+        except Exception as e:
+            await self.db_session.rollback()
+            return DBTransactionStatus.ROLLBACK
 
 
 class TrackingDAL:
     def __init__(self, db_session: AsyncSession):
         self.db_session = db_session
 
+    @instrumented
     async def create(
             self,
             href: str,
-            sold_to_time: int
+            sold_to_time: int,
+            time: datetime = None
     ) -> DBTransactionStatus:
+        """Records a sample the way IngestDAL.ingest does: only when the sold count moved
+        since the last row, or as a heartbeat once that row is HEARTBEAT old (ALREADY_EXIST otherwise)."""
+        time = time if time is not None else datetime.now()
 
         new_tracking = Tracking(
-            time=datetime.now(),
+            time=time,
             sold_to_time=int(sold_to_time)
         )
 
@@ -102,6 +193,19 @@ class TrackingDAL:
         if not existing_collection:
             return DBTransactionStatus.NOT_EXIST
 
+        last_tracking = await self.db_session.execute(
+            select(Tracking.time, Tracking.sold_to_time)
+            .where(Tracking.collection_href == href)
+            .where(Tracking.time <= time)
+            .order_by(Tracking.time.desc())
+            .limit(1)
+        )
+        last_tracking = last_tracking.first()
+
+        if last_tracking is not None and last_tracking.sold_to_time == new_tracking.sold_to_time \
+                and last_tracking.time >= time - HEARTBEAT:
+            return DBTransactionStatus.ALREADY_EXIST
+
         new_tracking.collection = existing_collection
 
         self.db_session.add(new_tracking)
@@ -113,46 +217,353 @@ class TrackingDAL:
             await self.db_session.rollback()
             return DBTransactionStatus.ROLLBACK
 
+    @instrumented
+    async def bulk_create(self, rows: List[dict], time: datetime = None) -> None:
+        if not rows:
+            return
+
+        time = time if time is not None else datetime.now()
+
+        await self.db_session.execute(
+            insert(Tracking),
+            [
+                {
+                    "collection_href": row["href"],
+                    "time": time,
+                    "sold_to_time": int(row["sold_stock"])
+                }
+                for row in rows
+            ]
+        )
+
+    @instrumented
+    async def tracked_since(self, hrefs: List[str], since: datetime) -> Set[str]:
+        result = await self.db_session.execute(
+            select(Tracking.collection_href)
+            .where(Tracking.collection_href.in_(hrefs))
+            .where(Tracking.time >= since)
+            .distinct()
+        )
+
+        return set(result.scalars().all())
+
+    @instrumented
+    async def get_sweeps_since(self, since: datetime) -> List[datetime]:
+        result = await self.db_session.execute(
+            select(Sweep.time).where(Sweep.time >= since).order_by(Sweep.time)
+        )
+
+        return result.scalars().all()
+
+    @instrumented
+    async def last_sweep(self) -> Union[None, Sweep]:
+        result = await self.db_session.execute(
+            select(Sweep).order_by(Sweep.time.desc()).limit(1)
+        )
+
+        return result.scalars().first()
+
+    @instrumented
+    async def get_since(self, since: datetime, hrefs: List[str] = None) -> List[Tuple[str, datetime, int]]:
+        query = (
+            select(Tracking.collection_href, Tracking.time, Tracking.sold_to_time)
+            .where(Tracking.time >= since)
+            .order_by(Tracking.collection_href, Tracking.time)
+        )
+
+        if hrefs is not None:
+            query = query.where(Tracking.collection_href.in_(hrefs))
+
+        result = await self.db_session.execute(query)
+
+        return result.all()
+
+    @instrumented
     async def calculate_sales_change(
             self,
             href: str,
             interval_minutes: int
     ) -> Union[None, Tuple[int, float]]:
-        end_time = datetime.now()
-        start_time = end_time - timedelta(minutes=interval_minutes)
-
-        collection = await self.db_session.execute(
-            select(Collections).where(Collections.href == href)
+        """Growth of one collection over one window, with the step-function rule of calculate_sales_changes."""
+        growths = await self.calculate_sales_changes([href], [interval_minutes])
+        return growths[href][interval_minutes]
+
+    @staticmethod
+    def latest_query(hrefs: List[str], end_time: datetime, source=None):
+        source = source if source is not None else Tracking.__table__
+
+        latest = (
+            select(
+                source.c.collection_href.label("href"),
+                source.c.sold_to_time.label("sold_to_time"),
+                func.row_number().over(
+                    partition_by=source.c.collection_href,
+                    order_by=source.c.time.desc()
+                ).label("rn")
+            )
+            .where(source.c.collection_href.in_(hrefs))
+            .where(source.c.time <= end_time)
+            .subquery()
         )
-        collection = collection.scalars().first()
 
-        if not collection:
-            return None
+        return select(latest.c.href, latest.c.sold_to_time).where(latest.c.rn == 1)
+
+    @staticmethod
+    def window_start_query(hrefs: List[str], intervals: List[int], end_time: datetime, source=None):
+        """Start value of every window.
+
+        Tracking only stores changes, so the value a window starts from is the step value
+        at the first sweep inside the window: the last row at or before that sweep (no
+        older than HELD_FOR), or the first row after it for collections that appeared later.
+        Rollup sources have no sweeps and start from the first row inside the window.
+        """
+        parts = []
+
+        for interval in intervals:
+            start_time = end_time - timedelta(minutes=interval)
+
+            if source is not None:
+                parts.append(
+                    select(
+                        literal(interval).label("interval"),
+                        source.c.collection_href.label("href"),
+                        source.c.sold_to_time.label("sold_to_time"),
+                        func.row_number().over(
+                            partition_by=source.c.collection_href,
+                            order_by=source.c.time
+                        ).label("rn")
+                    )
+                    .where(source.c.collection_href.in_(hrefs))
+                    .where(source.c.time >= start_time)
+                    .where(source.c.time <= end_time)
+                )
+                continue
+
+            sweep_time = (
+                select(func.min(Sweep.time))
+                .where(Sweep.time >= start_time)
+                .where(Sweep.time <= end_time)
+                .scalar_subquery()
+            )
+            at_sweep = Tracking.time <= sweep_time
+
+            parts.append(
+                select(
+                    literal(interval).label("interval"),
+                    Tracking.collection_href.label("href"),
+                    Tracking.sold_to_time.label("sold_to_time"),
+                    func.row_number().over(
+                        partition_by=Tracking.collection_href,
+                        order_by=[
+                            case((at_sweep, 0), else_=1),
+                            case((at_sweep, Tracking.time)).desc(),
+                            Tracking.time
+                        ]
+                    ).label("rn")
+                )
+                .where(Tracking.collection_href.in_(hrefs))
+                .where(sweep_time.is_not(None))
+                .where(Tracking.time >= start_time - HELD_FOR)
+                .where(Tracking.time <= end_time)
+            )
+
+        windows = union_all(*parts).subquery()
+
+        return select(windows.c.interval, windows.c.href, windows.c.sold_to_time).where(windows.c.rn == 1)
+
+    @instrumented
+    async def calculate_sales_changes(
+            self,
+            hrefs: Iterable[str],
+            intervals: Iterable[int],
+            now: datetime = None
+    ) -> Dict[str, Dict[int, Union[None, Tuple[int, float]]]]:
+        hrefs = list(set(hrefs))
+        intervals = sorted(set(intervals))
 
-        start_tracking = await self.db_session.execute(
-            select(Tracking)
-            .filter(Tracking.collection == collection)
-            .filter(Tracking.time >= start_time)
-            .filter(Tracking.time <= end_time)
-            .order_by(Tracking.time)
-            .limit(1)
-        )
-        start_tracking = start_tracking.scalars().first()
+        result = {href: {interval: None for interval in intervals} for href in hrefs}
 
-        end_tracking = await self.db_session.execute(
-            select(Tracking)
-            .filter(Tracking.collection == collection)
-            .filter(Tracking.time <= end_time)
-            .order_by(Tracking.time.desc())
-            .limit(1)
+        if not hrefs or not intervals:
+            return result
+
+        end_time = now if now is not None else datetime.now()
+
+        end_rows = await self.db_session.execute(self.latest_query(hrefs, end_time))
+        end_sold = {href: sold_to_time for href, sold_to_time in end_rows.all()}
+
+        if not end_sold:
+            return result
+
+        # windows within the raw retention start at their first sweep,
+        # windows reaching past it start from the per-minute / per-hour rollups
+        raw = [interval for interval in intervals if timedelta(minutes=interval) <= RAW_RETENTION]
+        older = [interval for interval in intervals if timedelta(minutes=interval) > RAW_RETENTION]
+
+        queries = []
+
+        if raw:
+            queries.append(self.window_start_query(list(end_sold.keys()), raw, end_time))
+        if older:
+            queries.append(self.window_start_query(list(end_sold.keys()), older, end_time, source=tracking_history(end_time)))
+
+        for query in queries:
+            start_rows = await self.db_session.execute(query)
+
+            for interval, href, start_sold in start_rows.all():
+                absolute_change = end_sold[href] - start_sold
+                percentage_change = (absolute_change / start_sold) * 100 if start_sold != 0 else 0
+                result[href][interval] = (absolute_change, percentage_change)
+
+        return result
+
+
+class IngestDAL:
+    def __init__(self, db_session: AsyncSession):
+        self.db_session = db_session
+
+    @instrumented
+    async def ingest(
+            self,
+            rows: Iterable[dict],
+            time: datetime = None,
+            record_sweep: bool = True
+    ) -> Tuple[Set[str], DBTransactionStatus]:
+        """Returns the change set of the sweep: hrefs whose sold stock moved.
+
+        A sweep may be ingested in several batches stamped with the same time,
+        the sweep itself is recorded once after the last one (`record_sweep`).
+        """
+        # one row per href, last scraped card wins: ON CONFLICT can't touch the same row twice
+        rows = list({row["href"]: row for row in rows}.values())
+
+        if not rows:
+            return set(), DBTransactionStatus.SUCCESS
+
+        collection_dal = CollectionsDAL(self.db_session)
+        tracking_dal = TrackingDAL(self.db_session)
+
+        time = time if time is not None else datetime.now()
+
+        try:
+            changed = await collection_dal.bulk_upsert(rows)
+
+            # change-only recording: unchanged collections get a heartbeat row every HEARTBEAT
+            fresh = await tracking_dal.tracked_since([row["href"] for row in rows], since=time - HEARTBEAT)
+            await tracking_dal.bulk_create(
+                [row for row in rows if row["href"] in changed or row["href"] not in fresh],
+                time=time
+            )
+            if record_sweep:
+                await self.db_session.execute(insert(Sweep).values(time=time))
+
+            await self.db_session.commit()
+            return changed, DBTransactionStatus.SUCCESS
+
+        except Exception as e:
+            await self.db_session.rollback()
+            return set(), DBTransactionStatus.ROLLBACK
+
+    @instrumented
+    async def record_sweep(self, time: datetime) -> DBTransactionStatus:
+        try:
+            await self.db_session.execute(insert(Sweep).values(time=time))
+            await self.db_session.commit()
+            return DBTransactionStatus.SUCCESS
+
+        except Exception as e:
+            await self.db_session.rollback()
+            return DBTransactionStatus.ROLLBACK
+
+
+# advisory lock ids of ranking replaces: RANKING_LOCK over all keys, (RANKING_LOCK_CLASS, hashtext(sort_key)) per key
+RANKING_LOCK = 0x726B
+RANKING_LOCK_CLASS = 0x726B
+
+
+class RankingDAL:
+    def __init__(self, db_session: AsyncSession):
+        self.db_session = db_session
+
+    async def _lock(self, sort_keys: Iterable[str], drop_others: bool) -> None:
+        """Serializes replaces of the same keys until the transaction ends.
+
+        The bot (ensure_ranking) and the scraper (refresh_rankings) may replace one
+        sort key at once: without the lock the later insert runs into the rows of the
+        other and fails on the (sort_key, position) key. A replace dropping the other
+        keys takes every key; sqlite serializes writers by itself.
+        """
+        if self.db_session.bind.dialect.name != "postgresql":
+            return
+
+        if drop_others:
+            await self.db_session.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": RANKING_LOCK})
+            return
+
+        await self.db_session.execute(text("SELECT pg_advisory_xact_lock_shared(:id)"), {"id": RANKING_LOCK})
+
+        # in one order, so two replaces of overlapping keys can't deadlock
+        for sort_key in sorted(sort_keys):
+            await self.db_session.execute(
+                text("SELECT pg_advisory_xact_lock(:class_id, hashtext(:sort_key))"),
+                {"class_id": RANKING_LOCK_CLASS, "sort_key": sort_key}
+            )
+
+    @instrumented
+    async def replace(self, rankings: Dict[str, List[str]], drop_others: bool = False) -> DBTransactionStatus:
+        try:
+            await self._lock(rankings.keys(), drop_others)
+
+            if drop_others:
+                await self.db_session.execute(delete(Ranking))
+                await self.db_session.execute(delete(RankingKey))
+            elif rankings:
+                await self.db_session.execute(delete(Ranking).where(Ranking.sort_key.in_(list(rankings.keys()))))
+                await self.db_session.execute(delete(RankingKey).where(RankingKey.sort_key.in_(list(rankings.keys()))))
+
+            rows = [
+                {"sort_key": sort_key, "position": position, "collection_href": href}
+                for sort_key, hrefs in rankings.items()
+                for position, href in enumerate(hrefs)
+            ]
+
+            if rows:
+                await self.db_session.execute(insert(Ranking), rows)
+
+            if rankings:
+                now = datetime.now()
+                await self.db_session.execute(insert(RankingKey), [
+                    {"sort_key": sort_key, "size": len(hrefs), "built_at": now}
+                    for sort_key, hrefs in rankings.items()
+                ])
+
+            await self.db_session.commit()
+            return DBTransactionStatus.SUCCESS
+
+        except Exception as e:
+            await self.db_session.rollback()
+            return DBTransactionStatus.ROLLBACK
+
+    @instrumented
+    async def get_page(self, sort_key: str, start: int, end: int) -> Tuple[List[Collections], Union[None, int]]:
+        """Collections at positions [start, end) and the ranking's size, None if `sort_key` isn't materialized."""
+        total = (
+            select(RankingKey.size)
+            .where(RankingKey.sort_key == sort_key)
+            .scalar_subquery()
         )
-        end_tracking = end_tracking.scalars().first()
 
-        if not start_tracking or not end_tracking:
-            return None
+        result = await self.db_session.execute(
+            select(Collections, total)
+            .join(Ranking, Ranking.collection_href == Collections.href)
+            .where(Ranking.sort_key == sort_key)
+            .where(Ranking.position >= start)
+            .where(Ranking.position < end)
+            .order_by(Ranking.position)
+        )
+        rows = result.all()
 
-        absolute_change = end_tracking.sold_to_time - start_tracking.sold_to_time
-        percentage_change = (
-                                        absolute_change / start_tracking.sold_to_time) * 100 if start_tracking.sold_to_time != 0 else 0
+        if rows:
+            return [collection for collection, _ in rows], rows[0][1]
 
-        return absolute_change, percentage_change
\ No newline at end of file
+        count = await self.db_session.execute(select(total))
+        return [], count.scalar()
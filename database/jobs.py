@@ -0,0 +1,230 @@
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Iterable, List, Set, Tuple, Union
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import FetchJob
+from database.session import DBTransactionStatus, dialect_insert
+from services.metrics import instrumented
+
+LEASE = timedelta(seconds=int(os.getenv("JOB_LEASE_SECONDS", "60")))
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+RETRY_DELAY = timedelta(seconds=int(os.getenv("JOB_RETRY_DELAY_SECONDS", "5")))
+JOB_RETENTION = timedelta(hours=int(os.getenv("JOB_RETENTION_HOURS", "1")))
+
+
+@dataclass
+class SweepProgress:
+    jobs: int = 0
+    pending: int = 0
+    leased: int = 0
+    done: int = 0
+    failed: int = 0
+    retries: int = 0
+    cards: int = 0
+    changed: Set[str] = field(default_factory=set)
+    # seconds, over finished jobs
+    max_wait: float = 0.0
+    mean_run: float = 0.0
+    max_run: float = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.jobs > 0 and self.pending == 0 and self.leased == 0
+
+    def report(self) -> dict:
+        return {
+            "jobs": self.jobs,
+            "done": self.done,
+            "failed": self.failed,
+            "retries": self.retries,
+            "cards": self.cards,
+            "changed": len(self.changed),
+            "max_wait": round(self.max_wait, 3),
+            "mean_run": round(self.mean_run, 3),
+            "max_run": round(self.max_run, 3)
+        }
+
+
+class JobQueueDAL:
+    """Page-fetch jobs shared by scraper workers.
+
+    Workers claim the oldest available job with SELECT ... FOR UPDATE SKIP LOCKED
+    (a plain atomic UPDATE on sqlite) and hold it for LEASE; a job whose lease ran
+    out is claimed again, so a dead worker's page is retried elsewhere. A job is
+    attempted MAX_ATTEMPTS times, RETRY_DELAY apart, then marked failed.
+    """
+
+    def __init__(self, db_session: AsyncSession):
+        self.db_session = db_session
+
+    @instrumented
+    async def enqueue(self, sweep_at: datetime, pages: Iterable[Tuple[str, int]]) -> DBTransactionStatus:
+        now = datetime.now()
+        rows = [
+            {
+                "sweep_at": sweep_at, "url": url, "page": page, "status": "pending", "attempts": 0,
+                "available_at": now, "enqueued_at": now
+            }
+            for url, page in pages
+        ]
+
+        if not rows:
+            return DBTransactionStatus.SUCCESS
+
+        try:
+            await self.db_session.execute(
+                dialect_insert(self.db_session, FetchJob).values(rows)
+                .on_conflict_do_nothing(index_elements=["sweep_at", "url", "page"])
+            )
+            await self.db_session.commit()
+            return DBTransactionStatus.SUCCESS
+
+        except Exception as e:
+            await self.db_session.rollback()
+            return DBTransactionStatus.ROLLBACK
+
+    @instrumented
+    async def claim(self, worker: str) -> Union[None, FetchJob]:
+        now = datetime.now()
+        claimable = and_(
+            FetchJob.attempts < MAX_ATTEMPTS,
+            or_(
+                and_(FetchJob.status == "pending", FetchJob.available_at <= now),
+                and_(FetchJob.status == "leased", FetchJob.lease_until < now)
+            )
+        )
+        candidate = (
+            select(FetchJob.id)
+            .where(claimable)
+            .order_by(FetchJob.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+
+        result = await self.db_session.execute(
+            update(FetchJob)
+            .where(FetchJob.id == candidate)
+            .where(claimable)
+            .values(
+                status="leased",
+                attempts=FetchJob.attempts + 1,
+                lease_until=now + LEASE,
+                worker=worker,
+                started_at=now
+            )
+            .returning(FetchJob)
+            .execution_options(synchronize_session=False)
+        )
+        job = result.scalars().first()
+        await self.db_session.commit()
+
+        return job
+
+    @instrumented
+    async def complete(self, job: FetchJob, cards: int, changed: Set[str], next_page: bool) -> bool:
+        """Marks the job done and enqueues the listing's next page; False if the lease was lost meanwhile."""
+        now = datetime.now()
+
+        result = await self.db_session.execute(
+            update(FetchJob)
+            .where(FetchJob.id == job.id)
+            .where(FetchJob.worker == job.worker)
+            .where(FetchJob.status == "leased")
+            .values(status="done", finished_at=now, cards=cards, changed=sorted(changed), error=None)
+            .execution_options(synchronize_session=False)
+        )
+
+        if not result.rowcount:
+            await self.db_session.rollback()
+            return False
+
+        if next_page:
+            await self.db_session.execute(
+                dialect_insert(self.db_session, FetchJob).values(
+                    sweep_at=job.sweep_at, url=job.url, page=job.page + 1, status="pending", attempts=0,
+                    available_at=now, enqueued_at=now
+                ).on_conflict_do_nothing(index_elements=["sweep_at", "url", "page"])
+            )
+
+        await self.db_session.commit()
+        return True
+
+    @instrumented
+    async def fail(self, job: FetchJob, error: str) -> bool:
+        """Puts the job back for a retry, or marks it failed after its last attempt; True if it will be retried."""
+        now = datetime.now()
+        retry = job.attempts < MAX_ATTEMPTS
+
+        await self.db_session.execute(
+            update(FetchJob)
+            .where(FetchJob.id == job.id)
+            .where(FetchJob.worker == job.worker)
+            .where(FetchJob.status == "leased")
+            .values(
+                status="pending" if retry else "failed",
+                available_at=now + RETRY_DELAY,
+                finished_at=None if retry else now,
+                error=error[:1000]
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await self.db_session.commit()
+
+        return retry
+
+    @instrumented
+    async def progress(self, sweep_at: datetime) -> SweepProgress:
+        now = datetime.now()
+
+        # leases that ran out on the last attempt won't be claimed again
+        await self.db_session.execute(
+            update(FetchJob)
+            .where(FetchJob.sweep_at == sweep_at)
+            .where(FetchJob.status == "leased")
+            .where(FetchJob.lease_until < now)
+            .where(FetchJob.attempts >= MAX_ATTEMPTS)
+            .values(status="failed", finished_at=now, error="lease expired")
+            .execution_options(synchronize_session=False)
+        )
+        await self.db_session.commit()
+
+        result = await self.db_session.execute(select(FetchJob).where(FetchJob.sweep_at == sweep_at))
+        jobs: List[FetchJob] = result.scalars().all()
+
+        progress = SweepProgress(jobs=len(jobs))
+        runs = []
+
+        for job in jobs:
+            setattr(progress, job.status, getattr(progress, job.status) + 1)
+            progress.retries += max(job.attempts - 1, 0)
+
+            if job.status == "done":
+                progress.cards += job.cards or 0
+                progress.changed.update(job.changed or [])
+
+            if job.finished_at is not None and job.started_at is not None:
+                runs.append((job.finished_at - job.started_at).total_seconds())
+            if job.started_at is not None:
+                progress.max_wait = max(progress.max_wait, (job.started_at - job.enqueued_at).total_seconds())
+
+        if runs:
+            progress.mean_run = sum(runs) / len(runs)
+            progress.max_run = max(runs)
+
+        return progress
+
+    @instrumented
+    async def purge(self, before: datetime) -> DBTransactionStatus:
+        try:
+            await self.db_session.execute(delete(FetchJob).where(FetchJob.sweep_at < before))
+            await self.db_session.commit()
+            return DBTransactionStatus.SUCCESS
+
+        except Exception as e:
+            await self.db_session.rollback()
+            return DBTransactionStatus.ROLLBACK
@@ -0,0 +1,37 @@
+"""sweep
+
+Revision ID: 0a9c7e3d5b21
+Revises: f3b8e5d1a6c2
+Create Date: 2024-03-14 11:27:06.381245
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a9c7e3d5b21'
+down_revision: Union[str, None] = 'f3b8e5d1a6c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('sweep',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('time', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_sweep_time', 'sweep', ['time'])
+    # fully sampled history: every distinct snapshot time was a sweep
+    op.execute("""
+        INSERT INTO sweep (time)
+        SELECT DISTINCT time FROM tracking WHERE time >= now() - interval '1 day'
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sweep_time', table_name='sweep')
+    op.drop_table('sweep')
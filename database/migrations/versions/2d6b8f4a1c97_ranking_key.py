@@ -0,0 +1,33 @@
+"""ranking key
+
+Revision ID: 2d6b8f4a1c97
+Revises: 9c3f1a7e2d45
+Create Date: 2024-04-02 11:18:06.274519
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2d6b8f4a1c97'
+down_revision: Union[str, None] = '9c3f1a7e2d45'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('ranking_key',
+    sa.Column('sort_key', sa.String(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('built_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('sort_key')
+    )
+    # rankings materialized before this revision are rebuilt by the next sweep
+    op.execute("DELETE FROM ranking")
+
+
+def downgrade() -> None:
+    op.drop_table('ranking_key')
@@ -0,0 +1,26 @@
+"""mint velocity
+
+Revision ID: 4e8a2b6c9d13
+Revises: 0a9c7e3d5b21
+Create Date: 2024-03-21 10:42:18.503117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e8a2b6c9d13'
+down_revision: Union[str, None] = '0a9c7e3d5b21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('collection', sa.Column('mint_velocity', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('collection', 'mint_velocity')
@@ -0,0 +1,46 @@
+"""fetch job queue
+
+Revision ID: 9c3f1a7e2d45
+Revises: 4e8a2b6c9d13
+Create Date: 2024-03-28 16:05:44.912830
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c3f1a7e2d45'
+down_revision: Union[str, None] = '4e8a2b6c9d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('fetch_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sweep_at', sa.DateTime(), nullable=False),
+    sa.Column('url', sa.String(), nullable=False),
+    sa.Column('page', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('available_at', sa.DateTime(), nullable=False),
+    sa.Column('lease_until', sa.DateTime(), nullable=True),
+    sa.Column('worker', sa.String(), nullable=True),
+    sa.Column('enqueued_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('cards', sa.Integer(), nullable=True),
+    sa.Column('changed', sa.JSON(), nullable=True),
+    sa.Column('error', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('sweep_at', 'url', 'page', name='uq_fetch_job_page')
+    )
+    op.create_index('ix_fetch_job_claim', 'fetch_job', ['status', 'available_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_fetch_job_claim', table_name='fetch_job')
+    op.drop_table('fetch_job')
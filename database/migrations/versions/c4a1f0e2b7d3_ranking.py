@@ -0,0 +1,32 @@
+"""ranking
+
+Revision ID: c4a1f0e2b7d3
+Revises: 93b865e121f4
+Create Date: 2024-03-04 12:10:41.508112
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a1f0e2b7d3'
+down_revision: Union[str, None] = '93b865e121f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('ranking',
+    sa.Column('sort_key', sa.String(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('collection_href', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['collection_href'], ['collection.href'], ),
+    sa.PrimaryKeyConstraint('sort_key', 'position')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('ranking')
@@ -0,0 +1,42 @@
+"""tracking indexes
+
+Revision ID: e7d2c9a4f1b8
+Revises: c4a1f0e2b7d3
+Create Date: 2024-03-06 09:42:17.220934
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7d2c9a4f1b8'
+down_revision: Union[str, None] = 'c4a1f0e2b7d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # tracking is large and written every few seconds, build without locking writes
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_tracking_collection_href_time',
+            'tracking',
+            ['collection_href', 'time'],
+            postgresql_include=['sold_to_time'],
+            postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_tracking_time',
+            'tracking',
+            ['time'],
+            postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_tracking_time', table_name='tracking', postgresql_concurrently=True)
+        op.drop_index('ix_tracking_collection_href_time', table_name='tracking', postgresql_concurrently=True)
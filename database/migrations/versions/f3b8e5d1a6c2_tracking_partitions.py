@@ -0,0 +1,127 @@
+"""tracking partitions and rollups
+
+Revision ID: f3b8e5d1a6c2
+Revises: e7d2c9a4f1b8
+Create Date: 2024-03-11 18:03:52.914467
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b8e5d1a6c2'
+down_revision: Union[str, None] = 'e7d2c9a4f1b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # tracking -> RANGE(time) partitioned table with one partition per day;
+    # the primary key has to include the partition key
+    op.execute("DROP INDEX IF EXISTS ix_tracking_collection_href_time")
+    op.execute("DROP INDEX IF EXISTS ix_tracking_time")
+    op.execute("ALTER TABLE tracking RENAME TO tracking_unpartitioned")
+    op.execute("ALTER TABLE tracking_unpartitioned RENAME CONSTRAINT tracking_pkey TO tracking_unpartitioned_pkey")
+    op.execute("""
+        CREATE TABLE tracking (
+            id INTEGER NOT NULL DEFAULT nextval('tracking_id_seq'::regclass),
+            time TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            sold_to_time INTEGER,
+            collection_href VARCHAR REFERENCES collection (href),
+            PRIMARY KEY (id, time)
+        ) PARTITION BY RANGE (time)
+    """)
+    op.execute("ALTER SEQUENCE tracking_id_seq OWNED BY tracking.id")
+    op.execute("CREATE TABLE tracking_default PARTITION OF tracking DEFAULT")
+    op.execute("""
+        DO $$
+        DECLARE
+            day DATE;
+        BEGIN
+            FOR day IN
+                SELECT generate_series(
+                    COALESCE((SELECT min(time)::date FROM tracking_unpartitioned), current_date),
+                    current_date + 2,
+                    interval '1 day'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF tracking FOR VALUES FROM (%L) TO (%L)',
+                    'tracking_p' || to_char(day, 'YYYYMMDD'), day, day + 1
+                );
+            END LOOP;
+        END $$
+    """)
+    op.create_index(
+        'ix_tracking_collection_href_time',
+        'tracking',
+        ['collection_href', 'time'],
+        postgresql_include=['sold_to_time']
+    )
+    op.create_index('ix_tracking_time', 'tracking', ['time'])
+    op.execute("""
+        INSERT INTO tracking (id, time, sold_to_time, collection_href)
+        SELECT id, time, sold_to_time, collection_href
+        FROM tracking_unpartitioned
+        WHERE time IS NOT NULL
+    """)
+    op.execute("DROP TABLE tracking_unpartitioned")
+
+    op.create_table('tracking_minute',
+    sa.Column('collection_href', sa.String(), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('sold_first', sa.Integer(), nullable=True),
+    sa.Column('sold_last', sa.Integer(), nullable=True),
+    sa.Column('samples', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['collection_href'], ['collection.href'], ),
+    sa.PrimaryKeyConstraint('collection_href', 'bucket')
+    )
+    op.create_index('ix_tracking_minute_bucket', 'tracking_minute', ['bucket'])
+    op.create_table('tracking_hour',
+    sa.Column('collection_href', sa.String(), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('sold_first', sa.Integer(), nullable=True),
+    sa.Column('sold_last', sa.Integer(), nullable=True),
+    sa.Column('samples', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['collection_href'], ['collection.href'], ),
+    sa.PrimaryKeyConstraint('collection_href', 'bucket')
+    )
+    op.create_index('ix_tracking_hour_bucket', 'tracking_hour', ['bucket'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tracking_hour_bucket', table_name='tracking_hour')
+    op.drop_table('tracking_hour')
+    op.drop_index('ix_tracking_minute_bucket', table_name='tracking_minute')
+    op.drop_table('tracking_minute')
+
+    op.execute("ALTER TABLE tracking RENAME TO tracking_partitioned")
+    op.execute("ALTER TABLE tracking_partitioned RENAME CONSTRAINT tracking_pkey TO tracking_partitioned_pkey")
+    op.execute("DROP INDEX IF EXISTS ix_tracking_collection_href_time")
+    op.execute("DROP INDEX IF EXISTS ix_tracking_time")
+    op.execute("""
+        CREATE TABLE tracking (
+            id INTEGER NOT NULL DEFAULT nextval('tracking_id_seq'::regclass),
+            time TIMESTAMP WITHOUT TIME ZONE,
+            sold_to_time INTEGER,
+            collection_href VARCHAR REFERENCES collection (href),
+            CONSTRAINT tracking_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute("ALTER SEQUENCE tracking_id_seq OWNED BY tracking.id")
+    op.execute("""
+        INSERT INTO tracking (id, time, sold_to_time, collection_href)
+        SELECT id, time, sold_to_time, collection_href
+        FROM tracking_partitioned
+    """)
+    op.execute("DROP TABLE tracking_partitioned")
+    op.create_index(
+        'ix_tracking_collection_href_time',
+        'tracking',
+        ['collection_href', 'time'],
+        postgresql_include=['sold_to_time']
+    )
+    op.create_index('ix_tracking_time', 'tracking', ['time'])
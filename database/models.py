@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Float, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, Float, DateTime, Index, JSON, UniqueConstraint
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -12,6 +12,8 @@ class Collections(Base):
     sold_percentage = Column(Float())
     total_stock = Column(Integer())
     sold_stock = Column(Integer())
+    # mints per minute, EWMA kept by the scraper (analytics.velocity)
+    mint_velocity = Column(Float())
 
     tracking = relationship("Tracking", back_populates="collection")
 
@@ -19,9 +21,105 @@ class Collections(Base):
 class Tracking(Base):
     __tablename__ = 'tracking'
 
+    # on postgres the table is range-partitioned by day on `time` (primary key is (id, time) there).
+    # rows are only written when sold_to_time changes, or as a heartbeat every HEARTBEAT
     id = Column(Integer(), primary_key=True)
-    time = Column(DateTime)
+    time = Column(DateTime, nullable=False)
     sold_to_time = Column(Integer())
 
     collection_href = Column(String(), ForeignKey('collection.href'))
     collection = relationship("Collections", back_populates="tracking")
+
+    __table_args__ = (
+        # growth windows: latest / first-in-window row per collection, index-only on postgres
+        Index('ix_tracking_collection_href_time', 'collection_href', 'time', postgresql_include=['sold_to_time']),
+        # warm start of the in-memory time series: everything since now - retention
+        Index('ix_tracking_time', 'time'),
+    )
+
+
+class Ranking(Base):
+    __tablename__ = 'ranking'
+
+    sort_key = Column(String(), primary_key=True)
+    position = Column(Integer(), primary_key=True)
+
+    collection_href = Column(String(), ForeignKey('collection.href'), nullable=False)
+
+
+class RankingKey(Base):
+    """One row per materialized sort key, so an empty ranking isn't taken for a missing one."""
+    __tablename__ = 'ranking_key'
+
+    sort_key = Column(String(), primary_key=True)
+    size = Column(Integer(), nullable=False)
+    built_at = Column(DateTime, nullable=False)
+
+
+class Sweep(Base):
+    """One row per ingested sweep: tracking only stores changes, growth windows start at a sweep."""
+    __tablename__ = 'sweep'
+
+    id = Column(Integer(), primary_key=True)
+    time = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('ix_sweep_time', 'time'),
+    )
+
+
+class TrackingMinute(Base):
+    __tablename__ = 'tracking_minute'
+
+    collection_href = Column(String(), ForeignKey('collection.href'), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    sold_first = Column(Integer())
+    sold_last = Column(Integer())
+    samples = Column(Integer())
+
+    __table_args__ = (
+        Index('ix_tracking_minute_bucket', 'bucket'),
+    )
+
+
+class TrackingHour(Base):
+    __tablename__ = 'tracking_hour'
+
+    collection_href = Column(String(), ForeignKey('collection.href'), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    sold_first = Column(Integer())
+    sold_last = Column(Integer())
+    samples = Column(Integer())
+
+    __table_args__ = (
+        Index('ix_tracking_hour_bucket', 'bucket'),
+    )
+
+
+class FetchJob(Base):
+    """One explore page of a sweep, claimed by scraper workers (database.jobs)."""
+    __tablename__ = 'fetch_job'
+
+    id = Column(Integer(), primary_key=True)
+    sweep_at = Column(DateTime, nullable=False)
+    url = Column(String(), nullable=False)
+    page = Column(Integer(), nullable=False)
+    # pending -> leased -> done | pending (retry) | failed
+    status = Column(String(), nullable=False)
+    attempts = Column(Integer(), nullable=False)
+    available_at = Column(DateTime, nullable=False)
+    lease_until = Column(DateTime)
+    worker = Column(String())
+    enqueued_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    cards = Column(Integer())
+    # hrefs whose sold stock moved
+    changed = Column(JSON)
+    error = Column(String())
+
+    __table_args__ = (
+        # a page is enqueued once per sweep, even when two workers complete its predecessor
+        UniqueConstraint('sweep_at', 'url', 'page', name='uq_fetch_job_page'),
+        Index('ix_fetch_job_claim', 'status', 'available_at'),
+    )
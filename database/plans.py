@@ -0,0 +1,32 @@
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+async def explain(db_session: AsyncSession, stmt) -> List[str]:
+    """Query plan of `stmt` as text lines, e.g. to assert an index is used:
+
+        plan = await explain(session, TrackingDAL.latest_query(hrefs, datetime.now()))
+        assert uses_index(plan, "ix_tracking_collection_href_time")
+    """
+    dialect = db_session.bind.dialect
+    compiled = stmt.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+
+    if dialect.name == "sqlite":
+        result = await db_session.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))
+        return [row[-1] for row in result.all()]
+
+    result = await db_session.execute(text(f"EXPLAIN {compiled}"))
+    return [row[0] for row in result.all()]
+
+
+def uses_index(plan: List[str], index_name: str) -> bool:
+    return any(index_name in line for line in plan)
+
+
+def has_seq_scan(plan: List[str], table: str) -> bool:
+    return any(
+        f"Seq Scan on {table}" in line or line.startswith(f"SCAN {table}")
+        for line in plan
+    )
@@ -0,0 +1,248 @@
+import logging
+import os
+from datetime import datetime, timedelta, date
+from typing import List, Union
+
+from sqlalchemy import delete, func, select, text, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Tracking, TrackingMinute, TrackingHour, Sweep
+from database.session import DBTransactionStatus, dialect_insert
+from services.metrics import instrumented
+
+log = logging.getLogger(__name__)
+
+# raw 15-second samples, then per-minute rollups, then per-hour rollups kept forever
+RAW_RETENTION = timedelta(hours=int(os.getenv("TRACKING_RAW_RETENTION_HOURS", "48")))
+MINUTE_RETENTION = timedelta(days=int(os.getenv("TRACKING_MINUTE_RETENTION_DAYS", "30")))
+# tracking rows are written on change only, plus one heartbeat row per collection at least this often
+HEARTBEAT = timedelta(minutes=int(os.getenv("TRACKING_HEARTBEAT_MINUTES", "10")))
+# adaptive sweeps reach collections deeper in the listings only at full sweeps, so their heartbeat rows
+# come up to a full sweep interval and one sweep late: a window start falls back on rows this old
+HELD_FOR = HEARTBEAT + timedelta(
+    seconds=float(os.getenv("FULL_SWEEP_SECONDS", "60")) + float(os.getenv("SCRAPE_INTERVAL_SECONDS", "15"))
+)
+RUN_INTERVAL = timedelta(minutes=int(os.getenv("RETENTION_RUN_MINUTES", "10")))
+
+PARTITION_PREFIX = "tracking_p"
+DEFAULT_PARTITION = "tracking_default"
+
+
+def partition_name(day: date) -> str:
+    return f"{PARTITION_PREFIX}{day.strftime('%Y%m%d')}"
+
+
+def tracking_history(now: datetime = None):
+    """(collection_href, time, sold_to_time) over raw samples and rollups, without overlaps.
+
+    Rollup buckets stand in for their first sample, so window starts older than the
+    raw retention resolve to the first minute (or hour) bucket inside the window.
+    """
+    now = now if now is not None else datetime.now()
+    raw_horizon = now - RAW_RETENTION
+    minute_horizon = now - MINUTE_RETENTION
+
+    return union_all(
+        select(Tracking.collection_href, Tracking.time, Tracking.sold_to_time)
+        .where(Tracking.time >= raw_horizon),
+        select(TrackingMinute.collection_href, TrackingMinute.bucket.label("time"), TrackingMinute.sold_first.label("sold_to_time"))
+        .where(TrackingMinute.bucket < raw_horizon)
+        .where(TrackingMinute.bucket >= minute_horizon),
+        select(TrackingHour.collection_href, TrackingHour.bucket.label("time"), TrackingHour.sold_first.label("sold_to_time"))
+        .where(TrackingHour.bucket < minute_horizon),
+    ).subquery("tracking_history")
+
+
+def _bucket(db_session: AsyncSession, column, unit: str):
+    if db_session.bind.dialect.name == "sqlite":
+        # sqlite stores DateTime as 'YYYY-MM-DD HH:MM:SS.ffffff'
+        fmt = "%Y-%m-%d %H:%M:00.000000" if unit == "minute" else "%Y-%m-%d %H:00:00.000000"
+        return func.strftime(fmt, column)
+    return func.date_trunc(unit, column)
+
+
+class RetentionDAL:
+    def __init__(self, db_session: AsyncSession):
+        self.db_session = db_session
+
+    @property
+    def partitioned(self) -> bool:
+        return self.db_session.bind.dialect.name == "postgresql"
+
+    async def ensure_partitions(self, now: datetime = None, days_ahead: int = 2) -> List[str]:
+        """Creates the daily partitions up to `days_ahead` days ahead, and those of days that
+        meanwhile went into the default partition (e.g. the scraper was down for longer):
+        their rows are moved out of the default partition, which has to hold none of the
+        new partition's range when it is attached."""
+        if not self.partitioned:
+            return []
+
+        today = (now if now is not None else datetime.now()).date()
+        partitions = await self.get_partitions(with_default=True)
+        days = {today + timedelta(days=offset) for offset in range(days_ahead + 1)}
+
+        if DEFAULT_PARTITION in partitions:
+            result = await self.db_session.execute(text(f"SELECT DISTINCT time::date FROM {DEFAULT_PARTITION}"))
+            days.update(result.scalars().all())
+
+        created = []
+
+        for day in sorted(days):
+            name = partition_name(day)
+
+            if name in partitions:
+                continue
+
+            bounds = f"FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+
+            if DEFAULT_PARTITION not in partitions:
+                await self.db_session.execute(text(f"CREATE TABLE {name} PARTITION OF tracking FOR VALUES {bounds}"))
+            else:
+                await self.db_session.execute(text(f"CREATE TABLE {name} (LIKE tracking INCLUDING DEFAULTS)"))
+                moved = await self.db_session.execute(
+                    text(
+                        f"WITH moved AS ("
+                        f"DELETE FROM {DEFAULT_PARTITION} WHERE time >= :start AND time < :end "
+                        f"RETURNING id, time, sold_to_time, collection_href) "
+                        f"INSERT INTO {name} (id, time, sold_to_time, collection_href) "
+                        f"SELECT id, time, sold_to_time, collection_href FROM moved"
+                    ),
+                    {"start": day, "end": day + timedelta(days=1)}
+                )
+                await self.db_session.execute(text(f"ALTER TABLE tracking ATTACH PARTITION {name} FOR VALUES {bounds}"))
+
+                if moved.rowcount:
+                    log.info("rows moved out of the default partition", extra={"partition": name, "rows": moved.rowcount})
+
+            created.append(name)
+
+        return created
+
+    async def get_partitions(self, with_default: bool = False) -> List[str]:
+        result = await self.db_session.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = 'tracking'"
+        ))
+
+        return [
+            name for name in result.scalars().all()
+            if name.startswith(PARTITION_PREFIX) or (with_default and name == DEFAULT_PARTITION)
+        ]
+
+    async def drop_expired(self, horizon: datetime) -> List[str]:
+        """Drops whole daily partitions ending before `horizon`, rows of a partition that
+        straddles it stay until the whole day has expired. Expired rows are deleted only
+        from the default partition, or from the table on sqlite."""
+        dropped = []
+
+        if self.partitioned:
+            partitions = await self.get_partitions(with_default=True)
+
+            for name in partitions:
+                if name == DEFAULT_PARTITION:
+                    continue
+
+                day = datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d")
+
+                if day + timedelta(days=1) <= horizon:
+                    await self.db_session.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                    dropped.append(name)
+
+            if DEFAULT_PARTITION in partitions:
+                await self.db_session.execute(
+                    text(f"DELETE FROM {DEFAULT_PARTITION} WHERE time < :horizon"), {"horizon": horizon}
+                )
+        else:
+            await self.db_session.execute(delete(Tracking).where(Tracking.time < horizon))
+
+        await self.db_session.execute(delete(Sweep).where(Sweep.time < horizon))
+
+        return dropped
+
+    async def _watermark(self, model) -> Union[None, datetime]:
+        result = await self.db_session.execute(select(func.max(model.bucket)))
+        return result.scalar()
+
+    async def rollup_minutes(self, until: datetime) -> None:
+        until = until.replace(second=0, microsecond=0)
+        watermark = await self._watermark(TrackingMinute)
+
+        bucket = _bucket(self.db_session, Tracking.time, "minute")
+        source = (
+            select(
+                Tracking.collection_href,
+                bucket,
+                # sold counts only grow, so min/max are the first/last sample of the bucket
+                func.min(Tracking.sold_to_time),
+                func.max(Tracking.sold_to_time),
+                func.count()
+            )
+            .where(Tracking.time < until)
+            .group_by(Tracking.collection_href, bucket)
+        )
+
+        if watermark is not None:
+            source = source.where(Tracking.time >= watermark + timedelta(minutes=1))
+
+        await self._upsert(TrackingMinute, source)
+
+    async def rollup_hours(self, until: datetime) -> None:
+        until = until.replace(minute=0, second=0, microsecond=0)
+        watermark = await self._watermark(TrackingHour)
+
+        bucket = _bucket(self.db_session, TrackingMinute.bucket, "hour")
+        source = (
+            select(
+                TrackingMinute.collection_href,
+                bucket,
+                func.min(TrackingMinute.sold_first),
+                func.max(TrackingMinute.sold_last),
+                func.sum(TrackingMinute.samples)
+            )
+            .where(TrackingMinute.bucket < until)
+            .group_by(TrackingMinute.collection_href, bucket)
+        )
+
+        if watermark is not None:
+            source = source.where(TrackingMinute.bucket >= watermark + timedelta(hours=1))
+
+        await self._upsert(TrackingHour, source)
+
+    async def _upsert(self, model, source) -> None:
+        stmt = dialect_insert(self.db_session, model).from_select(
+            ["collection_href", "bucket", "sold_first", "sold_last", "samples"],
+            source
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[model.collection_href, model.bucket],
+            set_={
+                "sold_first": stmt.excluded.sold_first,
+                "sold_last": stmt.excluded.sold_last,
+                "samples": stmt.excluded.samples
+            }
+        )
+
+        await self.db_session.execute(stmt)
+
+    async def prune_minutes(self, horizon: datetime) -> None:
+        await self.db_session.execute(delete(TrackingMinute).where(TrackingMinute.bucket < horizon))
+
+    @instrumented
+    async def run(self, now: datetime = None) -> DBTransactionStatus:
+        now = now if now is not None else datetime.now()
+
+        try:
+            await self.ensure_partitions(now)
+            await self.rollup_minutes(until=now)
+            await self.rollup_hours(until=now)
+            await self.prune_minutes(horizon=now - MINUTE_RETENTION)
+            await self.drop_expired(horizon=now - RAW_RETENTION)
+            await self.db_session.commit()
+            return DBTransactionStatus.SUCCESS
+
+        except Exception as e:
+            await self.db_session.rollback()
+            log.warning("retention run failed", extra={"error": str(e)})
+            return DBTransactionStatus.ROLLBACK
@@ -1,11 +1,18 @@
 import os
+import time
+from contextlib import asynccontextmanager
 from enum import Enum
-from typing import Generator
+from typing import AsyncIterator, Generator
 
 from dotenv import load_dotenv
+from sqlalchemy import make_url
 from sqlalchemy.ext.asyncio import async_sessionmaker
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from services.metrics import instrument_engine, POOL_WAIT_SECONDS
 
 load_dotenv()
 
@@ -16,22 +23,89 @@ POSTGRES_PORT = str(os.getenv("POSTGRES_PORT"))
 POSTGRES_DB = str(os.getenv("POSTGRES_DB"))
 
 
-DATABASE_URL = f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
-
-engine = create_async_engine(
-    DATABASE_URL,
-    future=True,
-    echo=True,
-    execution_options={"isolation_level": "AUTOCOMMIT"},
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
 )
 
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that reports how long a checkout waited (including connecting)."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+
+def create_engine(url: str = DATABASE_URL) -> AsyncEngine:
+    url = make_url(url)
+    options = {}
+
+    if url.drivername == "postgresql+asyncpg":
+        # SQLAlchemy's prepared statement cache and asyncpg's own statement cache
+        url = url.update_query_dict({
+            "prepared_statement_cache_size": os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", "500")
+        })
+        options["connect_args"] = {"statement_cache_size": int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))}
+
+    if url.get_backend_name() != "sqlite" or url.database not in (None, "", ":memory:"):
+        options.update(
+            poolclass=TimedQueuePool,
+            pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+            pool_pre_ping=True
+        )
+
+    new_engine = create_async_engine(url, echo=os.getenv("SQL_ECHO") == "1", **options)
+    instrument_engine(new_engine)
+
+    return new_engine
+
+
+engine = create_engine()
+
+# objects stay usable after a commit: a unit of work commits several times
 async_session = async_sessionmaker(
     engine,
-    expire_on_commit=True,
+    expire_on_commit=False,
     class_=AsyncSession
 )
 
 
+@asynccontextmanager
+async def unit_of_work() -> AsyncIterator[AsyncSession]:
+    """One session for a batch of work, not one transaction.
+
+    DAL methods commit their own writes, so a batch calling several of them is
+    several transactions: a failing call rolls back its own writes only, the ones
+    committed before it stay. The pooled connection goes back to the pool at
+    every commit. Whatever is still pending when the block ends is committed,
+    or rolled back if it raised.
+    """
+    async with async_session() as session:
+        try:
+            yield session
+            if session.in_transaction():
+                await session.commit()
+        except BaseException:
+            await session.rollback()
+            raise
+
+
+def pool_status() -> dict:
+    pool = engine.sync_engine.pool
+
+    if not isinstance(pool, QueuePool):
+        return {}
+
+    return {"size": pool.size(), "checked_out": pool.checkedout(), "overflow": pool.overflow()}
+
+
 async def get_db() -> Generator:
     try:
         session: AsyncSession = async_session()
@@ -40,6 +114,12 @@ async def get_db() -> Generator:
         await session.close()
 
 
+def dialect_insert(db_session: AsyncSession, model):
+    if db_session.bind.dialect.name == "sqlite":
+        return sqlite.insert(model)
+    return postgresql.insert(model)
+
+
 class DBTransactionStatus(str, Enum):
     SUCCESS = 'success'
     FAIL = 'fail'
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable, List, Set
+
+from services.metrics import registry, ERRORS
+
+log = logging.getLogger(__name__)
+
+STAGE_MESSAGES = registry.counter("lmnft_stage_messages_total", "Messages handled by a pipeline stage.", ["stage"])
+STAGE_BUSY = registry.counter("lmnft_stage_busy_seconds_total", "Time a pipeline stage spent in its handler.", ["stage"])
+STAGE_QUEUE = registry.gauge("lmnft_stage_queue_depth", "Messages waiting in a pipeline stage's inbox.", ["stage"])
+
+
+@dataclass
+class CardBatch:
+    """Cards of one explore page, stamped with the time of the sweep they belong to."""
+    sweep_at: datetime
+    rows: List[dict]
+
+
+@dataclass
+class HotBatch:
+    """Cards of hot collections refreshed between sweeps, stamped with their fetch time."""
+    fetched_at: datetime
+    rows: List[dict]
+
+
+@dataclass
+class Committed:
+    """Hrefs whose sold stock moved in a committed ingest batch."""
+    sweep_at: datetime
+    changed: Set[str] = field(default_factory=set)
+
+
+@dataclass
+class SweepDone:
+    sweep_at: datetime
+    # False when pages of the sweep could not be fetched
+    complete: bool = True
+
+
+class Stage:
+    """Consumer of one bounded queue.
+
+    The handler gets whatever is waiting in the inbox, up to `max_batch`
+    messages, in order. A full inbox blocks the producer, so a slow stage
+    throttles the ones before it instead of buffering without bound.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            handler: Callable[[List[Any]], Awaitable[None]],
+            maxsize: int = 64,
+            max_batch: int = 1
+    ):
+        self.name = name
+        self.handler = handler
+        self.inbox: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.max_batch = max_batch
+        self.messages = 0
+        self.batches = 0
+        self.busy = 0.0
+        self.task = None
+        registry.add_collector(lambda: STAGE_QUEUE.set(self.inbox.qsize(), stage=self.name))
+
+    async def put(self, message: Any) -> None:
+        await self.inbox.put(message)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            messages = [await self.inbox.get()]
+
+            while len(messages) < self.max_batch and not self.inbox.empty():
+                messages.append(self.inbox.get_nowait())
+
+            started = loop.time()
+
+            try:
+                await self.handler(messages)
+            except Exception as e:
+                ERRORS.inc(component=f"stage:{self.name}")
+                log.exception("stage failed", extra={"stage": self.name})
+            finally:
+                busy = loop.time() - started
+                self.busy += busy
+                self.messages += len(messages)
+                self.batches += 1
+                STAGE_BUSY.inc(busy, stage=self.name)
+                STAGE_MESSAGES.inc(len(messages), stage=self.name)
+
+                for _ in messages:
+                    self.inbox.task_done()
+
+    def start(self) -> asyncio.Task:
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+        return self.task
+
+    def report(self) -> dict:
+        return {
+            "stage": self.name,
+            "messages": self.messages,
+            "batches": self.batches,
+            "busy": round(self.busy, 3),
+            "queue": self.inbox.qsize()
+        }
@@ -0,0 +1,140 @@
+from html.parser import HTMLParser
+from typing import List, Union
+from urllib.parse import urljoin
+
+SCROLL_CLASS = "infinite-scroll-component__outerdiv"
+CARD_STYLE = "overflow:hidden"
+
+
+def build_card(
+        href: str,
+        title: str,
+        sold_percentage: str,
+        stock: str
+) -> Union[None, dict]:
+    if title == '':
+        return None
+
+    sold_percentage = sold_percentage.split("%")[0]
+    sold_stock, total_stock = stock.split("/")[:2]
+
+    return {
+        "href": href,
+        "title": title,
+        "sold_percentage": float(sold_percentage),
+        "total_stock": int(total_stock),
+        "sold_stock": int(sold_stock)
+    }
+
+
+def _normalize_style(style: str) -> str:
+    return "".join(style.split()).rstrip(";")
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+class _ExploreHTMLParser(HTMLParser):
+    """Mirrors the selenium XPath walk over the explore page markup:
+    //div[@class="infinite-scroll-component__outerdiv"]//a[@style="overflow: hidden;"]
+    with .//strong and .//span texts of every card.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.cards = []
+        self.scroll_found = False
+
+        self._scroll_depth = 0
+        self._card = None
+        self._open_strong = []
+        self._open_span = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+
+        if tag == "div":
+            if self._scroll_depth:
+                self._scroll_depth += 1
+            elif (attrs.get("class") or "").strip() == SCROLL_CLASS:
+                self.scroll_found = True
+                self._scroll_depth = 1
+            return
+
+        if not self._scroll_depth:
+            return
+
+        if tag == "a" and self._card is None and _normalize_style(attrs.get("style") or "") == CARD_STYLE:
+            self._card = {"href": attrs.get("href") or "", "strong": [], "span": []}
+
+        elif self._card is not None and tag == "strong":
+            self._card["strong"].append("")
+            self._open_strong.append(len(self._card["strong"]) - 1)
+
+        elif self._card is not None and tag == "span":
+            self._card["span"].append("")
+            self._open_span.append(len(self._card["span"]) - 1)
+
+    def handle_endtag(self, tag):
+        if tag == "div" and self._scroll_depth:
+            self._scroll_depth -= 1
+
+        elif tag == "a" and self._card is not None:
+            self.cards.append(self._card)
+            self._card = None
+            self._open_strong = []
+            self._open_span = []
+
+        elif tag == "strong" and self._open_strong:
+            self._open_strong.pop()
+
+        elif tag == "span" and self._open_span:
+            self._open_span.pop()
+
+    def handle_data(self, data):
+        if self._card is None:
+            return
+
+        for i in self._open_strong:
+            self._card["strong"][i] += data
+        for i in self._open_span:
+            self._card["span"][i] += data
+
+
+def parse_cards(html: str, page_url: str = "") -> Union[None, List[dict]]:
+    """Returns the cards of an explore page, or None if the listing container is missing."""
+    parser = _ExploreHTMLParser()
+    parser.feed(html)
+    parser.close()
+
+    if not parser.scroll_found:
+        return None
+
+    return cards_from_raw(parser.cards, page_url)
+
+
+def cards_from_raw(raw_cards: List[dict], page_url: str = "") -> List[dict]:
+    """Cards from {"href", "strong": [texts], "span": [texts]} records, as the
+    HTML parser and the selenium extraction script produce them."""
+    cards = []
+
+    for raw in raw_cards:
+        strong = [_normalize_text(text) for text in raw["strong"]]
+        span = [_normalize_text(text) for text in raw["span"]]
+
+        if len(strong) < 2 or len(span) < 2:
+            continue
+
+        # selenium's get_attribute("href") is absolute, keep the same keys in the database
+        card = build_card(
+            href=urljoin(page_url, raw["href"]),
+            title=strong[0],
+            sold_percentage=strong[1],
+            stock=span[1]
+        )
+
+        if card is not None:
+            cards.append(card)
+
+    return cards
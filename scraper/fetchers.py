@@ -0,0 +1,166 @@
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import aiohttp
+
+from scraper.cards import parse_cards, cards_from_raw, build_card, SCROLL_CLASS
+
+
+class FetchError(Exception):
+    pass
+
+
+class Fetcher(ABC):
+    @abstractmethod
+    async def fetch_page(self, url: str) -> List[dict]:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class HttpFetcher(Fetcher):
+    HEADERS = {
+        "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:122.0) Gecko/20100101 Firefox/122.0",
+        "Accept": "text/html,application/xhtml+xml",
+    }
+
+    def __init__(self, timeout: float = 10):
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.session = None
+
+    async def fetch_page(self, url: str) -> List[dict]:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(headers=self.HEADERS, timeout=self.timeout)
+
+        async with self.session.get(url) as response:
+            if response.status != 200:
+                raise FetchError(f"{url}: HTTP {response.status}")
+            html = await response.text()
+
+        cards = parse_cards(html, page_url=str(response.url))
+
+        if cards is None:
+            raise FetchError(f"{url}: no explore listing in response")
+
+        return cards
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+
+
+class SeleniumFetcher(Fetcher):
+    """Firefox fallback. Every webdriver call blocks, so each driver lives on its
+    own thread and the event loop only awaits the results.
+
+    `extract="script"` reads all cards of a page with one in-page script instead
+    of several webdriver round trips per card (`extract="elements"`).
+    """
+
+    # same walk as the XPath of the elements mode and scraper.cards._ExploreHTMLParser
+    EXTRACT_SCRIPT = """
+        return Array.from(arguments[0].querySelectorAll('a[style="overflow: hidden;"]'), a => ({
+            href: a.href,
+            strong: Array.from(a.querySelectorAll('strong'), e => e.innerText),
+            span: Array.from(a.querySelectorAll('span'), e => e.innerText)
+        }));
+    """
+
+    def __init__(self, wait_timeout: float = 10, extract: str = "script"):
+        self.wait_timeout = wait_timeout
+        self.extract = extract
+        self.driver = None
+        # webdriver sessions aren't thread-safe: one thread per driver
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="selenium")
+
+    def _create_driver(self):
+        # selenium is only needed for the fallback backend
+        from selenium import webdriver
+        from selenium.webdriver.firefox.service import Service as FirefoxService
+        from webdriver_manager.firefox import GeckoDriverManager
+
+        return webdriver.Firefox(service=FirefoxService(GeckoDriverManager().install()))
+
+    def _fetch_page(self, url: str) -> List[dict]:
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+
+        if self.driver is None:
+            self.driver = self._create_driver()
+
+        self.driver.get(url=url)
+        wait = WebDriverWait(self.driver, self.wait_timeout)
+
+        infinity_scroll = wait.until(
+            EC.presence_of_all_elements_located((
+                By.XPATH,
+                f'//div[@class="{SCROLL_CLASS}"]'
+            )))
+
+        if self.extract == "script":
+            return cards_from_raw(self.driver.execute_script(self.EXTRACT_SCRIPT, infinity_scroll[0]))
+
+        a_tags = infinity_scroll[0].find_elements(By.XPATH, './/a[@style="overflow: hidden;"]')
+
+        cards = []
+
+        for a_tag in a_tags:
+            strong_tag = a_tag.find_elements(By.XPATH, './/strong')
+
+            if strong_tag[0].text == '':
+                continue
+
+            card = build_card(
+                href=a_tag.get_attribute("href"),
+                title=strong_tag[0].text,
+                sold_percentage=strong_tag[1].text,
+                stock=a_tag.find_elements(By.XPATH, './/span')[1].text
+            )
+
+            if card is not None:
+                cards.append(card)
+
+        return cards
+
+    async def fetch_page(self, url: str) -> List[dict]:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._fetch_page, url)
+
+    def _quit(self) -> None:
+        if self.driver is not None:
+            self.driver.quit()
+            self.driver = None
+
+    async def close(self) -> None:
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self._quit)
+        except Exception:
+            pass
+        self.executor.shutdown(wait=False)
+
+
+def create_fetcher(backend: str = None) -> Fetcher:
+    # selenium stays the default until the http backend is validated against saved live pages (tests/fixtures/explore)
+    backend = backend if backend is not None else os.getenv("SCRAPER_BACKEND", "selenium")
+
+    if backend == "http":
+        return HttpFetcher()
+
+    return SeleniumFetcher(extract=os.getenv("SELENIUM_EXTRACT", "script"))
+
+
+def create_fetchers(concurrency: int = None, backend: str = None) -> List[Fetcher]:
+    """One fetcher per concurrent worker: selenium drivers are not shareable,
+    a single aiohttp session is."""
+    backend = backend if backend is not None else os.getenv("SCRAPER_BACKEND", "selenium")
+    concurrency = concurrency if concurrency is not None else int(os.getenv("SCRAPER_CONCURRENCY", "4"))
+
+    if backend == "http":
+        fetcher = HttpFetcher()
+        return [fetcher] * concurrency
+
+    return [SeleniumFetcher(extract=os.getenv("SELENIUM_EXTRACT", "script")) for _ in range(concurrency)]
@@ -0,0 +1,46 @@
+"""Local replay of saved explore pages for the HTTP backend.
+
+Pages are looked up as <root>/<sortBy>/<page>.html, where <sortBy> is the
+value of the SortType enum (e.g. collections%2Fsort%2FlastMintedAt%3Adesc).
+A missing page is answered with an empty listing, which ends pagination.
+
+    python -m scraper.fixture_server fixtures/ --port 8085
+    LMNFT_BASE_URL=http://127.0.0.1:8085 python app.py
+"""
+import argparse
+import os
+from urllib.parse import quote
+
+from aiohttp import web
+
+from scraper.cards import SCROLL_CLASS
+
+EMPTY_PAGE = f'<html><body><div class="{SCROLL_CLASS}"></div></body></html>'
+
+
+def create_app(root: str) -> web.Application:
+    async def explore(request: web.Request) -> web.Response:
+        sort_by = quote(request.query.get("sortBy", "collections"), safe="")
+        page = request.query.get("page", "1")
+
+        path = os.path.join(root, sort_by, f"{int(page)}.html")
+
+        if not os.path.isfile(path):
+            return web.Response(text=EMPTY_PAGE, content_type="text/html")
+
+        with open(path, "r", encoding="utf-8") as html_file:
+            return web.Response(text=html_file.read(), content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/explore", explore)
+    return app
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("root")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8085)
+    args = arg_parser.parse_args()
+
+    web.run_app(create_app(args.root), host=args.host, port=args.port)
@@ -0,0 +1,63 @@
+import os
+import time
+from typing import Dict, Iterable, List, Tuple, Union
+
+
+class CollectionPriority:
+    """Picks the hot collections refreshed between sweeps.
+
+    A collection is hot when pinned, when it mints at `min_velocity` per minute
+    or more, or when its growth over the alert interval is at least
+    `min_proximity` of the alert threshold. Pinned ones come first, the rest by
+    score, `max_hot` at most.
+    """
+
+    def __init__(self, max_hot: int = 20, min_velocity: float = 1.0, min_proximity: float = 0.5, proximity_ttl: float = 300):
+        self.max_hot = max_hot
+        self.min_velocity = min_velocity
+        self.min_proximity = min_proximity
+        self.proximity_ttl = proximity_ttl
+        # href -> (growth / alert threshold, monotonic time of the evaluation)
+        self.proximity: Dict[str, Tuple[float, float]] = {}
+
+    def note_growth(self, growths: Dict[str, Union[None, Tuple[int, float]]], alert_percent: float) -> None:
+        """Growth over the alert interval of the collections just evaluated for alerts."""
+        now = time.monotonic()
+
+        for href, growth in growths.items():
+            if growth is None or alert_percent <= 0:
+                self.proximity.pop(href, None)
+            else:
+                self.proximity[href] = (growth[1] / alert_percent, now)
+
+    def score(self, href: str, velocity: float, now: float) -> float:
+        proximity, noted_at = self.proximity.get(href, (0.0, now))
+
+        if now - noted_at > self.proximity_ttl:
+            proximity = 0.0
+
+        return max(velocity / self.min_velocity, proximity / self.min_proximity)
+
+    def hot(self, velocities: Dict[str, float], pinned: Iterable[str] = ()) -> List[str]:
+        now = time.monotonic()
+
+        for href, (_, noted_at) in list(self.proximity.items()):
+            if now - noted_at > self.proximity_ttl:
+                del self.proximity[href]
+
+        pinned = list(dict.fromkeys(pinned))
+        scored = [
+            (score, href)
+            for href in set(velocities) | set(self.proximity)
+            if href not in pinned and (score := self.score(href, velocities.get(href, 0.0), now)) >= 1
+        ]
+        scored.sort(reverse=True)
+
+        return pinned + [href for _, href in scored[:max(0, self.max_hot - len(pinned))]]
+
+
+collection_priority = CollectionPriority(
+    max_hot=int(os.getenv("HOT_MAX_COLLECTIONS", "20")),
+    min_velocity=float(os.getenv("HOT_MIN_VELOCITY", "1")),
+    min_proximity=float(os.getenv("HOT_MIN_ALERT_PROXIMITY", "0.5"))
+)
@@ -0,0 +1,287 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Tuple, Union
+
+from scraper.fetchers import Fetcher
+from services.metrics import PAGE_FETCH_SECONDS, CARDS_PARSED, SWEEP_PAGES, ERRORS, timed
+
+log = logging.getLogger(__name__)
+
+
+class CrawlPlanner:
+    """Decides how deep a sweep goes and which pages are handed on.
+
+    A full sweep paginates every listing to its end and hands on every page; one
+    runs at least every `full_interval` seconds. In between, sweeps are adaptive:
+    a listing stops at its first page without a changed card, and a page whose
+    fingerprint matches its previous fetch is not handed on.
+
+    Collections deeper in a listing are only seen at full sweeps, so their
+    heartbeat rows may come a full sweep late; growth windows accept start
+    values that much older (database.retention.HELD_FOR).
+    """
+
+    def __init__(self, full_interval: float = 60):
+        self.full_interval = full_interval
+        self.full_due = 0.0
+        self.fingerprints: Dict[Tuple[str, int], int] = {}
+        self.cards: Dict[str, Tuple[int, int, float]] = {}
+        # listing page every collection was last seen on
+        self.locations: Dict[str, Tuple[str, int]] = {}
+
+    def begin(self) -> bool:
+        """Whether the sweep starting now is a full one."""
+        now = time.monotonic()
+
+        if now < self.full_due:
+            return False
+
+        self.full_due = now + self.full_interval
+        return True
+
+    def repeat_full(self) -> None:
+        """The full sweep didn't reach the end of every listing, the next one is full again."""
+        self.full_due = 0.0
+
+    @staticmethod
+    def fingerprint(cards: List[dict]) -> int:
+        return hash(tuple(
+            (card["href"], card["title"], card["sold_stock"], card["total_stock"], card["sold_percentage"])
+            for card in cards
+        ))
+
+    def locate(self, url: str, page: int, cards: List[dict]) -> None:
+        for card in cards:
+            self.locations[card["href"]] = (url, page)
+
+    def observe(self, url: str, page: int, cards: List[dict]) -> Tuple[bool, bool]:
+        """Records a fetched page; returns (same fingerprint as last fetch, any card changed)."""
+        self.locate(url, page, cards)
+
+        fingerprint = self.fingerprint(cards)
+        same = self.fingerprints.get((url, page)) == fingerprint
+        self.fingerprints[(url, page)] = fingerprint
+
+        changed = False
+
+        for card in cards:
+            state = (card["sold_stock"], card["total_stock"], card["sold_percentage"])
+
+            if self.cards.get(card["href"]) != state:
+                self.cards[card["href"]] = state
+                changed = True
+
+        return same, changed
+
+
+class SweepScheduler:
+    """Fetches explore pages of several listings concurrently.
+
+    Every listing is paginated until its first empty page, or, in an adaptive
+    sweep of the planner, its first page without changes. Workers claim the
+    next page of the listings round-robin, so with N fetchers up to N pages are
+    in flight; pages claimed past the end of a listing are discarded.
+
+    A failed fetch is retried `retries` times, `retry_delay` seconds apart and
+    longer with every attempt. A page that still fails ends its listing for this
+    sweep and makes the sweep partial (`partial`), it is not taken for the end
+    of the listing.
+    """
+
+    def __init__(self, fetchers: List[Fetcher], planner: CrawlPlanner = None, retries: int = 2, retry_delay: float = 1.0):
+        self.fetchers = fetchers
+        self.planner = planner
+        self.retries = retries
+        self.retry_delay = retry_delay
+        # pages of the last sweep that failed after all retries
+        self.failed: List[Tuple[str, int]] = []
+
+    @property
+    def partial(self) -> bool:
+        """Whether the last sweep missed pages it could not fetch."""
+        return bool(self.failed)
+
+    async def fetch(self, fetcher: Fetcher, url: str, page: int) -> Union[None, List[dict]]:
+        """Cards of the page, None if every attempt failed."""
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.retry_delay * attempt)
+
+            try:
+                with timed(PAGE_FETCH_SECONDS, backend=type(fetcher).__name__):
+                    return await fetcher.fetch_page(url=f"{url}&page={page}")
+            except Exception as e:
+                ERRORS.inc(component="fetch")
+                log.warning("page fetch failed", extra={"url": url, "page": page, "attempt": attempt + 1, "error": str(e)})
+
+        return None
+
+    async def sweep(
+            self,
+            parse_urls: List[str],
+            on_page: Callable[[List[dict]], Awaitable[None]] = None
+    ) -> List[dict]:
+        """`on_page` is awaited with the cards of every handed on page as it
+        arrives; a slow consumer holds the worker and so throttles fetching."""
+        full = self.planner.begin() if self.planner is not None else True
+        self.failed = []
+        next_page = {url: 1 for url in parse_urls}
+        last_page: Dict[str, Union[None, int]] = {url: None for url in parse_urls}
+        pages: Dict[Tuple[str, int], List[dict]] = {}
+        handed_on = 0
+        turn = 0
+
+        def claim() -> Union[None, Tuple[str, int]]:
+            nonlocal turn
+
+            open_urls = [url for url in parse_urls if last_page[url] is None]
+            if not open_urls:
+                return None
+
+            url = open_urls[turn % len(open_urls)]
+            turn += 1
+
+            page = next_page[url]
+            next_page[url] += 1
+            return url, page
+
+        async def worker(fetcher: Fetcher) -> None:
+            nonlocal handed_on
+
+            while (job := claim()) is not None:
+                url, page = job
+
+                cards = await self.fetch(fetcher, url, page)
+
+                if cards is not None:
+                    CARDS_PARSED.inc(len(cards))
+
+                if last_page[url] is not None and page >= last_page[url]:
+                    continue
+
+                if cards is None:
+                    # not the end of the listing: the pages from here on are missing from this sweep
+                    self.failed.append((url, page))
+                    last_page[url] = page
+                    continue
+
+                if not cards:
+                    last_page[url] = page
+                    continue
+
+                pages[(url, page)] = cards
+
+                if self.planner is not None:
+                    same, changed = self.planner.observe(url, page, cards)
+
+                    if not full and not changed:
+                        # nothing moved here, deeper pages of this listing are left to the next full sweep
+                        last_page[url] = page + 1
+
+                    if not full and (same or not changed):
+                        SWEEP_PAGES.inc(outcome="unchanged")
+                        continue
+
+                SWEEP_PAGES.inc(outcome="handed_on")
+                handed_on += 1
+
+                if on_page is not None:
+                    await on_page(cards)
+
+        await asyncio.gather(*[worker(fetcher) for fetcher in self.fetchers])
+
+        # a failure past an empty page found later is beyond the end of the listing anyway
+        self.failed = [(url, page) for url, page in self.failed if page == last_page[url]]
+        SWEEP_PAGES.inc(len(self.failed), outcome="failed")
+
+        if self.failed:
+            log.warning("sweep partial", extra={"full": full, "failed": [f"{url}&page={page}" for url, page in self.failed]})
+
+            if full and self.planner is not None:
+                self.planner.repeat_full()
+
+        log.info("sweep fetched", extra={"full": full, "pages": len(pages), "handed_on": handed_on, "failed": len(self.failed)})
+
+        return self.dedupe([
+            pages[(url, page)]
+            for url in parse_urls
+            for page in range(1, last_page[url])
+            if (url, page) in pages
+        ])
+
+    async def refresh(self, hrefs: List[str], on_page: Callable[[List[dict]], Awaitable[None]]) -> int:
+        """Re-fetches the pages `hrefs` were last seen on and hands on their cards only.
+
+        Fingerprints and card states stay as the last sweep left them, so the other
+        cards of these pages are still picked up as changed by the next sweep.
+        """
+        if self.planner is None:
+            return 0
+
+        wanted = set(hrefs)
+        jobs = list(dict.fromkeys(self.planner.locations[href] for href in hrefs if href in self.planner.locations))
+        total = len(jobs)
+
+        async def worker(fetcher: Fetcher) -> None:
+            while jobs:
+                url, page = jobs.pop(0)
+
+                try:
+                    with timed(PAGE_FETCH_SECONDS, backend=type(fetcher).__name__):
+                        cards = await fetcher.fetch_page(url=f"{url}&page={page}")
+                except Exception as e:
+                    ERRORS.inc(component="fetch")
+                    log.warning("page fetch failed", extra={"url": url, "page": page, "error": str(e)})
+                    continue
+
+                CARDS_PARSED.inc(len(cards))
+                self.planner.locate(url, page, cards)
+
+                cards = [card for card in cards if card["href"] in wanted]
+
+                if cards:
+                    SWEEP_PAGES.inc(outcome="hot")
+                    await on_page(cards)
+
+        await asyncio.gather(*[worker(fetcher) for fetcher in self.fetchers])
+
+        return total
+
+    @staticmethod
+    def dedupe(pages: List[List[dict]]) -> List[dict]:
+        rows = {}
+
+        for cards in pages:
+            for card in cards:
+                rows.setdefault(card["href"], card)
+
+        return list(rows.values())
+
+
+class Cadence:
+    """Fixed-rate cycle clock: cycles start every `interval` seconds, measured
+    from the previous start, and an overrunning cycle is followed immediately
+    without trying to catch up on the missed ticks."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.next_at = None
+
+    def start(self) -> None:
+        self.next_at = asyncio.get_running_loop().time()
+
+    def remaining(self) -> float:
+        """Seconds until the next cycle is due."""
+        if self.next_at is None:
+            return 0.0
+        return self.next_at + self.interval - asyncio.get_running_loop().time()
+
+    async def wait(self) -> None:
+        now = asyncio.get_running_loop().time()
+
+        if self.next_at is None:
+            self.next_at = now
+
+        self.next_at = max(self.next_at + self.interval, now)
+        await asyncio.sleep(self.next_at - now)
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+
+from database.dal import IngestDAL
+from database.jobs import JobQueueDAL, LEASE
+from database.models import FetchJob
+from database.session import unit_of_work, DBTransactionStatus
+from scraper.fetchers import Fetcher
+from services.metrics import PAGE_FETCH_SECONDS, CARDS_PARSED, JOB_SECONDS, JOBS, ERRORS, timed
+
+log = logging.getLogger(__name__)
+
+
+class ScrapeWorker:
+    """Claims page-fetch jobs from the queue, fetches and ingests the page and
+    enqueues the next page of the listing while the page isn't empty.
+
+    A fetch is given at most half the lease, so a slow page fails and is retried
+    instead of being claimed by a second worker while this one still holds it.
+    """
+
+    def __init__(self, fetcher: Fetcher, name: str = None, idle_interval: float = 0.5):
+        self.fetcher = fetcher
+        self.name = name if name is not None else f"{socket.gethostname()}:{os.getpid()}"
+        self.idle_interval = idle_interval
+
+    async def run_once(self) -> bool:
+        """Handles one job; False when none was available."""
+        async with unit_of_work() as session:
+            job = await JobQueueDAL(session).claim(self.name)
+
+        if job is None:
+            return False
+
+        started = time.perf_counter()
+        outcome = await self.process(job)
+        JOB_SECONDS.observe(time.perf_counter() - started)
+        JOBS.inc(outcome=outcome)
+
+        return True
+
+    async def process(self, job: FetchJob) -> str:
+        try:
+            with timed(PAGE_FETCH_SECONDS, backend=type(self.fetcher).__name__):
+                cards = await asyncio.wait_for(
+                    self.fetcher.fetch_page(url=f"{job.url}&page={job.page}"), timeout=LEASE.total_seconds() / 2
+                )
+        except Exception as e:
+            return await self.fail(job, f"fetch: {e!r}")
+
+        CARDS_PARSED.inc(len(cards))
+
+        async with unit_of_work() as session:
+            changed, status = set(), DBTransactionStatus.SUCCESS
+
+            if cards:
+                changed, status = await IngestDAL(session).ingest(cards, time=job.sweep_at, record_sweep=False)
+
+            if status is not DBTransactionStatus.SUCCESS:
+                return await self.fail(job, "ingest rolled back")
+
+            # an empty page ends the listing
+            if not await JobQueueDAL(session).complete(job, cards=len(cards), changed=changed, next_page=bool(cards)):
+                log.warning("job lease lost", extra={"job": job.id, "url": job.url, "page": job.page})
+                return "lost"
+
+        return "done"
+
+    async def fail(self, job: FetchJob, error: str) -> str:
+        ERRORS.inc(component="job")
+        log.warning("job failed", extra={"job": job.id, "url": job.url, "page": job.page, "attempt": job.attempts, "error": error})
+
+        async with unit_of_work() as session:
+            retry = await JobQueueDAL(session).fail(job, error)
+
+        return "retry" if retry else "failed"
+
+    async def run(self) -> None:
+        while True:
+            try:
+                if await self.run_once():
+                    continue
+            except Exception as e:
+                ERRORS.inc(component="job")
+                log.exception("worker failed", extra={"worker": self.name})
+
+            await asyncio.sleep(self.idle_interval)
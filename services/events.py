@@ -0,0 +1,106 @@
+"""Sweep events from the scraper to the bot over Postgres LISTEN/NOTIFY.
+
+Once a sweep is committed and its rankings are materialized the scraper sends
+
+    {"sweep_id": 1710000000000, "sweep_at": "2024-03-09T12:00:00"}
+
+on `SWEEP_EVENTS_CHANNEL` (default `lmnft_sweep`); `sweep_id` is the new data
+version. Sqlite has no NOTIFY: the scraper then edits the channel message
+itself, as before.
+"""
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable
+
+from sqlalchemy import func, make_url, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.session import DATABASE_URL, DBTransactionStatus
+from services.metrics import registry, ERRORS
+
+log = logging.getLogger(__name__)
+
+CHANNEL = os.getenv("SWEEP_EVENTS_CHANNEL", "lmnft_sweep")
+
+EVENTS = registry.counter("lmnft_sweep_events_total", "Sweep events sent or received.", ["direction"])
+
+
+@dataclass
+class SweepEvent:
+    sweep_id: int
+    sweep_at: datetime
+
+    def to_payload(self) -> str:
+        return json.dumps({"sweep_id": self.sweep_id, "sweep_at": self.sweep_at.isoformat()})
+
+    @classmethod
+    def from_payload(cls, payload: str) -> "SweepEvent":
+        data = json.loads(payload)
+        return cls(data["sweep_id"], datetime.fromisoformat(data["sweep_at"]))
+
+
+def enabled(url: str = DATABASE_URL) -> bool:
+    return make_url(url).get_backend_name() == "postgresql" and os.getenv("SWEEP_EVENTS", "1") == "1"
+
+
+async def notify(db_session: AsyncSession, event: SweepEvent) -> DBTransactionStatus:
+    """Delivered to listeners when the transaction commits."""
+    try:
+        await db_session.execute(select(func.pg_notify(CHANNEL, event.to_payload())))
+        await db_session.commit()
+        EVENTS.inc(direction="sent")
+        return DBTransactionStatus.SUCCESS
+
+    except Exception as e:
+        await db_session.rollback()
+        ERRORS.inc(component="events")
+        return DBTransactionStatus.ROLLBACK
+
+
+async def listen(
+        on_event: Callable[[SweepEvent], Awaitable[None]],
+        url: str = DATABASE_URL,
+        retry_interval: float = 5
+) -> None:
+    """Calls `on_event` for every sweep event, one at a time, reconnecting when the
+    connection drops. Events sent while disconnected are lost: handlers catch up
+    from the database rather than from the event."""
+    # a dedicated connection: LISTEN holds it for the process' lifetime
+    import asyncpg
+
+    dsn = make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+    while True:
+        connection = None
+        queue: asyncio.Queue = asyncio.Queue()
+
+        try:
+            connection = await asyncpg.connect(dsn)
+            connection.add_termination_listener(lambda _: queue.put_nowait(None))
+            await connection.add_listener(CHANNEL, lambda _connection, _pid, _channel, payload: queue.put_nowait(payload))
+            log.info("listening for sweep events", extra={"channel": CHANNEL})
+
+            while (payload := await queue.get()) is not None:
+                EVENTS.inc(direction="received")
+
+                try:
+                    await on_event(SweepEvent.from_payload(payload))
+                except Exception as e:
+                    ERRORS.inc(component="events")
+                    log.exception("sweep event handler failed")
+
+            log.warning("sweep events connection closed")
+
+        except Exception as e:
+            ERRORS.inc(component="events")
+            log.warning("sweep events listener failed", extra={"error": str(e)})
+
+        finally:
+            if connection is not None and not connection.is_closed():
+                await connection.close()
+
+        await asyncio.sleep(retry_interval)
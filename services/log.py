@@ -0,0 +1,60 @@
+"""Leveled, structured logging.
+
+    log.info("sweep fetched", extra={"cards": 120, "pages": 9})
+
+renders as logfmt (`LOG_FORMAT=logfmt`, default) or one JSON object per line
+(`LOG_FORMAT=json`); every `extra` key becomes a field. `LOG_LEVEL` sets the level.
+"""
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+
+# attributes every LogRecord has, everything else came in through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+def _fields(record: logging.LogRecord) -> dict:
+    fields = {
+        "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+        "level": record.levelname.lower(),
+        "logger": record.name,
+        "msg": record.getMessage()
+    }
+    fields.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+
+    if record.exc_info:
+        fields["exc"] = logging.Formatter().formatException(record.exc_info)
+
+    return fields
+
+
+class LogfmtFormatter(logging.Formatter):
+    @staticmethod
+    def _value(value) -> str:
+        value = str(value)
+
+        if not value or any(char in value for char in ' ="\n'):
+            return json.dumps(value, ensure_ascii=False)
+        return value
+
+    def format(self, record: logging.LogRecord) -> str:
+        return " ".join(f"{key}={self._value(value)}" for key, value in _fields(record).items())
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(_fields(record), ensure_ascii=False, default=str)
+
+
+def setup_logging(level: str = None, fmt: str = None) -> None:
+    level = level if level is not None else os.getenv("LOG_LEVEL", "INFO")
+    fmt = fmt if fmt is not None else os.getenv("LOG_FORMAT", "logfmt")
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else LogfmtFormatter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper())
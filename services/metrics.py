@@ -0,0 +1,290 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+Counters, gauges and histograms with labels, a `timed` helper for the hot
+paths, per-DAL-method query accounting and a `/metrics` endpoint on aiohttp.
+"""
+import contextvars
+import functools
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from aiohttp import web
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+
+    if extra:
+        pairs.append(extra)
+
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    @abstractmethod
+    def render(self) -> List[str]:
+        ...
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Iterable[str] = (),
+            buckets: Iterable[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label values -> [per-bucket counts, sum, count]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+
+        with self._lock:
+            state = self._values.get(key)
+
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state is not None else 0
+
+    def sum(self, **labels) -> float:
+        state = self._values.get(self._key(labels))
+        return state[1] if state is not None else 0.0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, ([*state[0]], state[1], state[2])) for key, state in self._values.items())
+
+        lines = self.header()
+
+        for key, (counts, total, count) in items:
+            cumulative = 0
+
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Iterable[str] = (),
+            buckets: Iterable[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """`collector` refreshes gauges right before every scrape."""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            collector()
+
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+PAGE_FETCH_SECONDS = registry.histogram(
+    "lmnft_page_fetch_seconds", "Explore page fetch and parse latency.", ["backend"]
+)
+CARDS_PARSED = registry.counter("lmnft_cards_parsed_total", "Collection cards parsed from explore pages.")
+SWEEP_PAGES = registry.counter(
+    "lmnft_sweep_pages_total", "Explore pages fetched, by whether they were handed on, skipped as unchanged, refreshed for hot collections or failed after retries.", ["outcome"]
+)
+DAL_SECONDS = registry.histogram("lmnft_dal_seconds", "DAL method latency.", ["method"])
+DB_QUERIES = registry.counter("lmnft_db_queries_total", "SQL statements executed, by calling DAL method.", ["method"])
+DB_QUERY_SECONDS = registry.histogram("lmnft_db_query_seconds", "SQL statement latency, by calling DAL method.", ["method"])
+ALERT_SECONDS = registry.histogram("lmnft_alert_evaluation_seconds", "Growth computation and alert evaluation per batch.")
+TELEGRAM_SECONDS = registry.histogram("lmnft_telegram_request_seconds", "Telegram Bot API request latency.", ["method"])
+TELEGRAM_RETRIES = registry.counter("lmnft_telegram_retries_total", "Telegram requests retried after 429.", ["method"])
+JOB_SECONDS = registry.histogram("lmnft_job_seconds", "Page-fetch job run time in a worker: fetch, ingest, completion.")
+JOBS = registry.counter("lmnft_jobs_total", "Page-fetch jobs handled by workers, by outcome.", ["outcome"])
+ERRORS = registry.counter("lmnft_errors_total", "Errors by component.", ["component"])
+POOL_WAIT_SECONDS = registry.histogram("lmnft_db_pool_wait_seconds", "Time to check a connection out of the pool.")
+POOL_CHECKOUTS = registry.counter("lmnft_db_pool_checkouts_total", "Connections checked out of the pool.")
+POOL_CONNECTS = registry.counter("lmnft_db_pool_connects_total", "New database connections opened by the pool.")
+POOL_CHECKED_OUT = registry.gauge("lmnft_db_pool_checked_out", "Connections currently checked out.")
+
+_dal_method = contextvars.ContextVar("dal_method", default="other")
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+
+
+def instrumented(method: Callable) -> Callable:
+    """Times an async DAL method and attributes the SQL it runs to it."""
+    name = method.__qualname__
+
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        token = _dal_method.set(name)
+        try:
+            with timed(DAL_SECONDS, method=name):
+                return await method(*args, **kwargs)
+        finally:
+            _dal_method.reset(token)
+
+    return wrapper
+
+
+def instrument_engine(engine) -> None:
+    """Counts and times every statement of an (async) engine."""
+    from sqlalchemy import event
+
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        method = _dal_method.get()
+        DB_QUERIES.inc(method=method)
+        DB_QUERY_SECONDS.observe(time.perf_counter() - started, method=method)
+
+    @event.listens_for(sync_engine.pool, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        POOL_CHECKOUTS.inc()
+
+    @event.listens_for(sync_engine.pool, "connect")
+    def connect(dbapi_connection, connection_record):
+        POOL_CONNECTS.inc()
+
+    checkedout = getattr(sync_engine.pool, "checkedout", None)
+    if checkedout is not None:
+        registry.add_collector(lambda: POOL_CHECKED_OUT.set(checkedout()))
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+        if started:
+            started.pop()
+        ERRORS.inc(component="db")
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+
+async def serve(host: str = "127.0.0.1", port: int = 9100) -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+
+    # scraped every few seconds, keep it out of the logs
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+
+    return runner
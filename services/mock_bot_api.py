@@ -0,0 +1,74 @@
+"""Local stand-in for the Telegram Bot API.
+
+Records every call and answers with a plausible result; `flood_every` makes
+every n-th call fail with 429 so backoff can be exercised, `errors` answers
+given calls (1-based) with other errors.
+
+    python -m services.mock_bot_api --port 8086 --flood-every 5
+    TELEGRAM_API_URL=http://127.0.0.1:8086 python bot.py
+"""
+import argparse
+import itertools
+import time
+from typing import Dict, List, Tuple
+
+from aiohttp import web
+
+
+class MockBotAPI:
+    def __init__(self, flood_every: int = 0, retry_after: int = 1, errors: Dict[int, Tuple[int, str]] = None):
+        self.flood_every = flood_every
+        self.retry_after = retry_after
+        # call number -> (error_code, description)
+        self.errors = dict(errors or {})
+        self.calls: List[Tuple[float, str, dict]] = []
+        self._message_ids = itertools.count(1)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post()) if request.body_exists else {}
+        params.update(request.query)
+
+        self.calls.append((time.monotonic(), method, params))
+
+        if len(self.calls) in self.errors:
+            error_code, description = self.errors[len(self.calls)]
+            return web.json_response({"ok": False, "error_code": error_code, "description": description}, status=error_code)
+
+        if self.flood_every and len(self.calls) % self.flood_every == 0:
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after}
+            }, status=429)
+
+        return web.json_response({"ok": True, "result": self.result(method, params)})
+
+    def result(self, method: str, params: dict):
+        if method in ("sendMessage", "editMessageText"):
+            message_id = int(params.get("message_id") or next(self._message_ids))
+            return {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": -100, "type": "channel", "title": "mock"},
+                "text": params.get("text", "")
+            }
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "mock", "username": "mock_bot"}
+        return True
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self.handle)
+        return app
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8086)
+    arg_parser.add_argument("--flood-every", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    web.run_app(MockBotAPI(flood_every=args.flood_every).create_app(), host=args.host, port=args.port)
@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Dict, Tuple, Union
+
+from telebot.async_telebot import AsyncTeleBot
+from telebot.asyncio_helper import ApiTelegramException
+from telebot import types
+
+from services.metrics import TELEGRAM_SECONDS, TELEGRAM_RETRIES, ERRORS, timed
+
+log = logging.getLogger(__name__)
+
+Render = Callable[[], Awaitable[Tuple[str, types.InlineKeyboardMarkup]]]
+
+
+class _ChatQueue:
+    def __init__(self):
+        # message_id -> (latest render requested for it, attempts so far), older requests are dropped
+        self.edits: Dict[int, Tuple[Render, int]] = {}
+        self.sends = deque()
+        self.wakeup = asyncio.Event()
+        self.next_at = 0.0
+        self.task: Union[None, asyncio.Task] = None
+
+
+class OutboundQueue:
+    """Per-chat outbound queue for the Telegram Bot API.
+
+    Edits of the same message are coalesced: only the latest render request
+    is kept, it is rendered when the chat's rate limit allows, skipped when
+    text and markup hash the same as the last edit, and sent as a single
+    editMessageText carrying the reply markup. Sends (alerts) are FIFO.
+    Requests to one chat are spaced `chat_interval` seconds apart and 429
+    responses push the chat back by the returned retry_after. Other failures
+    (server errors, timeouts, connection errors) are retried after
+    `chat_interval`; either way a request is retried at most `max_retries`
+    times. Other 4xx errors ("message to edit not found", "message is not
+    modified", ...) would fail again and drop the request at once.
+
+    Queues are keyed by `chat_id` as given: one chat has to be addressed by one
+    id (e.g. always "@LMNFT", never also its numeric id), or its requests are
+    neither coalesced nor paced together.
+    """
+
+    def __init__(self, bot: AsyncTeleBot, chat_interval: float = 3, max_retries: int = 5):
+        self.bot = bot
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self.chats: Dict[Union[int, str], _ChatQueue] = {}
+        self.sent_hashes: Dict[Tuple[Union[int, str], int], str] = {}
+
+    def _chat(self, chat_id: Union[int, str]) -> _ChatQueue:
+        queue = self.chats.get(chat_id)
+
+        if queue is None:
+            queue = self.chats[chat_id] = _ChatQueue()
+
+        if queue.task is None or queue.task.done():
+            queue.task = asyncio.create_task(self._worker(chat_id, queue))
+
+        return queue
+
+    def edit(self, chat_id: Union[int, str], message_id: int, render: Render) -> None:
+        queue = self._chat(chat_id)
+        queue.edits.pop(message_id, None)
+        queue.edits[message_id] = (render, 0)
+        queue.wakeup.set()
+
+    def send(self, chat_id: Union[int, str], text: str, **kwargs) -> None:
+        queue = self._chat(chat_id)
+        queue.sends.append((text, kwargs, 0))
+        queue.wakeup.set()
+
+    async def join(self) -> None:
+        """Waits until every queued request has been delivered or dropped."""
+        while any(queue.edits or queue.sends or queue.wakeup.is_set() for queue in self.chats.values()):
+            await asyncio.sleep(0.05)
+
+    @staticmethod
+    def content_hash(text: str, markup: Union[None, types.InlineKeyboardMarkup]) -> str:
+        payload = text + (markup.to_json() if markup is not None else "")
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    async def _worker(self, chat_id: Union[int, str], queue: _ChatQueue) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            await queue.wakeup.wait()
+
+            while queue.sends or queue.edits:
+                delay = queue.next_at - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                if queue.sends:
+                    text, kwargs, attempt = queue.sends.popleft()
+                    method = "sendMessage"
+                    request = self._send(chat_id, text, kwargs)
+                    requeue = lambda: queue.sends.appendleft((text, kwargs, attempt + 1))
+                else:
+                    message_id = next(iter(queue.edits))
+                    render, attempt = queue.edits.pop(message_id)
+                    method = "editMessageText"
+                    request = self._edit(chat_id, message_id, render)
+                    # a newer render for the same message supersedes this one
+                    requeue = lambda: queue.edits.setdefault(message_id, (render, attempt + 1))
+
+                try:
+                    if await request:
+                        queue.next_at = loop.time() + self.chat_interval
+
+                except Exception as e:
+                    flood = isinstance(e, ApiTelegramException) and e.error_code == 429
+                    permanent = isinstance(e, ApiTelegramException) and 400 <= e.error_code < 500 and not flood
+
+                    if not permanent and attempt < self.max_retries:
+                        retry_after = self.chat_interval
+
+                        if flood:
+                            retry_after = (e.result_json.get("parameters") or {}).get("retry_after", self.chat_interval)
+
+                        queue.next_at = loop.time() + retry_after
+                        TELEGRAM_RETRIES.inc(method=method)
+                        requeue()
+                    elif not (permanent and "message is not modified" in e.description):
+                        ERRORS.inc(component="telegram")
+                        log.warning("telegram request dropped", extra={
+                            "chat_id": chat_id, "method": method, "attempts": attempt + 1, "error": str(e)
+                        })
+
+            queue.wakeup.clear()
+
+    async def _send(self, chat_id: Union[int, str], text: str, kwargs: dict) -> bool:
+        with timed(TELEGRAM_SECONDS, method="sendMessage"):
+            await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+        return True
+
+    async def _edit(self, chat_id: Union[int, str], message_id: int, render: Render) -> bool:
+        text, markup = await render()
+        content_hash = self.content_hash(text, markup)
+
+        if self.sent_hashes.get((chat_id, message_id)) == content_hash:
+            return False
+
+        with timed(TELEGRAM_SECONDS, method="editMessageText"):
+            await self.bot.edit_message_text(
+                text=text,
+                chat_id=chat_id,
+                message_id=message_id,
+                parse_mode="html",
+                reply_markup=markup
+            )
+        self.sent_hashes[(chat_id, message_id)] = content_hash
+        return True
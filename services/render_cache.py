@@ -0,0 +1,81 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Hashable, Tuple, Union
+
+from services.settings import Settings
+
+
+def data_version(sweep_at: Union[None, datetime]) -> int:
+    """Version of the data a sweep committed: its time in milliseconds."""
+    return int(sweep_at.timestamp() * 1000) if sweep_at is not None else 0
+
+
+def render_key(data: Settings) -> tuple:
+    """Everything a rendered page depends on besides the data version: view settings, page."""
+    return (
+        data.sort_type,
+        data.growth_sort_time_interval if data.sort_type == "by_growth" else None,
+        data.min_stock,
+        data.user_state,
+        data.items_per_page,
+        # shown in the message header
+        data.alert_interval,
+        data.alert_percent
+    )
+
+
+class RenderCache:
+    """LRU of rendered channel pages: the text and the size of the ranking it was
+    rendered from, which sets the page count shown by the keyboard.
+
+    Entries belong to the cache's current data version; a newer version
+    (`advance`) drops them all, and a page rendered from an older one is not
+    stored.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[str, int]]" = OrderedDict()
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def advance(self, version: int) -> None:
+        with self._lock:
+            if version > self.version:
+                self.version = version
+                self._entries.clear()
+
+    def get(self, key: Hashable) -> Union[None, Tuple[str, int]]:
+        with self._lock:
+            value = self._entries.get(key)
+
+            if value is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Tuple[str, int], version: int) -> None:
+        with self._lock:
+            if version != self.version:
+                # a sweep was committed while the page rendered
+                return
+
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+render_cache = RenderCache(int(os.getenv("RENDER_CACHE_SIZE", "128")))
@@ -0,0 +1,227 @@
+import asyncio
+import ctypes
+import ctypes.util
+import fcntl
+import json
+import logging
+import os
+import struct
+import tempfile
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict, fields, replace
+from typing import Callable, List, Tuple, Union
+
+log = logging.getLogger(__name__)
+
+# <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+_EVENT = struct.Struct("iIII")
+
+
+@dataclass(frozen=True)
+class Settings:
+    user_state: int = 1
+    message_to_edit: Union[None, int] = None
+    items_per_page: int = 10
+    total_pages: int = 1
+    min_stock: int = 500
+    sort_type: str = "by_stock"
+    growth_sort_time_interval: int = 5
+    alert_interval: int = 5
+    alert_percent: int = 2
+    # collection hrefs the scraper refreshes between sweeps (/pin, /unpin)
+    pinned: Tuple[str, ...] = ()
+
+
+def _inotify(directory: str) -> Union[None, int]:
+    """Non-blocking inotify descriptor watching files written or renamed into `directory`, None off Linux."""
+    name = ctypes.util.find_library("c")
+    libc = ctypes.CDLL(name, use_errno=True) if name else None
+
+    if libc is None or not hasattr(libc, "inotify_init1"):
+        return None
+
+    fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    if fd < 0:
+        return None
+
+    if libc.inotify_add_watch(fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE) < 0:
+        os.close(fd)
+        return None
+
+    return fd
+
+
+def _inotify_names(data: bytes) -> List[str]:
+    names, offset = [], 0
+
+    while offset + _EVENT.size <= len(data):
+        _, _, _, length = _EVENT.unpack_from(data, offset)
+        offset += _EVENT.size
+        names.append(os.fsdecode(data[offset:offset + length].rstrip(b"\0")))
+        offset += length
+
+    return names
+
+
+class SettingsStore:
+    """Bot/view settings kept in memory and persisted to a json file.
+
+    Writes go through a temp file + rename under an flock, so the bot and the
+    scraper process never see a torn file. Each process notifies its subscribers
+    with (old, new), after the store's lock is released, for its own changes and
+    for the other process' ones: `watch()` learns about those from inotify and
+    `get()` then serves the in-memory settings. Without inotify (not Linux)
+    `watch()` polls the file's mtime and `get()` stats the file on every call.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._subscribers: List[Callable[[Settings, Settings], None]] = []
+        self._stamp = None
+        self._settings = Settings()
+        # inotify is watching the file: no need to stat it on every get()
+        self._watched = False
+        self.reload()
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_ino, stat.st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @contextmanager
+    def _file_lock(self):
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self) -> Settings:
+        try:
+            with open(self.path, "r") as json_file:
+                data = json.load(json_file)
+        except FileNotFoundError:
+            return Settings()
+
+        known = {field.name for field in fields(Settings)}
+        # json has no tuples, keep settings comparable with the ones written
+        return Settings(**{key: tuple(value) if isinstance(value, list) else value for key, value in data.items() if key in known})
+
+    def _write(self, settings: Settings) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".settings-", suffix=".json")
+
+        try:
+            with os.fdopen(fd, "w") as json_file:
+                json.dump(asdict(settings), json_file, indent=4)
+                json_file.flush()
+                os.fsync(json_file.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _set(self, settings: Settings) -> Union[None, Tuple[Settings, Settings]]:
+        """Swaps the settings under the lock; the change is notified once it is released."""
+        old, self._settings = self._settings, settings
+        return (old, settings) if old != settings else None
+
+    def _notify(self, change: Union[None, Tuple[Settings, Settings]]) -> None:
+        # subscribers may call get() or update() again
+        if change is not None:
+            for callback in list(self._subscribers):
+                callback(*change)
+
+    def reload(self) -> Settings:
+        """Re-reads the file if another process changed it."""
+        change = None
+
+        with self._lock:
+            stamp = self._file_stamp()
+
+            if stamp is not None and stamp != self._stamp:
+                self._stamp = stamp
+                change = self._set(self._read())
+
+            current = self._settings
+
+        self._notify(change)
+        return current
+
+    def get(self) -> Settings:
+        if self._watched:
+            return self._settings
+        return self.reload()
+
+    def update(self, **changes) -> Settings:
+        with self._lock, self._file_lock():
+            current = self._read() if self._file_stamp() is not None else self._settings
+
+            if changes.get("user_state") is not None:
+                total_pages = changes["total_pages"] if changes.get("total_pages") is not None else current.total_pages
+                changes["user_state"] = max(1, min(changes["user_state"], total_pages))
+
+            settings = replace(current, **{key: value for key, value in changes.items() if value is not None})
+
+            self._write(settings)
+            self._stamp = self._file_stamp()
+            change = self._set(settings)
+
+        self._notify(change)
+        return settings
+
+    def subscribe(self, callback: Callable[[Settings, Settings], None]) -> None:
+        self._subscribers.append(callback)
+
+    async def watch(self, interval: float = 1) -> None:
+        """Pushes changes made by the other process to this process' subscribers as
+        inotify reports them; polls every `interval` seconds where there is no inotify."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        name = os.path.basename(self.path)
+        fd = _inotify(directory)
+
+        if fd is None:
+            log.info("settings: no inotify, polling", extra={"interval": interval})
+
+            while True:
+                self.reload()
+                await asyncio.sleep(interval)
+
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+
+        def on_readable() -> None:
+            try:
+                data = os.read(fd, 64 * 1024)
+            except BlockingIOError:
+                return
+
+            if name in _inotify_names(data):
+                changed.set()
+
+        loop.add_reader(fd, on_readable)
+        self._watched = True
+
+        try:
+            # written meanwhile
+            self.reload()
+
+            while True:
+                await changed.wait()
+                changed.clear()
+                self.reload()
+        finally:
+            self._watched = False
+            loop.remove_reader(fd)
+            os.close(fd)
+
+settings = SettingsStore(os.getenv("SETTINGS_PATH", "msg_to_edit.json"))
@@ -0,0 +1,81 @@
+import os
+import sys
+import tempfile
+from contextlib import asynccontextmanager
+
+# database.session and services.settings read these at import: never a real database or channel
+_scratch = tempfile.mkdtemp(prefix="lmnft-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_scratch, 'lmnft.db')}"
+os.environ["SETTINGS_PATH"] = os.path.join(_scratch, "settings.json")
+# bot.py builds its bot at import: a dummy token and no real Bot API
+os.environ["BOT_TOKEN"] = "1:test"
+os.environ["TELEGRAM_API_URL"] = "http://127.0.0.1:9"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, make_url, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from database import Base
+
+# a scratch Postgres database for the tests that need one (partitions, SKIP LOCKED, NOTIFY): its schema is dropped
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database")
+
+
+@pytest.fixture
+def database(tmp_path):
+    """`async with database() as sessions:` a fresh sqlite database with all tables."""
+
+    @asynccontextmanager
+    async def open_database():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'tracking.db'}")
+
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+
+        try:
+            yield async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+        finally:
+            await engine.dispose()
+
+    return open_database
+
+
+def migrate(url: str) -> None:
+    """Drops everything in the database and runs the migrations, as production gets them."""
+    url = make_url(url).set(drivername="postgresql+psycopg2")
+
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        connection.execute(text("DROP SCHEMA public CASCADE"))
+        connection.execute(text("CREATE SCHEMA public"))
+    engine.dispose()
+
+    config = Config(os.path.join(MIGRATIONS, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(MIGRATIONS, "migrations"))
+    config.set_main_option("sqlalchemy.url", url.render_as_string(hide_password=False).replace("%", "%%"))
+    command.upgrade(config, "head")
+
+
+@pytest.fixture
+def postgres():
+    """`async with postgres() as sessions:` a freshly migrated TEST_DATABASE_URL; skipped without one."""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    migrate(TEST_DATABASE_URL)
+
+    @asynccontextmanager
+    async def open_database():
+        engine = create_async_engine(TEST_DATABASE_URL)
+
+        try:
+            yield async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+        finally:
+            await engine.dispose()
+
+    return open_database
@@ -0,0 +1,109 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from analytics.alerts import AlertEngine
+
+START = datetime(2024, 3, 10, 12)
+
+
+def growth(percent: float):
+    return (int(percent), float(percent))
+
+
+def at(minutes: float) -> datetime:
+    return START + timedelta(minutes=minutes)
+
+
+def test_alert_fires_once_while_growth_stays_high():
+    engine = AlertEngine(cooldown_minutes=15, rearm_ratio=0.5)
+
+    assert engine.evaluate({"a": growth(3), "b": growth(1), "c": None}, alert_percent=2, now=at(0)) == ["a"]
+    # still above the threshold: no second alert, however long it lasts
+    assert engine.evaluate({"a": growth(5)}, alert_percent=2, now=at(1)) == []
+    assert engine.evaluate({"a": growth(3)}, alert_percent=2, now=at(30)) == []
+
+
+def test_alert_rearms_only_below_the_rearm_ratio():
+    engine = AlertEngine(cooldown_minutes=0, rearm_ratio=0.5)
+    engine.evaluate({"a": growth(3)}, alert_percent=2, now=at(0))
+
+    # below the threshold, but not below threshold * ratio: still disarmed
+    assert engine.evaluate({"a": growth(1.5)}, alert_percent=2, now=at(1)) == []
+    assert engine.evaluate({"a": growth(3)}, alert_percent=2, now=at(2)) == []
+
+    assert engine.evaluate({"a": growth(0.5)}, alert_percent=2, now=at(3)) == []
+    assert engine.evaluate({"a": growth(3)}, alert_percent=2, now=at(4)) == ["a"]
+
+
+def test_cooldown_holds_a_rearmed_alert():
+    engine = AlertEngine(cooldown_minutes=15, rearm_ratio=0.5)
+    engine.evaluate({"a": growth(3)}, alert_percent=2, now=at(0))
+    engine.evaluate({"a": growth(0)}, alert_percent=2, now=at(1))
+
+    assert engine.evaluate({"a": growth(3)}, alert_percent=2, now=at(10)) == []
+    assert engine.evaluate({"a": growth(3)}, alert_percent=2, now=at(15)) == ["a"]
+
+
+def test_reset_forgets_alert_states():
+    engine = AlertEngine(cooldown_minutes=15, rearm_ratio=0.5)
+    engine.evaluate({"a": growth(3)}, alert_percent=2, now=at(0))
+
+    # the thresholds changed: the next evaluation starts over
+    engine.reset()
+
+    assert engine.candidates([]) == set()
+    assert engine.evaluate({"a": growth(3)}, alert_percent=2, now=at(1)) == ["a"]
+
+
+def test_rearmed_states_are_pruned_after_the_cooldown():
+    engine = AlertEngine(cooldown_minutes=15, rearm_ratio=0.5)
+    engine.evaluate({"a": growth(3), "b": growth(3)}, alert_percent=2, now=at(0))
+    engine.evaluate({"a": growth(0)}, alert_percent=2, now=at(1))
+
+    # "a" rearmed but within its cooldown, "b" disarmed: both are kept
+    assert set(engine.states) == {"a", "b"}
+
+    engine.evaluate({}, alert_percent=2, now=at(15))
+    assert set(engine.states) == {"b"}
+
+
+def test_candidates_are_the_changed_and_the_disarmed():
+    engine = AlertEngine()
+    engine.evaluate({"a": growth(3)}, alert_percent=2, now=at(0))
+
+    assert engine.candidates({"b"}) == {"a", "b"}
+
+
+def test_parser_alerts_on_changed_and_disarmed_collections(monkeypatch):
+    import app
+
+    engine = AlertEngine(cooldown_minutes=15, rearm_ratio=0.5)
+    requested, sent = [], []
+    percents = {"a": 5, "b": 1, "c": 1}
+
+    async def sales_changes(session, hrefs, intervals):
+        requested.append(set(hrefs))
+        return {href: {interval: growth(percents[href]) for interval in intervals} for href in hrefs}
+
+    async def get_many(self, hrefs):
+        return [
+            SimpleNamespace(href=href, title=href, sold_percentage=1, sold_stock=10, total_stock=100)
+            for href in hrefs
+        ]
+
+    monkeypatch.setattr(app, "alert_engine", engine)
+    monkeypatch.setattr(app, "sales_changes", sales_changes)
+    monkeypatch.setattr(app.CollectionsDAL, "get_many", get_many)
+    monkeypatch.setattr(app, "outbound", SimpleNamespace(send=lambda chat_id, text, parse_mode: sent.append(text)))
+    app.settings.update(alert_interval=5, alert_percent=2)
+
+    asyncio.run(app.Parser.alert(None, {"a", "b"}))
+    # "a" is disarmed now: evaluated again with the next change set, though it didn't change
+    asyncio.run(app.Parser.alert(None, {"c"}))
+    # nothing changed and nothing disarmed: no growth is computed at all
+    engine.reset()
+    asyncio.run(app.Parser.alert(None, set()))
+
+    assert requested == [{"a", "b"}, {"a", "c"}]
+    assert len(sent) == 1 and '<a href="a">a</a>' in sent[0]
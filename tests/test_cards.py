@@ -0,0 +1,76 @@
+from scraper.cards import SCROLL_CLASS, cards_from_raw, parse_cards
+
+PAGE_URL = "https://www.launchmynft.io/explore?page=1"
+
+
+def card(href: str, title: str, percentage: str, stock: str) -> str:
+    return (
+        f'<a href="{href}" style="overflow: hidden;">'
+        f'<strong>{title}</strong><strong>{percentage}</strong>'
+        f'<span>Price</span><span>{stock}</span>'
+        f'</a>'
+    )
+
+
+def page(*cards: str) -> str:
+    return f'<html><body><div class="{SCROLL_CLASS}"><div>{"".join(cards)}</div></div></body></html>'
+
+
+def test_parse_cards():
+    html = page(
+        card("/collections/a/1", "Alpha", "12.5%", "125/1000"),
+        card("/collections/b/2", "  Beta\n  Two ", "100%", "50 / 50"),
+    )
+
+    assert parse_cards(html, PAGE_URL) == [
+        {
+            "href": "https://www.launchmynft.io/collections/a/1",
+            "title": "Alpha",
+            "sold_percentage": 12.5,
+            "total_stock": 1000,
+            "sold_stock": 125
+        },
+        {
+            "href": "https://www.launchmynft.io/collections/b/2",
+            "title": "Beta Two",
+            "sold_percentage": 100.0,
+            "total_stock": 50,
+            "sold_stock": 50
+        },
+    ]
+
+
+def test_parse_cards_skips_placeholders_and_foreign_links():
+    html = page(
+        card("/collections/a/1", "", "0%", "0/10"),
+        '<a href="/collections/b/2"><strong>Beta</strong><strong>1%</strong><span>x</span><span>1/100</span></a>',
+        '<a href="/collections/c/3" style="overflow: hidden;"><strong>Gamma</strong><span>x</span></a>',
+        card("/collections/d/4", "Delta", "3%", "3/100"),
+    )
+
+    assert [row["title"] for row in parse_cards(html, PAGE_URL)] == ["Delta"]
+
+
+def test_parse_cards_outside_listing_ignored():
+    html = card("/collections/a/1", "Alpha", "1%", "1/100") + page(card("/collections/b/2", "Beta", "2%", "2/100"))
+
+    assert [row["title"] for row in parse_cards(html, PAGE_URL)] == ["Beta"]
+
+
+def test_parse_cards_empty_listing():
+    assert parse_cards(page(), PAGE_URL) == []
+
+
+def test_parse_cards_without_listing():
+    assert parse_cards("<html><body><h1>Just a moment...</h1></body></html>", PAGE_URL) is None
+    assert parse_cards("", PAGE_URL) is None
+
+
+def test_cards_from_raw_matches_parser():
+    raw = [
+        {"href": "https://www.launchmynft.io/collections/a/1", "strong": ["Alpha", "12.5%"], "span": ["Price", "125/1000"]},
+        {"href": "/collections/b/2", "strong": ["", "0%"], "span": ["Price", "0/10"]},
+        {"href": "/collections/c/3", "strong": ["Gamma"], "span": ["Price", "1/10"]},
+    ]
+
+    assert cards_from_raw(raw, PAGE_URL) == parse_cards(page(card("/collections/a/1", "Alpha", "12.5%", "125/1000")), PAGE_URL)
@@ -0,0 +1,75 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from database.session import DBTransactionStatus
+from services import events
+from services.events import SweepEvent
+
+
+async def send_until_received(sessions, received: asyncio.Queue, sweep_at: datetime) -> SweepEvent:
+    """Notifies until the listener, which may still be connecting, hands an event on."""
+    for i in range(100):
+        sent = SweepEvent(int(sweep_at.timestamp() * 1000) + i, sweep_at + timedelta(milliseconds=i))
+
+        async with sessions() as session:
+            assert await events.notify(session, sent) is DBTransactionStatus.SUCCESS
+
+        try:
+            event = await asyncio.wait_for(received.get(), 0.1)
+        except asyncio.TimeoutError:
+            continue
+
+        # the last one sent or, at most, one sent just before it
+        assert event.sweep_id <= sent.sweep_id
+        return event
+
+    raise AssertionError("no sweep event received")
+
+
+def test_notify_reaches_listener_and_listener_reconnects(postgres):
+    sweep_at = datetime(2024, 3, 10, 12)
+
+    async def scenario():
+        async with postgres() as sessions:
+            received: asyncio.Queue = asyncio.Queue()
+
+            async def on_event(event: SweepEvent) -> None:
+                await received.put(event)
+
+            listener = asyncio.create_task(events.listen(on_event, url=os.environ["TEST_DATABASE_URL"], retry_interval=0.05))
+
+            try:
+                event = await send_until_received(sessions, received, sweep_at)
+                assert isinstance(event, SweepEvent)
+                assert event.sweep_id == int(event.sweep_at.timestamp() * 1000)
+
+                # nothing is delivered for a notify that is rolled back
+                async with sessions() as session:
+                    await session.execute(text("SELECT pg_notify(:channel, :payload)"), {
+                        "channel": events.CHANNEL, "payload": SweepEvent(1, sweep_at).to_payload()
+                    })
+                    await session.rollback()
+
+                # drop the listener's connection, as a restart of the server would
+                async with sessions() as session:
+                    await asyncio.sleep(0.2)
+                    while not received.empty():
+                        assert received.get_nowait().sweep_id != 1
+
+                    terminated = await session.execute(text(
+                        "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                        "WHERE pid <> pg_backend_pid() AND query ILIKE 'LISTEN%'"
+                    ))
+                    assert terminated.scalars().all() == [True]
+                    await session.commit()
+
+                event = await send_until_received(sessions, received, sweep_at + timedelta(minutes=1))
+                assert event.sweep_at >= sweep_at + timedelta(minutes=1)
+
+            finally:
+                listener.cancel()
+
+    asyncio.run(scenario())
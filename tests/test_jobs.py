@@ -0,0 +1,133 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from database import jobs
+from database.jobs import JobQueueDAL, MAX_ATTEMPTS
+from database.session import DBTransactionStatus
+
+LISTING = "http://lmnft.test/explore?sortBy=collections"
+
+
+def test_concurrent_claims_take_every_job_once(postgres):
+    sweep_at = datetime.now().replace(microsecond=0)
+
+    async def scenario():
+        async with postgres() as sessions:
+            async with sessions() as session:
+                pages = [(f"{LISTING}&listing={i}", 1) for i in range(40)]
+                assert await JobQueueDAL(session).enqueue(sweep_at, pages) is DBTransactionStatus.SUCCESS
+
+            async def worker(name: str) -> list:
+                claimed = []
+
+                async with sessions() as session:
+                    while (job := await JobQueueDAL(session).claim(name)) is not None:
+                        claimed.append(job.id)
+                        assert await JobQueueDAL(session).complete(job, cards=0, changed=set(), next_page=False)
+
+                return claimed
+
+            claimed = await asyncio.gather(*[worker(f"w{i}") for i in range(8)])
+            ids = [job_id for worker_ids in claimed for job_id in worker_ids]
+
+            # SKIP LOCKED: no job is handed to two workers, none is left behind
+            assert len(ids) == len(set(ids)) == 40
+
+            async with sessions() as session:
+                progress = await JobQueueDAL(session).progress(sweep_at)
+                assert (progress.jobs, progress.done, progress.retries) == (40, 40, 0)
+                assert progress.finished
+
+    asyncio.run(scenario())
+
+
+def test_expired_lease_moves_to_another_worker(postgres, monkeypatch):
+    sweep_at = datetime.now().replace(microsecond=0)
+
+    async def scenario():
+        async with postgres() as sessions:
+            async with sessions() as session:
+                await JobQueueDAL(session).enqueue(sweep_at, [(LISTING, 1)])
+
+            monkeypatch.setattr(jobs, "LEASE", timedelta(seconds=-1))
+            async with sessions() as session:
+                stale = await JobQueueDAL(session).claim("slow")
+            monkeypatch.setattr(jobs, "LEASE", timedelta(seconds=60))
+
+            async with sessions() as first, sessions() as second:
+                # both go for the expired lease at once, one of them gets it
+                claimed = await asyncio.gather(JobQueueDAL(first).claim("a"), JobQueueDAL(second).claim("b"))
+
+            job = next(job for job in claimed if job is not None)
+            assert [job for job in claimed if job is None] == [None]
+            assert (job.id, job.attempts) == (stale.id, 2)
+
+            async with sessions() as first, sessions() as second:
+                # the slow worker finishing late neither completes nor fails the job of the new holder
+                completed, _ = await asyncio.gather(
+                    JobQueueDAL(first).complete(stale, cards=2, changed={"/c/1"}, next_page=True),
+                    JobQueueDAL(second).fail(stale, "fetch: timeout")
+                )
+                assert not completed
+
+            async with sessions() as session:
+                assert await JobQueueDAL(session).complete(job, cards=2, changed={"/c/1"}, next_page=True)
+                progress = await JobQueueDAL(session).progress(sweep_at)
+
+            # the next page of the listing was enqueued once, by the holder of the lease
+            assert (progress.jobs, progress.done, progress.pending, progress.failed) == (2, 1, 1, 0)
+            assert progress.changed == {"/c/1"}
+
+    asyncio.run(scenario())
+
+
+def test_failing_job_is_retried_then_failed(postgres, monkeypatch):
+    sweep_at = datetime.now().replace(microsecond=0)
+    monkeypatch.setattr(jobs, "RETRY_DELAY", timedelta(0))
+
+    async def scenario():
+        async with postgres() as sessions:
+            async with sessions() as session:
+                await JobQueueDAL(session).enqueue(sweep_at, [(LISTING, 1)])
+
+            async def attempt(name: str) -> bool:
+                async with sessions() as session:
+                    job = await JobQueueDAL(session).claim(name)
+                    return await JobQueueDAL(session).fail(job, "fetch: connection reset")
+
+            retries = [await attempt(f"w{i}") for i in range(MAX_ATTEMPTS)]
+            assert retries == [True] * (MAX_ATTEMPTS - 1) + [False]
+
+            async with sessions() as session:
+                assert await JobQueueDAL(session).claim("w") is None
+                progress = await JobQueueDAL(session).progress(sweep_at)
+
+            assert progress.finished
+            assert (progress.failed, progress.retries) == (1, MAX_ATTEMPTS - 1)
+
+    asyncio.run(scenario())
+
+
+def test_lease_expiry_on_the_last_attempt_fails_the_job(postgres, monkeypatch):
+    sweep_at = datetime.now().replace(microsecond=0)
+    monkeypatch.setattr(jobs, "RETRY_DELAY", timedelta(0))
+
+    async def scenario():
+        async with postgres() as sessions:
+            async with sessions() as session:
+                await JobQueueDAL(session).enqueue(sweep_at, [(LISTING, 1)])
+
+                for i in range(MAX_ATTEMPTS - 1):
+                    await JobQueueDAL(session).fail(await JobQueueDAL(session).claim(f"w{i}"), "fetch: timeout")
+
+                monkeypatch.setattr(jobs, "LEASE", timedelta(seconds=-1))
+                await JobQueueDAL(session).claim("dead")
+
+                # nobody may claim it again, so the coordinator doesn't wait for it until the sweep times out
+                progress = await JobQueueDAL(session).progress(sweep_at)
+
+            assert progress.finished
+            assert progress.failed == 1
+
+    asyncio.run(scenario())
+
@@ -0,0 +1,234 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+from aiohttp import web
+from telebot import asyncio_helper, types
+from telebot.async_telebot import AsyncTeleBot
+
+from services.mock_bot_api import MockBotAPI
+from services.outbound import OutboundQueue
+
+
+@asynccontextmanager
+async def bot_api(**options):
+    """A bot talking to a local MockBotAPI."""
+    mock = MockBotAPI(**options)
+    runner = web.AppRunner(mock.create_app())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+
+    api_url = asyncio_helper.API_URL
+    asyncio_helper.API_URL = f"http://127.0.0.1:{runner.addresses[0][1]}/bot{{0}}/{{1}}"
+    bot = AsyncTeleBot("1:test")
+
+    try:
+        yield mock, bot
+    finally:
+        asyncio_helper.API_URL = api_url
+        await bot.close_session()
+        await runner.cleanup()
+
+
+class Page:
+    """Render callback with a counter, like bot.render_message."""
+
+    def __init__(self, text: str = "page 1"):
+        self.text = text
+        self.renders = 0
+
+    async def __call__(self):
+        self.renders += 1
+        markup = types.InlineKeyboardMarkup()
+        markup.add(types.InlineKeyboardButton("Next ➡️", callback_data="next"))
+        return self.text, markup
+
+
+def calls(mock: MockBotAPI, method: str):
+    return [params for _, called, params in mock.calls if called == method]
+
+
+def test_edits_of_one_message_are_coalesced():
+    async def scenario():
+        async with bot_api() as (mock, bot):
+            outbound = OutboundQueue(bot, chat_interval=0.05)
+            page = Page()
+
+            for _ in range(10):
+                outbound.edit("@LMNFT", 7, page)
+            await asyncio.wait_for(outbound.join(), 5)
+
+            edits = calls(mock, "editMessageText")
+            assert page.renders == 1
+            assert len(edits) == 1
+            # one request carries both the text and the keyboard
+            assert edits[0]["text"] == "page 1" and "reply_markup" in edits[0]
+
+    asyncio.run(scenario())
+
+
+def test_unchanged_content_is_not_sent_again():
+    async def scenario():
+        async with bot_api() as (mock, bot):
+            outbound = OutboundQueue(bot, chat_interval=0.05)
+            page = Page()
+
+            outbound.edit("@LMNFT", 7, page)
+            await asyncio.wait_for(outbound.join(), 5)
+            outbound.edit("@LMNFT", 7, page)
+            await asyncio.wait_for(outbound.join(), 5)
+
+            page.text = "page 2"
+            outbound.edit("@LMNFT", 7, page)
+            await asyncio.wait_for(outbound.join(), 5)
+
+            assert page.renders == 3
+            assert [edit["text"] for edit in calls(mock, "editMessageText")] == ["page 1", "page 2"]
+
+    asyncio.run(scenario())
+
+
+def test_requests_to_one_chat_are_paced():
+    async def scenario():
+        async with bot_api() as (mock, bot):
+            outbound = OutboundQueue(bot, chat_interval=0.2)
+
+            for i in range(3):
+                outbound.send("@LMNFT", f"alert {i}")
+            await asyncio.wait_for(outbound.join(), 5)
+
+            times = [called_at for called_at, _, _ in mock.calls]
+            assert [send["text"] for send in calls(mock, "sendMessage")] == ["alert 0", "alert 1", "alert 2"]
+            assert all(later - earlier >= 0.19 for earlier, later in zip(times, times[1:]))
+
+    asyncio.run(scenario())
+
+
+def test_flood_wait_is_honoured():
+    async def scenario():
+        # every second call is answered with 429 retry_after=1
+        async with bot_api(flood_every=2, retry_after=1) as (mock, bot):
+            outbound = OutboundQueue(bot, chat_interval=0.01)
+
+            outbound.send("@LMNFT", "alert 0")
+            outbound.send("@LMNFT", "alert 1")
+            outbound.edit("@LMNFT", 7, Page())
+            await asyncio.wait_for(outbound.join(), 10)
+
+            assert [(method, params.get("text")) for _, method, params in mock.calls] == [
+                ("sendMessage", "alert 0"),
+                ("sendMessage", "alert 1"),
+                ("sendMessage", "alert 1"),
+                ("editMessageText", "page 1"),
+                ("editMessageText", "page 1"),
+            ]
+            flooded, retried = mock.calls[1][0], mock.calls[2][0]
+            assert retried - flooded >= 0.95
+
+    asyncio.run(scenario())
+
+
+def test_retries_are_limited():
+    async def scenario():
+        async with bot_api(flood_every=1, retry_after=0) as (mock, bot):
+            outbound = OutboundQueue(bot, chat_interval=0.01, max_retries=2)
+
+            outbound.edit("@LMNFT", 7, Page())
+            outbound.send("@LMNFT", "alert")
+            # an edit used to be retried forever
+            await asyncio.wait_for(outbound.join(), 5)
+
+            assert len(calls(mock, "sendMessage")) == 3
+            assert len(calls(mock, "editMessageText")) == 3
+
+    asyncio.run(scenario())
+
+
+def test_callback_edits_share_the_channel_queue(monkeypatch):
+    import bot as bot_module
+    from services.settings import settings
+
+    edits = []
+    monkeypatch.setattr(bot_module, "outbound", SimpleNamespace(edit=lambda chat_id, message_id, render: edits.append((chat_id, message_id))))
+
+    async def answer_callback_query(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(bot_module.bot, "answer_callback_query", answer_callback_query)
+    settings.update(message_to_edit=7, total_pages=3, user_state=1)
+
+    # the callback query comes with the channel's numeric id
+    call = SimpleNamespace(id="1", data="next", message=SimpleNamespace(chat=SimpleNamespace(id=-1001234567890)))
+    asyncio.run(bot_module.HandlerInlineMiddleware(call))
+    bot_module.publish()
+
+    assert edits == [("@LMNFT", 7), ("@LMNFT", 7)]
+
+
+def test_server_errors_are_retried():
+    async def scenario():
+        errors = {1: (502, "Bad Gateway"), 2: (500, "Internal Server Error"), 4: (503, "Service Unavailable")}
+
+        async with bot_api(errors=errors) as (mock, bot):
+            outbound = OutboundQueue(bot, chat_interval=0.01)
+            page = Page()
+
+            outbound.edit("@LMNFT", 7, page)
+            outbound.send("@LMNFT", "alert")
+            await asyncio.wait_for(outbound.join(), 5)
+
+            # the send goes first, then the edit, each until it gets through
+            assert [method for _, method, _ in mock.calls] == ["sendMessage"] * 3 + ["editMessageText"] * 2
+            assert page.renders == 2
+
+    asyncio.run(scenario())
+
+
+def test_errors_retrying_cannot_fix_drop_the_request():
+    async def scenario():
+        errors = {
+            1: (400, "Bad Request: message to edit not found"),
+            2: (400, "Bad Request: message is not modified"),
+        }
+
+        async with bot_api(errors=errors) as (mock, bot):
+            outbound = OutboundQueue(bot, chat_interval=0.01)
+
+            outbound.edit("@LMNFT", 7, Page())
+            await asyncio.wait_for(outbound.join(), 5)
+            outbound.edit("@LMNFT", 8, Page())
+            await asyncio.wait_for(outbound.join(), 5)
+            outbound.send("@LMNFT", "alert")
+            await asyncio.wait_for(outbound.join(), 5)
+
+            assert [(method, params.get("message_id")) for _, method, params in mock.calls] == [
+                ("editMessageText", "7"), ("editMessageText", "8"), ("sendMessage", None)
+            ]
+
+    asyncio.run(scenario())
+
+
+def test_connection_errors_are_retried_up_to_max_retries():
+    class FlakyBot:
+        def __init__(self, failures: int):
+            self.failures = failures
+            self.sent = []
+
+        async def send_message(self, chat_id, text, **kwargs):
+            self.sent.append(text)
+
+            if len(self.sent) <= self.failures:
+                raise ConnectionResetError("connection reset by peer")
+
+    async def scenario():
+        recovering, down = FlakyBot(failures=2), FlakyBot(failures=10)
+
+        for bot in (recovering, down):
+            outbound = OutboundQueue(bot, chat_interval=0.01, max_retries=3)
+            outbound.send("@LMNFT", "alert")
+            await asyncio.wait_for(outbound.join(), 5)
+
+        assert len(recovering.sent) == 3
+        assert len(down.sent) == 4
+
+    asyncio.run(scenario())
@@ -0,0 +1,120 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, List
+
+from pipeline import CardBatch, Stage, SweepDone
+
+SWEEP_AT = datetime(2024, 3, 10, 12)
+
+
+def test_full_inbox_blocks_the_producer():
+    async def scenario():
+        gate = asyncio.Event()
+        handled: List[List[Any]] = []
+
+        async def slow(messages: List[Any]) -> None:
+            await gate.wait()
+            handled.append(messages)
+
+        stage = Stage("slow", slow, maxsize=2, max_batch=1)
+        stage.start()
+
+        # the first message is taken into the handler, two more fill the inbox
+        for message in range(3):
+            await stage.put(message)
+        await asyncio.sleep(0)
+
+        blocked = asyncio.create_task(stage.put(3))
+        await asyncio.sleep(0.05)
+        assert not blocked.done()
+        assert stage.inbox.full()
+
+        gate.set()
+        await asyncio.wait_for(blocked, 1)
+        await stage.inbox.join()
+        stage.task.cancel()
+
+        assert [message for messages in handled for message in messages] == [0, 1, 2, 3]
+
+    asyncio.run(scenario())
+
+
+def test_waiting_messages_are_handled_in_batches_of_max_batch():
+    async def scenario():
+        handled: List[List[int]] = []
+
+        async def handler(messages: List[int]) -> None:
+            handled.append(messages)
+
+        stage = Stage("batches", handler, maxsize=16, max_batch=3)
+
+        for message in range(7):
+            await stage.put(message)
+
+        stage.start()
+        await stage.inbox.join()
+        stage.task.cancel()
+
+        assert handled == [[0, 1, 2], [3, 4, 5], [6]]
+
+    asyncio.run(scenario())
+
+
+def test_sweep_done_follows_the_batches_of_its_sweep():
+    async def scenario():
+        handled: List[Any] = []
+
+        async def slow(messages: List[Any]) -> None:
+            await asyncio.sleep(0.01)
+            handled.extend(messages)
+
+        stage = Stage("ingest", slow, maxsize=2, max_batch=3)
+        stage.start()
+
+        # as parse_all_collections: the pages of a sweep, then its end, sweep after sweep
+        for sweep in range(3):
+            sweep_at = SWEEP_AT + timedelta(seconds=15 * sweep)
+
+            for page in range(4):
+                await stage.put(CardBatch(sweep_at, [{"href": f"/c/{page}"}]))
+            await stage.put(SweepDone(sweep_at))
+
+        await stage.inbox.join()
+        stage.task.cancel()
+
+        kinds = [(type(message).__name__, message.sweep_at) for message in handled]
+        expected = [
+            (kind, SWEEP_AT + timedelta(seconds=15 * sweep))
+            for sweep in range(3)
+            for kind in ["CardBatch"] * 4 + ["SweepDone"]
+        ]
+        assert kinds == expected
+
+    asyncio.run(scenario())
+
+
+def test_stage_counts_messages_batches_and_busy_time():
+    async def scenario():
+        async def handler(messages: List[int]) -> None:
+            await asyncio.sleep(0.01)
+
+            if 4 in messages:
+                raise ValueError("bad batch")
+
+        stage = Stage("counted", handler, maxsize=16, max_batch=2)
+
+        for message in range(5):
+            await stage.put(message)
+
+        stage.start()
+        await stage.inbox.join()
+
+        # the failed batch is counted too and the stage keeps running
+        assert not stage.task.done()
+        stage.task.cancel()
+
+        report = stage.report()
+        assert (report["stage"], report["messages"], report["batches"], report["queue"]) == ("counted", 5, 3, 0)
+        assert report["busy"] >= 0.03
+
+    asyncio.run(scenario())
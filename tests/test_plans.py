@@ -0,0 +1,64 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from database.dal import TrackingDAL
+from database.models import Collections, Sweep, Tracking
+from database.plans import explain, has_seq_scan, uses_index
+
+INDEX = "ix_tracking_collection_href_time"
+
+
+async def seed(session, collections: int = 50, samples: int = 20) -> datetime:
+    now = datetime(2024, 3, 1, 12)
+
+    for c in range(collections):
+        href = f"https://lmnft.test/{c}"
+        session.add(Collections(href=href, title=str(c), sold_percentage=0, total_stock=100, sold_stock=samples))
+        session.add_all(
+            Tracking(collection_href=href, time=now - timedelta(minutes=s), sold_to_time=samples - s)
+            for s in range(samples)
+        )
+
+    session.add_all(Sweep(time=now - timedelta(minutes=s)) for s in range(samples))
+    await session.commit()
+
+    return now
+
+
+def plans(database, *queries):
+    async def scenario():
+        async with database() as sessions:
+            async with sessions() as session:
+                now = await seed(session)
+                return [await explain(session, query(now)) for query in queries]
+
+    return asyncio.run(scenario())
+
+
+def test_latest_query_uses_href_time_index(database):
+    hrefs = [f"https://lmnft.test/{c}" for c in range(10)]
+    [plan] = plans(database, lambda now: TrackingDAL.latest_query(hrefs, now))
+
+    assert uses_index(plan, INDEX), plan
+    assert not has_seq_scan(plan, "tracking"), plan
+
+
+def test_window_start_query_uses_href_time_index(database):
+    hrefs = [f"https://lmnft.test/{c}" for c in range(10)]
+    [plan] = plans(database, lambda now: TrackingDAL.window_start_query(hrefs, [2, 5, 15], now))
+
+    assert uses_index(plan, INDEX), plan
+    assert not has_seq_scan(plan, "tracking"), plan
+
+
+def test_plan_helpers():
+    sqlite_plan = ["CO-ROUTINE anon_1", "SCAN tracking", "SEARCH sweep USING COVERING INDEX ix_sweep_time (time>?)"]
+    postgres_plan = [
+        "Subquery Scan on anon_1  (cost=0.29..8.31 rows=1 width=36)",
+        "  ->  Index Only Scan using ix_tracking_collection_href_time on tracking_p20240301 tracking",
+        "  ->  Seq Scan on sweep  (cost=0.00..1.01 rows=1 width=8)",
+    ]
+
+    assert has_seq_scan(sqlite_plan, "tracking") and not uses_index(sqlite_plan, INDEX)
+    assert uses_index(postgres_plan, INDEX)
+    assert has_seq_scan(postgres_plan, "sweep") and not has_seq_scan(postgres_plan, "tracking")
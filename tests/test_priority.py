@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+from scraper import priority
+from scraper.priority import CollectionPriority
+
+
+def test_pinned_come_first_and_stay_without_a_score():
+    collection_priority = CollectionPriority(max_hot=5, min_velocity=1.0)
+
+    hot = collection_priority.hot({"fast": 4.0, "pinned": 0.0}, pinned=["pinned", "cold", "pinned"])
+
+    assert hot == ["pinned", "cold", "fast"]
+
+
+def test_collections_are_scored_by_velocity():
+    collection_priority = CollectionPriority(max_hot=5, min_velocity=2.0)
+
+    hot = collection_priority.hot({"a": 2.0, "b": 6.0, "c": 1.9, "d": 0.0})
+
+    # below min_velocity a collection is not hot
+    assert hot == ["b", "a"]
+
+
+def test_near_threshold_collections_are_hot_until_the_proximity_expires(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(priority, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    collection_priority = CollectionPriority(max_hot=5, min_velocity=1.0, min_proximity=0.5, proximity_ttl=300)
+
+    # growth over the alert interval of 1.5% and 0.5% against an alert at 2%
+    collection_priority.note_growth({"near": (3, 1.5), "far": (1, 0.5), "gone": None}, alert_percent=2)
+
+    assert collection_priority.hot({"slow": 1.2}) == ["near", "slow"]
+
+    clock.now += 301
+    assert collection_priority.hot({"slow": 1.2}) == ["slow"]
+    assert collection_priority.proximity == {}
+
+
+def test_no_growth_drops_the_proximity():
+    collection_priority = CollectionPriority(min_proximity=0.5)
+    collection_priority.note_growth({"a": (3, 1.5)}, alert_percent=2)
+    collection_priority.note_growth({"a": None}, alert_percent=2)
+
+    assert collection_priority.hot({}) == []
+
+
+def test_hot_set_is_capped_after_the_pinned():
+    collection_priority = CollectionPriority(max_hot=3, min_velocity=1.0)
+    velocities = {f"v{i}": float(i) for i in range(1, 10)}
+
+    assert collection_priority.hot(velocities) == ["v9", "v8", "v7"]
+    assert collection_priority.hot(velocities, pinned=["p"]) == ["p", "v9", "v8"]
+    # pinned are never cut, the scored ones make room for them
+    assert collection_priority.hot(velocities, pinned=["p1", "p2", "p3", "p4"]) == ["p1", "p2", "p3", "p4"]
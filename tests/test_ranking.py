@@ -0,0 +1,68 @@
+import asyncio
+
+from analytics.ranking import ensure_ranking, settings_key
+from database.dal import RankingDAL
+from database.models import Collections
+from database.session import DBTransactionStatus
+from services.settings import Settings
+
+
+def test_empty_ranking_is_materialized(database):
+    async def scenario():
+        async with database() as sessions:
+            async with sessions() as session:
+                session.add(Collections(href="https://a", title="A", sold_percentage=10, total_stock=100, sold_stock=10))
+                await session.commit()
+
+                ranking_dal = RankingDAL(session)
+                assert await ranking_dal.get_page("by_stock:500", 0, 10) == ([], None)
+
+                # nothing has more than 500 in stock: materialized, but empty
+                data = Settings(sort_type="by_stock", min_stock=500)
+                await ensure_ranking(session, data)
+                assert await ranking_dal.get_page(settings_key(data), 0, 10) == ([], 0)
+
+                data = Settings(sort_type="by_stock", min_stock=50)
+                await ensure_ranking(session, data)
+                page, total = await ranking_dal.get_page(settings_key(data), 0, 10)
+                assert [collection.href for collection in page] == ["https://a"] and total == 1
+
+                # a full refresh drops the other keys
+                await ranking_dal.replace({"by_stock:5": []}, drop_others=True)
+                assert await ranking_dal.get_page("by_stock:50", 0, 10) == ([], None)
+                assert await ranking_dal.get_page("by_stock:5", 0, 10) == ([], 0)
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_replaces_of_one_key_all_succeed(postgres):
+    hrefs = [f"https://lmnft.test/{i}" for i in range(50)]
+
+    async def scenario():
+        async with postgres() as sessions:
+            async with sessions() as session:
+                session.add_all(
+                    Collections(href=href, title=str(i), sold_percentage=i, total_stock=1000, sold_stock=i)
+                    for i, href in enumerate(hrefs)
+                )
+                await session.commit()
+
+            async def replace(i: int) -> DBTransactionStatus:
+                async with sessions() as session:
+                    if i % 4 == 0:
+                        # the scraper's refresh after a sweep
+                        return await RankingDAL(session).replace(
+                            {"by_stock:500": hrefs, "by_velocity:500": hrefs[::-1]}, drop_others=True
+                        )
+                    # the bot materializing the page it is asked for
+                    return await RankingDAL(session).replace({"by_stock:500": hrefs[i:] + hrefs[:i]})
+
+            for _ in range(5):
+                statuses = await asyncio.gather(*[replace(i) for i in range(12)])
+                assert statuses == [DBTransactionStatus.SUCCESS] * 12
+
+            async with sessions() as session:
+                page, total = await RankingDAL(session).get_page("by_stock:500", 0, 100)
+                assert total == len(page) == len(hrefs)
+
+    asyncio.run(scenario())
@@ -0,0 +1,149 @@
+import asyncio
+from datetime import datetime
+
+from database import Base
+from database.dal import RankingDAL
+from database.models import Collections, Sweep
+from database.session import DBTransactionStatus, async_session, engine
+from services.render_cache import data_version, render_cache
+from services.settings import settings
+
+
+async def seed(collections: int) -> None:
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+
+    hrefs = [f"https://lmnft.test/{i}" for i in range(collections)]
+
+    async with async_session() as session:
+        session.add_all(
+            Collections(href=href, title=str(i), sold_percentage=i, total_stock=1000, sold_stock=i * 10)
+            for i, href in enumerate(hrefs)
+        )
+        await session.commit()
+        await RankingDAL(session).replace({"by_stock:500": hrefs, "by_stock:5000": hrefs[:3]}, drop_others=True)
+
+
+def page_button(markup) -> str:
+    return markup.keyboard[-1][0].text
+
+
+def test_cached_pages_keep_the_page_count():
+    from bot import render_message
+
+    async def show(**changes):
+        settings.update(**changes)
+        text, markup = await render_message()
+        return page_button(markup)
+
+    async def scenario():
+        await seed(25)
+        render_cache.clear()
+        settings.update(sort_type="by_stock", min_stock=500, total_pages=1, user_state=1)
+
+        try:
+            assert await show() == "📄 Page: 1 / 3"
+            assert await show(user_state=3) == "📄 Page: 3 / 3"
+            assert await show(user_state=2) == "📄 Page: 2 / 3"
+            # served from the cache
+            assert await show(user_state=3) == "📄 Page: 3 / 3"
+
+            assert await show(min_stock=5000, user_state=1) == "📄 Page: 1 / 1"
+            hits = render_cache.hits
+            assert await show(min_stock=500) == "📄 Page: 1 / 3"
+            assert render_cache.hits == hits + 1
+        finally:
+            await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_last_page_stays_reachable(monkeypatch):
+    import bot as bot_module
+
+    async def answer_callback_query(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(bot_module.bot, "answer_callback_query", answer_callback_query)
+    monkeypatch.setattr(bot_module, "publish", lambda *args, **kwargs: None)
+
+    class Call:
+        id = "1"
+        message = None
+
+        def __init__(self, data: str):
+            self.data = data
+
+    async def press(data: str) -> str:
+        await bot_module.HandlerInlineMiddleware(Call(data))
+        text, markup = await bot_module.render_message()
+        return page_button(markup)
+
+    async def scenario():
+        await seed(25)
+        render_cache.clear()
+        settings.update(sort_type="by_stock", min_stock=500, total_pages=1, user_state=1)
+
+        try:
+            await bot_module.render_message()
+            assert [await press(data) for data in ("next", "next", "back", "next")] == [
+                "📄 Page: 2 / 3", "📄 Page: 3 / 3", "📄 Page: 2 / 3", "📄 Page: 3 / 3"
+            ]
+        finally:
+            await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_committed_sweep_drops_cached_pages():
+    from bot import gen_message
+
+    async def scenario():
+        await seed(25)
+        render_cache.clear()
+        settings.update(sort_type="by_stock", min_stock=500, total_pages=1, user_state=1)
+
+        try:
+            first = await gen_message()
+            assert await gen_message() == first
+            hits = render_cache.hits
+
+            async with async_session() as session:
+                session.add(Sweep(time=datetime(2024, 3, 10, 12)))
+                await session.commit()
+
+            # without sweep events the version follows the last sweep in the database
+            assert await gen_message() != first
+            assert render_cache.hits == hits
+            assert render_cache.version == data_version(datetime(2024, 3, 10, 12))
+        finally:
+            await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_page_materialized_by_another_process_is_shown(monkeypatch):
+    import bot as bot_module
+    from analytics.ranking import ensure_ranking
+
+    async def losing_ensure_ranking(session, data):
+        # the scraper's refresh got the key in first, this replace rolled back
+        await ensure_ranking(session, data)
+        return DBTransactionStatus.ROLLBACK
+
+    monkeypatch.setattr(bot_module, "ensure_ranking", losing_ensure_ranking)
+
+    async def scenario():
+        await seed(25)
+        render_cache.clear()
+        settings.update(sort_type="by_stock", min_stock=50, total_pages=1, user_state=1)
+
+        try:
+            text, markup = await bot_module.render_message()
+            assert text != "Error retrieving collections."
+            assert page_button(markup) == "📄 Page: 1 / 3"
+        finally:
+            await engine.dispose()
+
+    asyncio.run(scenario())
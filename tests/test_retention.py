@@ -0,0 +1,132 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, text
+
+from database.dal import TrackingDAL
+from database.models import Collections, Sweep, Tracking, TrackingHour, TrackingMinute
+from database.retention import DEFAULT_PARTITION, RAW_RETENTION, RetentionDAL, partition_name
+from database.session import DBTransactionStatus
+
+HREF = "https://lmnft.test/a"
+
+
+async def seed(session, times, sold_from: int = 0) -> None:
+    if await session.get(Collections, 1) is None:
+        session.add(Collections(id=1, href=HREF, title="A", sold_percentage=0, total_stock=1000, sold_stock=0))
+        await session.flush()
+
+    session.add_all(
+        Tracking(collection_href=HREF, time=time, sold_to_time=sold_from + i)
+        for i, time in enumerate(times)
+    )
+    session.add_all(Sweep(time=time) for time in times)
+    await session.commit()
+
+
+async def count(session, model, *where) -> int:
+    return (await session.execute(select(func.count()).select_from(model).where(*where))).scalar()
+
+
+def test_rollup_and_expiry_on_sqlite(database):
+    now = datetime(2024, 3, 10, 12)
+    old = [now - RAW_RETENTION - timedelta(hours=1, seconds=15 * i) for i in range(8)]
+    recent = [now - timedelta(minutes=5, seconds=15 * i) for i in range(4)]
+
+    async def scenario():
+        async with database() as sessions:
+            async with sessions() as session:
+                await seed(session, sorted(old + recent))
+
+                assert await RetentionDAL(session).run(now) is DBTransactionStatus.SUCCESS
+
+                # raw rows and sweeps past the raw retention are gone, their minutes and hours stay
+                assert await count(session, Tracking) == len(recent)
+                assert await count(session, Sweep) == len(recent)
+                assert await count(session, TrackingMinute) >= 2
+                assert await count(session, TrackingHour) >= 1
+
+                first = (await session.execute(select(func.min(TrackingMinute.sold_first)))).scalar()
+                assert first == 0
+
+    asyncio.run(scenario())
+
+
+def test_short_windows_keep_the_sweep_start_next_to_long_ones(database):
+    now = datetime(2024, 3, 10, 12)
+    sweeps = [now - timedelta(seconds=5 + 15 * i) for i in range(40)]
+
+    async def scenario():
+        async with database() as sessions:
+            async with sessions() as session:
+                session.add(Collections(id=1, href=HREF, title="A", sold_percentage=0, total_stock=1000, sold_stock=0))
+                await session.flush()
+                # dormant since before the 5 minute window, minted within it
+                session.add_all([
+                    Tracking(collection_href=HREF, time=now - timedelta(minutes=8), sold_to_time=100),
+                    Tracking(collection_href=HREF, time=now - timedelta(minutes=3), sold_to_time=110),
+                ])
+                session.add_all(Sweep(time=time) for time in sweeps)
+                await session.commit()
+
+                short = await TrackingDAL(session).calculate_sales_changes([HREF], [5], now=now)
+                mixed = await TrackingDAL(session).calculate_sales_changes([HREF], [5, 7 * 24 * 60], now=now)
+
+        assert short[HREF][5] == mixed[HREF][5] == (10, 10.0)
+        assert mixed[HREF][7 * 24 * 60] == (10, 10.0)
+
+    asyncio.run(scenario())
+
+
+def test_rows_in_default_partition_get_a_partition(postgres):
+    # the scraper was down past the partitions created ahead: its first sweep lands in the default partition
+    # half a minute in, so the samples reach into a minute that is complete and rolled up
+    now = datetime.now().replace(second=30, microsecond=0) + timedelta(days=10)
+    times = [now - timedelta(seconds=15 * i) for i in range(4)]
+
+    async def scenario():
+        async with postgres() as sessions:
+            async with sessions() as session:
+                await seed(session, times)
+                assert await count(session, text(DEFAULT_PARTITION)) == len(times)
+
+                assert await RetentionDAL(session).run(now) is DBTransactionStatus.SUCCESS
+                assert await RetentionDAL(session).run(now) is DBTransactionStatus.SUCCESS
+
+                partitions = await RetentionDAL(session).get_partitions()
+                assert partition_name(now.date()) in partitions
+                assert partition_name(now.date() + timedelta(days=2)) in partitions
+                assert await count(session, text(DEFAULT_PARTITION)) == 0
+                assert await count(session, text(partition_name(now.date()))) == len(times)
+                assert await count(session, Tracking) == len(times)
+
+                # the moved rows are still found through the (href, time) index and rolled up
+                assert await count(session, TrackingMinute) >= 1
+
+    asyncio.run(scenario())
+
+
+def test_expired_partitions_are_dropped_not_deleted_from(postgres):
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    now = today + RAW_RETENTION + timedelta(hours=12)
+    horizon = now - RAW_RETENTION
+    # one day wholly before the horizon, one straddling it
+    expired = [today - timedelta(hours=2)]
+    straddling = [horizon - timedelta(hours=1), horizon + timedelta(hours=1)]
+
+    async def scenario():
+        async with postgres() as sessions:
+            async with sessions() as session:
+                await RetentionDAL(session).ensure_partitions(today - timedelta(days=1))
+                await seed(session, sorted(expired + straddling))
+
+                assert await RetentionDAL(session).run(now) is DBTransactionStatus.SUCCESS
+
+                partitions = await RetentionDAL(session).get_partitions()
+                assert partition_name(expired[0].date()) not in partitions
+                assert partition_name(horizon.date()) in partitions
+                # rows of a partially expired day stay until the whole day is dropped
+                assert await count(session, Tracking) == len(straddling)
+                assert await count(session, Sweep) == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,225 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Dict, List
+
+from sqlalchemy import func, select
+
+from database import Base
+from database.models import Sweep, Tracking
+from database.session import async_session, engine
+from pipeline import CardBatch, HotBatch, SweepDone
+from scraper.fetchers import Fetcher
+from scraper.scheduler import CrawlPlanner, SweepScheduler
+
+LISTING = "http://lmnft.test/explore?sortBy=collections"
+
+
+def cards(page: int, count: int = 2, sold: int = 1) -> List[dict]:
+    return [
+        {"href": f"/c/{page}-{i}", "title": f"T{page}{i}", "sold_percentage": 1.0, "total_stock": 100, "sold_stock": sold}
+        for i in range(count)
+    ]
+
+
+class ScriptedFetcher(Fetcher):
+    """Serves `pages` of LISTING; `failures` maps a page to how many of its fetches fail first."""
+
+    def __init__(self, pages: Dict[int, List[dict]], failures: Dict[int, int] = None):
+        self.pages = pages
+        self.failures = dict(failures or {})
+        self.calls: List[int] = []
+
+    async def fetch_page(self, url: str) -> List[dict]:
+        page = int(url.rsplit("&page=", 1)[1])
+        self.calls.append(page)
+
+        if self.failures.get(page, 0) > 0:
+            self.failures[page] -= 1
+            raise ConnectionError("connection reset")
+
+        return self.pages.get(page, [])
+
+
+def sweep(scheduler: SweepScheduler) -> List[dict]:
+    return asyncio.run(scheduler.sweep([LISTING]))
+
+
+def test_sweep_paginates_to_first_empty_page():
+    fetcher = ScriptedFetcher({1: cards(1), 2: cards(2), 3: cards(3)})
+    scheduler = SweepScheduler([fetcher, fetcher])
+
+    rows = sweep(scheduler)
+
+    assert [row["href"] for row in rows] == ["/c/1-0", "/c/1-1", "/c/2-0", "/c/2-1", "/c/3-0", "/c/3-1"]
+    assert not scheduler.partial
+
+
+def test_transient_failure_is_retried():
+    fetcher = ScriptedFetcher({1: cards(1), 2: cards(2), 3: cards(3)}, failures={2: 2})
+    scheduler = SweepScheduler([fetcher], retries=2, retry_delay=0)
+
+    rows = sweep(scheduler)
+
+    assert len(rows) == 6
+    assert fetcher.calls.count(2) == 3
+    assert not scheduler.partial
+
+
+def test_persistent_failure_makes_the_sweep_partial():
+    fetcher = ScriptedFetcher({1: cards(1), 2: cards(2), 3: cards(3)}, failures={2: 10})
+    planner = CrawlPlanner(full_interval=3600)
+    scheduler = SweepScheduler([fetcher], planner=planner, retries=1, retry_delay=0)
+
+    rows = sweep(scheduler)
+
+    assert [row["href"] for row in rows] == ["/c/1-0", "/c/1-1"]
+    assert scheduler.partial
+    assert scheduler.failed == [(LISTING, 2)]
+    # the full sweep didn't get through, the next one is full again
+    assert planner.begin()
+
+
+def test_failure_past_the_end_of_the_listing_is_ignored():
+    fetcher = ScriptedFetcher({1: cards(1)}, failures={3: 10})
+    scheduler = SweepScheduler([fetcher, fetcher, fetcher], retries=0, retry_delay=0)
+
+    rows = sweep(scheduler)
+
+    assert len(rows) == 2
+    assert not scheduler.partial
+
+
+def test_adaptive_sweep_stops_at_first_unchanged_page():
+    pages = {1: cards(1), 2: cards(2), 3: cards(3)}
+    fetcher = ScriptedFetcher(pages)
+    planner = CrawlPlanner(full_interval=3600)
+    scheduler = SweepScheduler([fetcher], planner=planner)
+    sweep(scheduler)
+
+    pages[1] = cards(1, sold=2)
+    fetcher.calls = []
+    handed_on = []
+
+    async def on_page(page_cards: List[dict]) -> None:
+        handed_on.append(page_cards)
+
+    asyncio.run(scheduler.sweep([LISTING], on_page=on_page))
+
+    # page 1 changed and is handed on, page 2 didn't: the listing stops there
+    assert fetcher.calls == [1, 2]
+    assert handed_on == [pages[1]]
+
+
+def test_refresh_fetches_the_last_page_of_every_hot_collection_once():
+    pages = {1: cards(1), 2: cards(2), 3: cards(3)}
+    fetcher = ScriptedFetcher(pages)
+    scheduler = SweepScheduler([fetcher, fetcher], planner=CrawlPlanner(full_interval=3600))
+    sweep(scheduler)
+
+    pages[2] = cards(2, sold=5)
+    fetcher.calls = []
+    handed_on = []
+
+    async def on_page(page_cards: List[dict]) -> None:
+        handed_on.append(page_cards)
+
+    # never seen in a sweep: nothing to re-fetch for it
+    hot = ["/c/3-1", "/c/2-0", "/c/2-1", "/c/9-9"]
+    assert asyncio.run(scheduler.refresh(hot, on_page=on_page)) == 2
+
+    assert sorted(fetcher.calls) == [2, 3]
+    # only the hot cards of those pages are handed on
+    assert sorted(card["href"] for page_cards in handed_on for card in page_cards) == ["/c/2-0", "/c/2-1", "/c/3-1"]
+    assert [card["sold_stock"] for page_cards in handed_on for card in page_cards if card["href"] == "/c/2-0"] == [5]
+    # card states stay as the sweep left them, the next sweep still sees page 2 changed
+    assert scheduler.planner.cards["/c/2-0"][0] == 1
+
+
+def test_refresh_without_a_planner_fetches_nothing():
+    fetcher = ScriptedFetcher({1: cards(1)})
+    scheduler = SweepScheduler([fetcher])
+    sweep(scheduler)
+    fetcher.calls = []
+
+    async def on_page(page_cards: List[dict]) -> None:
+        raise AssertionError("nothing is handed on")
+
+    assert asyncio.run(scheduler.refresh(["/c/1-0"], on_page=on_page)) == 0
+    assert fetcher.calls == []
+
+
+def test_hot_batch_is_ingested_without_a_sweep(monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "create_fetchers", lambda: [ScriptedFetcher({})])
+    parser = app.Parser()
+    recorded = []
+    ingest = app.IngestDAL.ingest
+
+    async def spy(self, rows, time=None, record_sweep=True):
+        recorded.append(record_sweep)
+        return await ingest(self, rows, time=time, record_sweep=record_sweep)
+
+    monkeypatch.setattr(app.IngestDAL, "ingest", spy)
+    fetched_at = datetime(2024, 3, 10, 12)
+
+    async def scenario():
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.drop_all)
+            await connection.run_sync(Base.metadata.create_all)
+
+        try:
+            await parser.ingest([HotBatch(fetched_at, cards(1))])
+
+            async with async_session() as session:
+                tracked = (await session.execute(select(func.count()).select_from(Tracking).where(Tracking.time == fetched_at))).scalar()
+                sweeps = (await session.execute(select(func.count()).select_from(Sweep))).scalar()
+        finally:
+            await engine.dispose()
+
+        assert recorded == [False]
+        assert (tracked, sweeps) == (2, 0)
+        # hot cards don't take a card of the sweep
+        assert parser.seen == set()
+
+    asyncio.run(scenario())
+
+
+def test_completed_sweep_is_recorded_even_without_ingested_cards(monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "create_fetchers", lambda: [ScriptedFetcher({})])
+    monkeypatch.setattr(app, "outbound", SimpleNamespace(send=lambda **kwargs: None))
+    parser = app.Parser()
+    sweep_at = datetime.now().replace(microsecond=0)
+    unchanged, partial, lost = (sweep_at + timedelta(seconds=15 * i) for i in range(1, 4))
+
+    async def sweep_times() -> List[datetime]:
+        async with async_session() as session:
+            return (await session.execute(select(Sweep.time).order_by(Sweep.time))).scalars().all()
+
+    async def scenario():
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.drop_all)
+            await connection.run_sync(Base.metadata.create_all)
+
+        try:
+            await parser.ingest([CardBatch(sweep_at, cards(1)), SweepDone(sweep_at)])
+            # an adaptive sweep that found every page unchanged hands no cards on
+            await parser.ingest([SweepDone(unchanged)])
+            await parser.ingest([CardBatch(partial, cards(1, sold=2)), SweepDone(partial, complete=False)])
+
+            async def rolled_back(self, rows, time=None, record_sweep=True):
+                return set(), app.DBTransactionStatus.ROLLBACK
+
+            monkeypatch.setattr(app.IngestDAL, "ingest", rolled_back)
+            await parser.ingest([CardBatch(lost, cards(1, sold=3)), SweepDone(lost)])
+
+            return await sweep_times()
+        finally:
+            await engine.dispose()
+
+    # neither a partial sweep nor one whose cards were not committed is a window start
+    assert asyncio.run(scenario()) == [sweep_at, unchanged]
+    assert parser.last_sweep_at == lost
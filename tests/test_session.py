@@ -0,0 +1,92 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from sqlalchemy import text
+
+from database import Base
+from database.session import TimedQueuePool, create_engine, engine, unit_of_work
+from pipeline import CardBatch, SweepDone
+from services.metrics import POOL_CHECKOUTS, POOL_CONNECTS, POOL_WAIT_SECONDS
+from tests.test_scheduler import ScriptedFetcher, cards
+
+
+def test_pool_counts_checkouts_and_waits(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "1")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "0")
+    pooled = create_engine(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}")
+    assert isinstance(pooled.sync_engine.pool, TimedQueuePool)
+
+    checkouts, connects = POOL_CHECKOUTS.value(), POOL_CONNECTS.value()
+    waits, waited = POOL_WAIT_SECONDS.count(), POOL_WAIT_SECONDS.sum()
+
+    async def scenario():
+        try:
+            for _ in range(3):
+                async with pooled.connect() as connection:
+                    await connection.execute(text("SELECT 1"))
+
+            # the only connection is held: the next checkout waits for it
+            async def hold(connection) -> None:
+                await asyncio.sleep(0.2)
+                await connection.close()
+
+            held = await pooled.connect()
+            await held.execute(text("SELECT 1"))
+            release = asyncio.create_task(hold(held))
+
+            async with pooled.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+            await release
+        finally:
+            await pooled.dispose()
+
+    asyncio.run(scenario())
+
+    assert POOL_CHECKOUTS.value() - checkouts == 5
+    # one connection, reused by every checkout
+    assert POOL_CONNECTS.value() - connects == 1
+    assert POOL_WAIT_SECONDS.count() - waits == 5
+    assert POOL_WAIT_SECONDS.sum() - waited >= 0.15
+
+
+def test_stages_release_their_session_before_feeding_the_next(monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "create_fetchers", lambda: [ScriptedFetcher({})])
+    parser = app.Parser()
+    open_sessions = []
+    fed = []
+
+    @asynccontextmanager
+    async def tracked_unit_of_work():
+        async with unit_of_work() as session:
+            open_sessions.append(session)
+            try:
+                yield session
+            finally:
+                open_sessions.remove(session)
+
+    async def put(message) -> None:
+        fed.append((type(message).__name__, len(open_sessions), engine.sync_engine.pool.checkedout()))
+
+    monkeypatch.setattr(app, "unit_of_work", tracked_unit_of_work)
+    monkeypatch.setattr(parser.analytics_stage, "put", put)
+    monkeypatch.setattr(parser.publish_stage, "put", put)
+    sweep_at = datetime.now().replace(microsecond=0)
+
+    async def scenario():
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.drop_all)
+            await connection.run_sync(Base.metadata.create_all)
+
+        try:
+            await parser.ingest([CardBatch(sweep_at, cards(1)), CardBatch(sweep_at, cards(2)), SweepDone(sweep_at)])
+            await parser.analyze([SweepDone(sweep_at)])
+        finally:
+            await engine.dispose()
+
+    asyncio.run(scenario())
+
+    # no session nor connection is held while a downstream stage may block on its full inbox
+    assert fed == [("Committed", 0, 0), ("SweepDone", 0, 0), ("SweepDone", 0, 0)]
@@ -0,0 +1,78 @@
+import asyncio
+import sys
+import threading
+
+import pytest
+
+from services.settings import Settings, SettingsStore
+
+
+def test_update_persists_and_notifies(tmp_path):
+    store = SettingsStore(str(tmp_path / "settings.json"))
+    changes = []
+    store.subscribe(lambda old, new: changes.append((old.min_stock, new.min_stock)))
+
+    store.update(min_stock=1000, pinned=("https://a",))
+    store.update(min_stock=1000)
+
+    assert changes == [(500, 1000)]
+    assert SettingsStore(store.path).get() == Settings(min_stock=1000, pinned=("https://a",))
+
+
+def test_user_state_is_clamped_to_total_pages(tmp_path):
+    store = SettingsStore(str(tmp_path / "settings.json"))
+
+    assert store.update(total_pages=3, user_state=7).user_state == 3
+    assert store.update(user_state=0).user_state == 1
+
+
+def test_subscribers_may_use_the_store(tmp_path):
+    store = SettingsStore(str(tmp_path / "settings.json"))
+    seen = []
+
+    def subscriber(old: Settings, new: Settings) -> None:
+        seen.append(store.get().sort_type)
+        if new.sort_type == "by_growth":
+            store.update(growth_sort_time_interval=15)
+
+    store.subscribe(subscriber)
+
+    # a subscriber calling back into the store used to deadlock on its lock
+    thread = threading.Thread(target=store.update, kwargs={"sort_type": "by_growth"}, daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert seen == ["by_growth", "by_growth"]
+    assert store.get().growth_sort_time_interval == 15
+
+
+def test_changes_of_another_process_are_picked_up_on_get(tmp_path):
+    scraper, bot = SettingsStore(str(tmp_path / "settings.json")), SettingsStore(str(tmp_path / "settings.json"))
+
+    scraper.update(min_stock=42)
+
+    assert bot.get().min_stock == 42
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify")
+def test_watch_pushes_changes_of_another_process(tmp_path):
+    path = str(tmp_path / "settings.json")
+    scraper, bot = SettingsStore(path), SettingsStore(path)
+    versions = []
+    bot.subscribe(lambda old, new: versions.append(new.min_stock))
+
+    async def scenario():
+        # a poll every minute would miss all of it: the changes have to be pushed
+        watcher = asyncio.create_task(bot.watch(interval=60))
+        await asyncio.sleep(0.05)
+
+        for version in (1, 2, 3):
+            scraper.update(min_stock=version)
+            await asyncio.sleep(0.05)
+
+        watcher.cancel()
+
+    asyncio.run(scenario())
+
+    assert versions == [1, 2, 3]
@@ -0,0 +1,136 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+from analytics.timeseries import TimeSeriesStore
+from analytics.vectorized import GrowthMatrix, TrackingWindow, growth_matrix
+from database.dal import TrackingDAL
+from database.models import Collections, Sweep, Tracking
+from database.retention import HEARTBEAT
+
+HREF = "https://lmnft.test/a"
+NOW = datetime(2024, 3, 10, 12)
+INTERVALS = [1, 2, 5, 10, 15]
+
+
+def test_catch_up_picks_up_late_rows_once(database):
+    now = datetime.now().replace(microsecond=0)
+    first, second, third = (now - timedelta(seconds=45 - 15 * i) for i in range(3))
+
+    async def scenario():
+        async with database() as sessions:
+            async with sessions() as session:
+                session.add(Collections(href=HREF, title="A", sold_percentage=1, total_stock=1000, sold_stock=10))
+                session.add_all([Tracking(collection_href=HREF, time=first, sold_to_time=10), Sweep(time=first)])
+                await session.commit()
+
+                store = TimeSeriesStore()
+                await store.catch_up(session)
+
+                session.add_all([Tracking(collection_href=HREF, time=third, sold_to_time=14), Sweep(time=third)])
+                await session.commit()
+                await store.catch_up(session)
+                assert store.loaded_until == third
+
+                # a job of the timed out sweep at `second` is ingested after the next sweep was loaded
+                session.add(Tracking(collection_href=HREF, time=second, sold_to_time=12))
+                await session.commit()
+                await store.catch_up(session)
+
+                series = store.series[HREF]
+                assert list(zip(series.times[series.start:], series.values[series.start:])) == [
+                    (first.timestamp(), 10), (second.timestamp(), 12), (third.timestamp(), 14)
+                ]
+                assert list(store.sweeps) == [first.timestamp(), third.timestamp()]
+
+    asyncio.run(scenario())
+
+
+def simulate_sweeps(collections: int, seed: int):
+    """Tracking rows as the writer stores them (changes plus heartbeats) and the complete sweeps.
+
+    A sweep runs every 15 seconds over the last 40 minutes, every 4th one is full; collections
+    show up mid-way, are only reached by full sweeps, go dormant or leave the listings.
+    """
+    rng = random.Random(seed)
+    times = [NOW - timedelta(seconds=5 + 15 * i) for i in reversed(range(160))]
+    # a sweep that timed out has its rows stored, but no Sweep row
+    sweeps = [time for time in times if rng.random() > 0.2]
+    rows = []
+
+    for i in range(collections):
+        href = f"https://lmnft.test/{i}"
+        arrival = rng.choice([0, 0, rng.randrange(len(times))])
+        leaves = rng.choice([len(times), len(times), rng.randrange(arrival, len(times) + 1)])
+        full_only = rng.random() < 0.3
+        rate = rng.choice([0, 0, 0.05, 0.3, 1])
+        sold = rng.choice([0, 5, 120])
+        last_written = None
+
+        for k in range(arrival, leaves):
+            if full_only and k % 4:
+                continue
+
+            changed = rng.random() < rate
+            sold += changed
+
+            if last_written is None or changed or times[k] - last_written >= HEARTBEAT:
+                rows.append((href, times[k], sold))
+                last_written = times[k]
+
+    return [f"https://lmnft.test/{i}" for i in range(collections)], rows, sweeps
+
+
+def test_growth_matrix_matches_the_tracking_query_and_the_store(database):
+    hrefs, rows, sweeps = simulate_sweeps(60, seed=19)
+
+    async def scenario():
+        async with database() as sessions:
+            async with sessions() as session:
+                session.add_all(
+                    Collections(href=href, title=href, sold_percentage=1, total_stock=1000, sold_stock=0)
+                    for href in hrefs
+                )
+                session.add_all(Tracking(collection_href=href, time=time, sold_to_time=sold) for href, time, sold in rows)
+                session.add_all(Sweep(time=time) for time in sweeps)
+                await session.commit()
+
+                from_query = await TrackingDAL(session).calculate_sales_changes(hrefs, INTERVALS, now=NOW)
+                window = await TrackingWindow.load(session, since=NOW - timedelta(minutes=INTERVALS[-1]), hrefs=hrefs)
+
+            store = TimeSeriesStore(retention_minutes=60)
+
+            for href, time, sold in sorted(rows, key=lambda row: row[1]):
+                store.append(href, time, sold)
+            for time in sweeps:
+                store.add_sweep(time)
+
+            from_matrix = growth_matrix(window, INTERVALS, NOW, hrefs=hrefs).to_dict()
+
+            assert from_matrix == from_query
+            assert store.calculate_sales_changes(hrefs, INTERVALS, now=NOW) == from_query
+            assert {
+                href: {interval: store.calculate_sales_change(href, interval, now=NOW) for interval in INTERVALS}
+                for href in hrefs
+            } == from_query
+
+            # the seed covers growth, no growth and collections without a value for a window
+            growths = [growth for changes in from_query.values() for growth in changes.values()]
+            assert None in growths
+            assert any(growth is not None and growth[0] > 0 for growth in growths)
+            assert any(growth is not None and growth[0] == 0 for growth in growths)
+
+    asyncio.run(scenario())
+
+
+def test_rank_keeps_the_row_order_on_ties():
+    hrefs = ["a", "b", "c", "d", "e", "f"]
+    matrix = GrowthMatrix.from_dict(hrefs, [5], {
+        "a": {5: (1, 1.0)},
+        "b": {5: None},
+        "c": {5: (4, 2.0)},
+        "d": {5: (1, 1.0)},
+        "f": {5: (2, 2.0)},
+    })
+
+    assert matrix.rank(5) == ["c", "f", "a", "d", "b", "e"]
@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from analytics.timeseries import TimeSeriesStore
+from database.dal import IngestDAL, TrackingDAL
+from database.models import Collections, Sweep, Tracking
+from database.retention import HEARTBEAT
+from database.session import DBTransactionStatus
+
+HREF = "https://lmnft.test/a"
+
+
+def card(sold: int) -> dict:
+    return {"href": HREF, "title": "A", "sold_percentage": sold / 10, "total_stock": 1000, "sold_stock": sold}
+
+
+async def samples(session):
+    result = await session.execute(select(Tracking.time, Tracking.sold_to_time).order_by(Tracking.time))
+    return [tuple(row) for row in result.all()]
+
+
+def test_create_records_changes_and_heartbeats_only(database):
+    start = datetime(2024, 3, 10, 12)
+
+    async def scenario():
+        async with database() as sessions:
+            async with sessions() as session:
+                tracking_dal = TrackingDAL(session)
+                assert await tracking_dal.create(HREF, 10, time=start) is DBTransactionStatus.NOT_EXIST
+
+                session.add(Collections(href=HREF, title="A", sold_percentage=1, total_stock=1000, sold_stock=10))
+                await session.commit()
+
+                assert await tracking_dal.create(HREF, 10, time=start) is DBTransactionStatus.SUCCESS
+                assert await tracking_dal.create(HREF, 10, time=start + timedelta(seconds=15)) is DBTransactionStatus.ALREADY_EXIST
+                assert await tracking_dal.create(HREF, 12, time=start + timedelta(seconds=30)) is DBTransactionStatus.SUCCESS
+                assert await tracking_dal.create(HREF, 12, time=start + HEARTBEAT) is DBTransactionStatus.ALREADY_EXIST
+                assert await tracking_dal.create(HREF, 12, time=start + HEARTBEAT + timedelta(seconds=45)) is DBTransactionStatus.SUCCESS
+
+                assert await samples(session) == [
+                    (start, 10),
+                    (start + timedelta(seconds=30), 12),
+                    (start + HEARTBEAT + timedelta(seconds=45), 12),
+                ]
+
+    asyncio.run(scenario())
+
+
+def test_create_matches_ingest(database):
+    start = datetime(2024, 3, 10, 12)
+    sold = [10, 10, 11, 11, 11, 15]
+
+    async def scenario():
+        async with database() as sessions:
+            async with sessions() as session:
+                for i, value in enumerate(sold):
+                    await IngestDAL(session).ingest([card(value)], time=start + timedelta(seconds=15 * i))
+                ingested = await samples(session)
+
+                await session.execute(Tracking.__table__.delete())
+                await session.commit()
+
+                for i, value in enumerate(sold):
+                    await TrackingDAL(session).create(HREF, value, time=start + timedelta(seconds=15 * i))
+
+                assert await samples(session) == ingested
+
+    asyncio.run(scenario())
+
+
+def test_single_growth_follows_step_function(database):
+    now = datetime.now()
+
+    async def scenario():
+        async with database() as sessions:
+            async with sessions() as session:
+                session.add(Collections(href=HREF, title="A", sold_percentage=11, total_stock=1000, sold_stock=110))
+                # dormant since before the window, one mint a minute ago: only two change rows
+                session.add_all([
+                    Tracking(collection_href=HREF, time=now - timedelta(minutes=20), sold_to_time=100),
+                    Tracking(collection_href=HREF, time=now - timedelta(minutes=1), sold_to_time=110),
+                ])
+                session.add_all(Sweep(time=now - timedelta(seconds=15 * i)) for i in range(80))
+                await session.commit()
+
+                tracking_dal = TrackingDAL(session)
+                growth = await tracking_dal.calculate_sales_change(HREF, 15)
+
+                assert growth == (10, 10.0)
+                assert growth == (await tracking_dal.calculate_sales_changes([HREF], [15]))[HREF][15]
+                assert await tracking_dal.calculate_sales_change("https://lmnft.test/missing", 15) is None
+
+    asyncio.run(scenario())
+
+
+def test_window_start_survives_a_late_heartbeat(database):
+    # seen only at full sweeps: dormant from t=0, a mint at t=630, and no heartbeat yet at t=615
+    # (the last full sweep at t=600 found the t=0 row still fresh)
+    now = datetime.now().replace(microsecond=0)
+    base = now - timedelta(seconds=725)
+    rows = [(HREF, base, 100), (HREF, base + timedelta(seconds=630), 110)]
+    sweeps = [base + timedelta(seconds=15 * i) for i in range(49)]
+
+    store = TimeSeriesStore(retention_minutes=15)
+    for href, time, sold in rows:
+        store.append(href, time, sold)
+    for time in sweeps:
+        store.add_sweep(time)
+
+    assert store.calculate_sales_change(HREF, 2, now=now) == (10, 10.0)
+    assert store.calculate_sales_changes([HREF], [2], now=now)[HREF][2] == (10, 10.0)
+
+    async def scenario():
+        async with database() as sessions:
+            async with sessions() as session:
+                session.add(Collections(href=HREF, title="A", sold_percentage=11, total_stock=1000, sold_stock=110))
+                session.add_all(Tracking(collection_href=href, time=time, sold_to_time=sold) for href, time, sold in rows)
+                session.add_all(Sweep(time=time) for time in sweeps)
+                await session.commit()
+
+                assert await TrackingDAL(session).calculate_sales_change(HREF, 2) == (10, 10.0)
+
+    asyncio.run(scenario())
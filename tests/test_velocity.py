@@ -0,0 +1,142 @@
+import asyncio
+import math
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from analytics.velocity import VelocityTracker
+from database.models import Collections, Tracking
+
+HREF = "https://lmnft.test/a"
+
+
+def minting(tracker: VelocityTracker, start: datetime, minutes: int, per_minute: int) -> datetime:
+    for minute in range(minutes + 1):
+        tracker.update(HREF, start + timedelta(minutes=minute), minute * per_minute)
+    return start + timedelta(minutes=minutes)
+
+
+def test_velocity_decays_without_snapshots():
+    tracker = VelocityTracker(tau_minutes=5)
+    last = minting(tracker, datetime(2024, 3, 10, 12), 30, 10)
+    velocity = tracker.velocity(HREF, now=last)
+    assert velocity > 9
+
+    # sold out: no more snapshots, the velocity read later decays like a snapshot with no mints would
+    later = last + timedelta(minutes=5)
+    assert math.isclose(tracker.velocity(HREF, now=later), velocity / math.e)
+    assert tracker.velocities(now=later) == {HREF: tracker.velocity(HREF, now=later)}
+
+    # not seen for more than 3 tau: gone
+    assert tracker.velocity(HREF, now=last + timedelta(minutes=16)) == 0.0
+    assert tracker.velocities(now=last + timedelta(minutes=16)) == {}
+
+
+def test_decayed_velocity_is_persisted():
+    tracker = VelocityTracker(tau_minutes=5)
+    last = minting(tracker, datetime(2024, 3, 10, 12), 30, 10)
+
+    persisted = tracker.dirty(now=last)
+    tracker.mark_persisted(persisted)
+    assert tracker.dirty(now=last) == {}
+
+    assert tracker.dirty(now=last + timedelta(minutes=1)) == {HREF: tracker.velocity(HREF, now=last + timedelta(minutes=1))}
+    assert tracker.dirty(now=last + timedelta(minutes=16)) == {HREF: 0.0}
+
+
+def test_warm_start_clears_stale_velocities(database):
+    now = datetime.now()
+    stale, minting_href = "https://lmnft.test/stale", "https://lmnft.test/minting"
+
+    async def scenario():
+        async with database() as sessions:
+            async with sessions() as session:
+                session.add_all([
+                    Collections(href=stale, title="S", sold_percentage=100, total_stock=100, sold_stock=100, mint_velocity=25),
+                    Collections(href=minting_href, title="M", sold_percentage=1, total_stock=1000, sold_stock=40, mint_velocity=5),
+                ])
+                # the stale one sold out an hour ago, the other is still minting
+                session.add(Tracking(collection_href=stale, time=now - timedelta(hours=1), sold_to_time=100))
+                session.add_all(
+                    Tracking(collection_href=minting_href, time=now - timedelta(minutes=4 - i), sold_to_time=10 * i)
+                    for i in range(5)
+                )
+                await session.commit()
+
+                tracker = VelocityTracker(tau_minutes=5)
+                await tracker.warm_start(session, now=now)
+
+                result = await session.execute(select(Collections.href, Collections.mint_velocity))
+                assert dict(result.all()) == {stale: 0.0, minting_href: 5}
+                assert tracker.velocities(now=now).keys() == {minting_href}
+
+    asyncio.run(scenario())
+
+
+def test_dirty_finds_what_a_scan_of_every_state_finds():
+    rng = random.Random(20)
+    tracker = VelocityTracker(tau_minutes=5)
+    start = datetime(2024, 3, 10, 12)
+    hrefs = [f"https://lmnft.test/{i}" for i in range(200)]
+    sold = {href: 0 for href in hrefs}
+    rates = {href: rng.choice([0, 0, 0.2, 1, 5, 30]) for href in hrefs}
+    # sold out or gone from the listings at some point, or only seen by full sweeps
+    leaves = {href: rng.choice([240, 240, rng.randrange(240)]) for href in hrefs}
+    every = {href: rng.choice([1, 1, 4]) for href in hrefs}
+    seen = {href: start - timedelta(days=1) for href in hrefs}
+
+    for sweep in range(240):
+        now = start + timedelta(seconds=15 * sweep)
+
+        for href in hrefs:
+            if sweep < leaves[href] and sweep % every[href] == 0:
+                sold[href] += int(rng.random() < rates[href] / 4) * rng.randint(1, 3)
+                tracker.update(href, now, sold[href])
+                seen[href] = now
+
+        expected = tracker.dirty(hrefs=list(tracker.states), now=now)
+        assert tracker.dirty(now=now) == expected
+
+        # a failed write leaves them dirty for the next batch
+        if rng.random() < 0.9:
+            tracker.mark_persisted(expected)
+
+    # collections gone for longer than 3 tau (and a batch) were dropped, the others are kept
+    assert {href for href in hrefs if seen[href] < now - timedelta(minutes=16)}.isdisjoint(tracker.states)
+    assert {href for href in hrefs if seen[href] >= now - timedelta(minutes=15)} <= set(tracker.states)
+    assert len(tracker.states) < len(hrefs)
+
+
+def test_idle_states_are_not_read_until_their_deadline(monkeypatch):
+    tracker = VelocityTracker(tau_minutes=5)
+    start = datetime(2024, 3, 10, 12)
+
+    for i in range(500):
+        tracker.update(f"https://lmnft.test/{i}", start, 0)
+        tracker.update(f"https://lmnft.test/{i}", start + timedelta(minutes=1), 10)
+    tracker.mark_persisted(tracker.dirty(now=start + timedelta(minutes=1)))
+    tracker.dirty(now=start + timedelta(minutes=1))
+
+    reads = []
+    current = tracker.current
+    monkeypatch.setattr(tracker, "current", lambda state, now: reads.append(state) or current(state, now))
+
+    tracker.update(HREF, start + timedelta(minutes=1), 5)
+    assert tracker.dirty(now=start + timedelta(minutes=1, seconds=15)) == {HREF: 0.0}
+    # within 5% of what was persisted: only the updated collection is read
+    assert len(reads) == 1
+
+
+def test_stale_states_are_dropped_once_persisted_as_zero():
+    tracker = VelocityTracker(tau_minutes=5)
+    last = minting(tracker, datetime(2024, 3, 10, 12), 30, 10)
+    tracker.mark_persisted(tracker.dirty(now=last))
+
+    gone = last + timedelta(minutes=16)
+    tracker.mark_persisted(tracker.dirty(now=gone))
+    assert HREF in tracker.states
+
+    assert tracker.dirty(now=gone + timedelta(seconds=15)) == {}
+    assert tracker.states == {}
+    assert tracker.velocity(HREF, now=gone) == 0.0